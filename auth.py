@@ -1,9 +1,12 @@
 import os
+import sys
 import asyncio
 import logging
+import yaml
 from telethon import TelegramClient
 from telethon.errors import SessionPasswordNeededError
 from dotenv import load_dotenv
+from tscraper.session import WriteBehindSession, open_session
 
 logging.basicConfig(
     level=logging.INFO,
@@ -11,6 +14,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def load_settings():
+    """The settings section of the config, for the session backend; empty without a config."""
+    config_path = os.getenv("CONFIG_PATH", "config.yaml")
+    if not os.path.exists(config_path):
+        return {}
+    with open(config_path) as f:
+        return (yaml.safe_load(f) or {}).get('settings') or {}
+
 async def main():
     load_dotenv()
 
@@ -25,8 +36,12 @@ async def main():
         logger.error("API_HASH is required")
         return
 
+    # Extra accounts for sharded mode: python auth.py <session_name>
+    session = sys.argv[1] if len(sys.argv) > 1 else 'my_user_session'
+
     logger.info("Starting authentication process...")
-    client = TelegramClient('my_user_session', int(api_id), api_hash)
+    session_storage = open_session(session, load_settings())
+    client = TelegramClient(session_storage, int(api_id), api_hash)
 
     try:
         await client.connect()
@@ -46,7 +61,11 @@ async def main():
                 await client.sign_in(password=password)
 
         logger.info("Successfully authenticated!")
-        logger.info("Session file 'my_user_session.session' has been created")
+        if isinstance(session_storage, WriteBehindSession):
+            # The final snapshot is written when the client disconnects
+            logger.info(f"Session will be saved to '{session_storage.path}'")
+        else:
+            logger.info(f"Session file '{session}.session' has been created")
 
         me = await client.get_me()
         logger.info(f"Logged in as: {me.first_name} (@{me.username})")
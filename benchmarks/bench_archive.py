@@ -0,0 +1,74 @@
+"""Archive sink throughput: records per second written, per format and batch size.
+
+    python -m benchmarks.bench_archive [records]
+
+"add" is the cost the forwarding path pays per message (appending to the
+buffer). "written/s" is the writer thread's throughput through flush(),
+including encoding, compression and the file write; "B/record" is the size
+on disk.
+"""
+import asyncio
+import random
+import string
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+from tscraper import archive
+from tscraper.archive import ArchiveSink
+
+
+def build_posts(n: int):
+    rng = random.Random(0)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(2000)]
+    date = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    return [
+        SimpleNamespace(
+            id=i,
+            date=date,
+            message=" ".join(rng.choices(words, k=rng.randint(5, 80))),
+            grouped_id=rng.getrandbits(63) if rng.random() < 0.1 else None,
+        )
+        for i in range(n)
+    ]
+
+
+async def write(directory: str, fmt: str, posts, batch: int) -> float:
+    sink = ArchiveSink(directory, format=fmt, buffer_size=len(posts), batch_size=batch, rotate_bytes=2**40)
+    t0 = time.perf_counter()
+    for start in range(0, len(posts), batch):
+        for post in posts[start:start + batch]:
+            sink.add(-1001234567890, post, "news", "text")
+        await sink.flush()
+    await sink.close()
+    return time.perf_counter() - t0
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    posts = build_posts(n)
+
+    sink = ArchiveSink(tempfile.mkdtemp(), format="jsonl", buffer_size=10**9)
+    number = 100_000
+    cost = timeit.timeit(lambda: sink.add(-1001234567890, posts[0], "news", "text"), number=number) / number
+    print(f"add(): {cost * 1e9:.0f} ns/record\n")
+
+    formats = ["jsonl"] + (["parquet"] if archive.pq is not None else [])
+    print(f"{n} records, ~{sum(len(p.message) for p in posts) / n:.0f} chars of text each")
+    print(f"{'format':>8} {'batch':>7} {'written/s':>10} {'B/record':>9}")
+    for fmt in formats:
+        for batch in (1_000, 10_000):
+            with tempfile.TemporaryDirectory() as directory:
+                elapsed = asyncio.run(write(directory, fmt, posts, batch))
+                size = sum(path.stat().st_size for path in Path(directory).iterdir())
+            print(f"{fmt:>8} {batch:>7} {n / elapsed:>10.0f} {size / n:>9.1f}")
+    if archive.pq is None:
+        print("(pyarrow is not installed: parquet not measured)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Outbound RPCs and throughput for a bursty load with and without micro-batching.
+
+    python -m benchmarks.bench_batching
+"""
+import asyncio
+import logging
+import time
+from types import SimpleNamespace
+
+from tscraper.tscraper import TelegramScraper
+
+RPC_LATENCY = 0.02
+SOURCES = 10
+BURST = 50  # messages per source, posted back to back
+
+
+class StubClient:
+    def __init__(self):
+        self.calls = 0
+
+    async def forward_messages(self, target, messages):
+        self.calls += 1
+        await asyncio.sleep(RPC_LATENCY)
+
+    async def send_message(self, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(RPC_LATENCY)
+
+
+def make_event(chat, msg_id):
+    message = SimpleNamespace(id=msg_id, grouped_id=None, message="text", media=None)
+
+    async def get_chat():
+        return chat
+
+    return SimpleNamespace(message=message, chat_id=chat.id, get_chat=get_chat)
+
+
+async def run(batch_window_ms: float):
+    channels = {"news": [f"@source{i}" for i in range(SOURCES)], "target_channels": {"news": "@target"}}
+    settings = {
+        "batch_window_ms": batch_window_ms,
+        "forward_workers": 8,
+        "per_target_concurrency": 8,
+        "target_rate": 0,
+        "account_rate": 0,
+    }
+    scraper = TelegramScraper(1, "hash", {"channels": channels, "settings": settings})
+    scraper.client = StubClient()
+    chats = [SimpleNamespace(username=f"source{i}", id=-1000000000000 - i) for i in range(SOURCES)]
+
+    t0 = time.perf_counter()
+    for n in range(BURST):
+        for chat in chats:
+            await scraper._handle_message(make_event(chat, n))
+    if scraper.batcher is not None:
+        await scraper.batcher.drain()
+    await scraper.queue.join()
+    elapsed = time.perf_counter() - t0
+    await scraper.queue.stop()
+    return scraper.client.calls, SOURCES * BURST / elapsed
+
+
+def main():
+    logging.disable(logging.INFO)
+    print(f"{SOURCES * BURST} messages, {RPC_LATENCY * 1000:.0f} ms per RPC")
+    print(f"{'batch window':>13} {'RPCs':>6} {'msg/s':>9}")
+    for window in (0, 50, 250):
+        calls, rate = asyncio.run(run(window))
+        print(f"{window:>10} ms {calls:>6} {rate:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
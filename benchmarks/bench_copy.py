@@ -0,0 +1,72 @@
+"""Copy mode: streaming download->upload against download-then-upload.
+
+    python -m benchmarks.bench_copy
+
+A fake client serves PART_SIZE chunks with a fixed per-request latency for
+downloads and for upload parts (a DC round trip). "buffered" reads the whole
+file into memory and then uploads it, as send_file(bytes) would; "streamed"
+is MediaCopier._stream. Peak memory is measured with tracemalloc.
+"""
+import asyncio
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from telethon.tl.types import Document, MessageMediaDocument
+
+from tscraper.copier import PART_SIZE, MediaCopier
+
+LATENCY = 0.02
+
+
+class FakeClient:
+    def __init__(self, size: int):
+        self.size = size
+
+    async def iter_download(self, media, request_size: int = PART_SIZE, file_size=None):
+        for offset in range(0, self.size, request_size):
+            await asyncio.sleep(LATENCY)
+            yield bytes(min(request_size, self.size - offset))
+
+    async def __call__(self, request):
+        await asyncio.sleep(LATENCY)
+        return True
+
+
+async def buffered(client: FakeClient, message):
+    data = bytearray()
+    async for chunk in client.iter_download(message.media):
+        data += chunk
+    for offset in range(0, len(data), PART_SIZE):
+        await client(bytes(data[offset:offset + PART_SIZE]))
+
+
+async def streamed(client: FakeClient, message):
+    await MediaCopier(buffer_parts=4)._stream(client, message)
+
+
+def measure(fn, size: int):
+    message = SimpleNamespace(media=MessageMediaDocument(
+        document=Document(1, 1, b"", None, "video/mp4", size, 2, [])
+    ))
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    asyncio.run(fn(FakeClient(size), message))
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    print(f"{LATENCY * 1000:.0f} ms per download/upload request, {PART_SIZE // 1024} KB parts")
+    print(f"{'file MB':>8} {'buffered s':>11} {'streamed s':>11} {'buffered MB':>12} {'streamed MB':>12}")
+    for mb in (5, 20, 100):
+        size = mb * 2**20
+        slow, slow_peak = measure(buffered, size)
+        fast, fast_peak = measure(streamed, size)
+        print(f"{mb:>8} {slow:>11.2f} {fast:>11.2f} {slow_peak / 2**20:>12.1f} {fast_peak / 2**20:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Outbound calls for a high-volume category, forwarded per message and as digests.
+
+    python -m benchmarks.bench_digest [messages]
+
+Replays a synthetic trace of ``messages`` short posts (default 5000, 5%
+albums) from four sources through the full pipeline against FakeClient,
+once with the category forwarded as usual and once per digest setting.
+Digests still buffered at the end of the trace are sent as well, so every
+message is delivered in both modes. "calls" counts every RPC made to the
+target, "digest lines" the posts listed in digests (one per message or
+album) and "max post" the longest digest post in UTF-16 code units.
+"""
+import asyncio
+import logging
+import sys
+from types import SimpleNamespace
+
+from benchmarks import recording
+from benchmarks.bench_load import SOURCES, LoadScraper, build_config
+from benchmarks.fake_client import FakeClient
+from tscraper.digest import utf16_length
+from telethon.extensions import html
+
+
+async def run(events, digests):
+    args = SimpleNamespace(workers=16, rate_limits=False)
+    config = build_config(SOURCES, args)
+    config["digests"] = digests
+    scraper = LoadScraper(1, "hash", config)
+    client = scraper.client = FakeClient(latency=0.001)
+    posts = []
+    send_message = client.send_message
+
+    async def record_post(entity, message="", *args, **kwargs):
+        posts.append(message)
+        return await send_message(entity, message, *args, **kwargs)
+
+    client.send_message = record_post
+    await recording.replay(scraper._handle_message, events, speed=0)
+    await scraper.albums.drain()
+    # Send the partial digests, as taking the category out of digest mode would
+    scraper.digests.configure({})
+    await scraper.digests.close_due()
+    await scraper.queue.join()
+    await scraper.queue.stop()
+    lines = sum(post.count("\n• ") for post in posts)
+    longest = max((utf16_length(html.parse(post)[0]) for post in posts), default=0)
+    return sum(client.rpcs[m] for m in ("forward_messages", "send_message", "send_file")), lines, longest
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    logging.disable(logging.CRITICAL)
+    events = recording.synthetic(messages, 1000, SOURCES)
+    albums = len({event.grouped_id for event in events if event.grouped_id})
+    posts = sum(1 for event in events if not event.grouped_id) + albums
+
+    modes = {
+        "per message": None,
+        "digest 50": {"load": {"max_messages": 50}},
+        "digest 100": {"load": {"max_messages": 100}},
+    }
+    print(f"{messages} messages ({posts} posts, {albums} albums) from {len(SOURCES)} sources")
+    print(f"{'mode':>12} {'calls':>7} {'posts/call':>11} {'digest lines':>13} {'max post':>9}")
+    baseline = None
+    for name, digests in modes.items():
+        calls, lines, longest = asyncio.run(run(events, digests))
+        baseline = baseline or calls
+        print(f"{name:>12} {calls:>7} {posts / calls:>11.1f} {lines or '-':>13} {longest or '-':>9}"
+              f"  {baseline / calls:>5.1f}x fewer calls")
+
+
+if __name__ == "__main__":
+    main()
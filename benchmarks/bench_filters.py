@@ -0,0 +1,91 @@
+"""Per-message cost of the compiled content filter with hundreds of rules.
+
+    python -m benchmarks.bench_filters
+
+"naive" evaluates every keyword and regex one by one, as a straightforward
+filter would. Keyword rules are compared against RuleSet with the trie
+regex fallback and, when pyahocorasick is installed, the Aho-Corasick
+automaton.
+"""
+import random
+import re
+import string
+import timeit
+
+from tscraper import filters
+from tscraper.filters import RuleSet
+
+
+def build_rules(n_keywords: int, n_regex: int) -> dict:
+    rng = random.Random(1)
+    words = {"".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10))) for _ in range(n_keywords * 2)}
+    words = sorted(words)
+    return {
+        "exclude": {
+            "keywords": words[:n_keywords],
+            "regex": [rf"\b{w[:4]}\d+\b" for w in words[n_keywords:n_keywords + n_regex]],
+        },
+    }
+
+
+def build_message(length: int = 600) -> str:
+    rng = random.Random(2)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(length // 6)]
+    return " ".join(words)[:length]
+
+
+def naive_check(rules: dict, text: str):
+    folded = text.lower()
+    for keyword in rules["exclude"]["keywords"]:
+        if keyword in folded:
+            return keyword
+    for pattern in rules["exclude"]["regex"]:
+        if re.search(pattern, text, re.IGNORECASE):
+            return pattern
+    return None
+
+
+def compiled(rules: dict, aho: bool) -> RuleSet:
+    saved = filters.ahocorasick
+    if not aho:
+        filters.ahocorasick = None
+    try:
+        return RuleSet(rules)
+    finally:
+        filters.ahocorasick = saved
+
+
+def per_message_us(check, number: int = 2000) -> float:
+    return timeit.timeit(check, number=number) / number * 1e6
+
+
+def main():
+    text = build_message()
+    media = ("text",)
+    aho = filters.ahocorasick is not None
+    print(f"Keyword rules, {len(text)}-char message, us/message")
+    print(f"{'keywords':>9} {'naive':>9} {'trie regex':>11} {'aho-corasick':>13}")
+    for n in (100, 500, 1000, 5000):
+        rules = build_rules(n, 0)
+        trie = compiled(rules, aho=False)
+        row = f"{n:>9} {per_message_us(lambda: naive_check(rules, text)):>9.1f} "
+        row += f"{per_message_us(lambda: trie.check(text, media)):>11.1f} "
+        if aho:
+            automaton = compiled(rules, aho=True)
+            row += f"{per_message_us(lambda: automaton.check(text, media)):>13.1f}"
+        else:
+            row += f"{'n/a':>13}"
+        print(row)
+
+    print("\nRegex rules (one alternation; see RegexMatcher), us/message")
+    print(f"{'regexes':>9} {'naive':>9} {'compiled':>11}")
+    for n in (10, 50, 100):
+        rules = build_rules(n, n)
+        rules["exclude"]["keywords"] = []
+        ruleset = compiled(rules, aho=aho)
+        print(f"{n:>9} {per_message_us(lambda: naive_check(rules, text)):>9.1f} "
+              f"{per_message_us(lambda: ruleset.check(text, media)):>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
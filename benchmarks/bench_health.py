@@ -0,0 +1,113 @@
+"""Forwarding latency while /metrics is scraped at high frequency.
+
+    python -m benchmarks.bench_health [series]
+
+The registry is inflated with ``series`` extra labelled samples (default
+20000) so that generate_latest() is expensive, and a separate process
+requests /metrics in a tight loop while the bench_load pipeline forwards a
+synthetic trace through FakeClient. "in-loop" is the previous setup, uvicorn
+on the scraper's event loop with no cache; "thread" serves from the
+dedicated thread without caching; "thread+cache" adds the default 1 s cache.
+"""
+import asyncio
+import logging
+import multiprocessing
+import socket
+import sys
+import time
+import urllib.request
+from types import SimpleNamespace
+
+import uvicorn
+from prometheus_client import Counter
+
+from benchmarks import recording
+from benchmarks.bench_load import SOURCES, LoadScraper, build_config, percentile
+from benchmarks.fake_client import FakeClient
+from tscraper.health import app, serve_health, set_metrics_cache_seconds
+
+MESSAGES = 2000
+RATE = 500
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def hammer(port: int, stop, counter):
+    while not stop.is_set():
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+                response.read()
+            with counter.get_lock():
+                counter.value += 1
+        except OSError:
+            time.sleep(0.05)
+
+
+async def forward_trace(events):
+    args = SimpleNamespace(workers=64, rate_limits=False)
+    scraper = LoadScraper(1, "hash", build_config(SOURCES, args))
+    scraper.client = FakeClient(latency=0.03, jitter=0.015)
+    received = {}
+
+    def on_event(event):
+        received[(event.chat_id, event.message_id)] = time.perf_counter()
+
+    await recording.replay(scraper._handle_message, events, speed=1, on_event=on_event)
+    await scraper.albums.drain()
+    await scraper.queue.join()
+    await scraper.queue.stop()
+    return sorted(done - received[chat_id, message_id] for (chat_id, message_id, _), done in scraper.delivered.items())
+
+
+async def run(mode: str, events):
+    port = free_port()
+    server = None
+    if mode == "in-loop":
+        set_metrics_cache_seconds(0)
+        uv = uvicorn.Server(uvicorn.Config(app=app, host="127.0.0.1", port=port, loop="asyncio", log_level="error"))
+        server = asyncio.create_task(uv.serve())
+    elif mode != "no scrapes":
+        server = asyncio.create_task(serve_health(port, metrics_cache_seconds=1.0 if mode == "thread+cache" else 0))
+    stop = multiprocessing.Event()
+    counter = multiprocessing.Value("i", 0)
+    scraper = None
+    if server is not None:
+        scraper = multiprocessing.Process(target=hammer, args=(port, stop, counter))
+        scraper.start()
+        await asyncio.sleep(1.0)
+        with counter.get_lock():
+            counter.value = 0
+    t0 = time.perf_counter()
+    latencies = await forward_trace(events)
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    if scraper is not None:
+        await asyncio.to_thread(scraper.join)
+        server.cancel()
+        await asyncio.gather(server, return_exceptions=True)
+    return latencies, counter.value / elapsed
+
+
+def main():
+    series = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    logging.disable(logging.CRITICAL)
+    padding = Counter("bench_padding_total", "Extra series to make serialization expensive", ["a", "b"])
+    for i in range(series):
+        padding.labels(a=str(i % 100), b=str(i)).inc(i)
+    events = recording.synthetic(MESSAGES, RATE, SOURCES)
+
+    print(f"{MESSAGES} messages at {RATE}/s, {series} extra series, /metrics scraped in a loop")
+    print(f"{'server':>13} {'scrapes/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode in ("no scrapes", "in-loop", "thread", "thread+cache"):
+        latencies, scrapes = asyncio.run(run(mode, events))
+        print(f"{mode:>13} {scrapes:>10.1f} {percentile(latencies, 0.5) * 1000:>8.1f} "
+              f"{percentile(latencies, 0.99) * 1000:>8.1f}")
+    set_metrics_cache_seconds(1.0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Per-message forwarding latency with and without the get_chat() round trip.
+
+    python -m benchmarks.bench_hotpath
+
+The stub client charges RPC_LATENCY for every request. "get_chat" emulates the
+previous handler, which awaited event.get_chat() (a network request whenever
+the entity is not cached) before it could route; "chat_id" is the current
+handler routing on event.chat_id.
+"""
+import asyncio
+import logging
+import statistics
+import time
+from types import SimpleNamespace
+
+from tscraper.tscraper import TelegramScraper
+
+RPC_LATENCY = 0.03
+MESSAGES = 200
+
+
+class StubClient:
+    def __init__(self, done):
+        self.done = done
+        self.calls = 0
+
+    async def forward_messages(self, target, message):
+        self.calls += 1
+        await asyncio.sleep(RPC_LATENCY)
+        self.done[message.id] = time.perf_counter()
+
+
+class LegacyScraper(TelegramScraper):
+    async def _handle_message(self, event):
+        chat = await event.get_chat()
+        routes = self.routes.lookup_all(chat.username, chat.id)
+        await self._process_message(event.message, event.chat_id, routes)
+
+
+def make_event(client, msg_id):
+    chat = SimpleNamespace(username="source", id=-1001000)
+
+    async def get_chat():
+        client.calls += 1
+        await asyncio.sleep(RPC_LATENCY)
+        return chat
+
+    message = SimpleNamespace(id=msg_id, grouped_id=None, message="text", media=None)
+    return SimpleNamespace(message=message, chat_id=-1001000, get_chat=get_chat)
+
+
+async def run(scraper_cls):
+    channels = {"news": ["@source"], "target_channels": {"news": "@target"}}
+    settings = {"forward_workers": 16, "per_target_concurrency": 16, "target_rate": 0, "account_rate": 0}
+    scraper = scraper_cls(1, "hash", {"channels": channels, "settings": settings})
+    scraper.routes.add_alias("@source", -1001000)  # as resolved at startup
+    done = {}
+    scraper.client = StubClient(done)
+
+    started = {}
+    for msg_id in range(MESSAGES):
+        started[msg_id] = time.perf_counter()
+        await scraper._handle_message(make_event(scraper.client, msg_id))
+        await asyncio.sleep(0.005)
+    await scraper.queue.join()
+    await scraper.queue.stop()
+    latencies = sorted(done[i] - started[i] for i in range(MESSAGES))
+    return statistics.median(latencies), latencies[int(MESSAGES * 0.99)], scraper.client.calls
+
+
+def main():
+    logging.disable(logging.INFO)
+    print(f"{MESSAGES} messages, {RPC_LATENCY * 1000:.0f} ms per RPC")
+    print(f"{'routing':>9} {'p50 ms':>8} {'p99 ms':>8} {'RPCs':>6}")
+    for name, cls in (("get_chat", LegacyScraper), ("chat_id", TelegramScraper)):
+        p50, p99, calls = asyncio.run(run(cls))
+        print(f"{name:>9} {p50 * 1000:>8.1f} {p99 * 1000:>8.1f} {calls:>6}")
+
+
+if __name__ == "__main__":
+    main()
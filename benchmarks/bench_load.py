@@ -0,0 +1,122 @@
+"""Offline load test: the full TelegramScraper pipeline against a fake client.
+
+    python -m benchmarks.bench_load [--trace FILE] [--messages N] [--rate R] [--speed 1|10|max]
+                                    [--latency S] [--error-rate P] [--flood-rate P] [--rate-limits]
+
+Events come from a trace recorded with ``benchmarks.recording`` or, without
+``--trace``, from a synthetic trace of ``--messages`` at ``--rate`` per
+second over a few sources (5% albums). They go through _handle_message, so
+routing, dedup, album assembly, batching, the queue and the workers all run
+as in production; only the network is FakeClient. Latency is from handing
+the event to the scraper to _forward() returning success, per message.
+Peak memory is the process's maximum RSS. The rate scheduler is disabled
+unless ``--rate-limits`` is given, so the numbers show the pipeline itself.
+"""
+import argparse
+import asyncio
+import logging
+import resource
+import time
+
+from benchmarks import recording
+from benchmarks.fake_client import FakeClient
+from tscraper.tscraper import TelegramScraper
+
+SOURCES = [-1001000000001, -1001000000002, -1001000000003, -1001000000004]
+
+
+class LoadScraper(TelegramScraper):
+    """Records when each message reached each of its targets."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delivered = {}
+
+    async def _forward(self, target, messages, *args, **kwargs):
+        ok = await super()._forward(target, messages, *args, **kwargs)
+        if ok:
+            now = time.perf_counter()
+            for message in messages if isinstance(messages, list) else [messages]:
+                self.delivered[(message.chat_id, message.id, target)] = now
+        return ok
+
+
+def build_config(sources, args):
+    channels = {"load": [str(chat_id) for chat_id in sources], "target_channels": {"load": "@load_target"}}
+    settings = {"forward_workers": args.workers, "per_target_concurrency": args.workers}
+    if not args.rate_limits:
+        settings.update(target_rate=0, account_rate=0)
+    return {"channels": channels, "settings": settings}
+
+
+async def run(events, args):
+    sources = sorted({event.chat_id for event in events})
+    scraper = LoadScraper(1, "hash", build_config(sources, args))
+    client = scraper.client = FakeClient(
+        latency=args.latency, jitter=args.latency / 2, error_rate=args.error_rate,
+        flood_rate=args.flood_rate, flood_seconds=args.flood_seconds,
+    )
+    received = {}
+
+    def on_event(event):
+        received[(event.chat_id, event.message_id)] = time.perf_counter()
+
+    t0 = time.perf_counter()
+    fed = await recording.replay(scraper._handle_message, events, speed=args.speed, on_event=on_event)
+    await scraper.albums.drain()
+    if scraper.batcher is not None:
+        await scraper.batcher.drain()
+    await scraper.queue.join()
+    elapsed = time.perf_counter() - t0
+    await scraper.queue.stop()
+
+    latencies = sorted(done - received[chat_id, message_id] for (chat_id, message_id, _), done in scraper.delivered.items())
+    return {
+        "fed": fed,
+        "elapsed": elapsed,
+        "delivered": len(latencies),
+        "latencies": latencies,
+        "rpcs": client.rpcs,
+        "errors": client.errors,
+    }
+
+
+def percentile(values, q):
+    return values[min(int(len(values) * q), len(values) - 1)] if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_load')
+    parser.add_argument('--trace', help='trace file from benchmarks.recording (default: synthetic)')
+    parser.add_argument('--messages', type=int, default=5000, help='synthetic trace length')
+    parser.add_argument('--rate', type=float, default=1000, help='synthetic trace messages per second')
+    parser.add_argument('--speed', default='1', help='replay speed: 1, 10, ... or max')
+    parser.add_argument('--latency', type=float, default=0.03, help='seconds per fake RPC')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of sends that fail')
+    parser.add_argument('--flood-rate', type=float, default=0.0, help='share of sends that raise FloodWaitError')
+    parser.add_argument('--flood-seconds', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=64)
+    parser.add_argument('--rate-limits', action='store_true', help='keep the default rate scheduler')
+    args = parser.parse_args()
+    args.speed = 0 if args.speed == 'max' else float(args.speed)
+
+    logging.disable(logging.CRITICAL)
+    events = recording.load(args.trace) if args.trace else recording.synthetic(args.messages, args.rate, SOURCES)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result = asyncio.run(run(events, args))
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    latencies = result["latencies"]
+    span = events[-1].offset if events else 0
+    print(f"{len(events)} events over {span:.1f}s of trace, replayed at {f'{args.speed:g}x' if args.speed else 'max speed'} in {result['fed']:.2f}s")
+    print(f"delivered {result['delivered']}/{len(events)} in {result['elapsed']:.2f}s: "
+          f"{result['delivered'] / result['elapsed']:.0f} msg/s")
+    print(f"latency p50 {percentile(latencies, 0.5) * 1000:.1f} ms, p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+    print(f"peak RSS {rss_peak / 1024:.0f} MB (+{(rss_peak - rss_before) / 1024:.0f} MB during the run)")
+    print("RPCs: " + ", ".join(f"{name}={count}" for name, count in sorted(result["rpcs"].items())))
+    if result["errors"]:
+        print("injected errors: " + ", ".join(f"{name}={count}" for name, count in sorted(result["errors"].items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Event-loop time spent in logging per forwarded message, before and after the queue pipeline.
+
+    python -m benchmarks.bench_logging [messages]
+
+"sync f-strings" is the previous setup: logging.basicConfig (a StreamHandler
+formatting and writing on the calling thread) and the five INFO f-strings
+the handler and _forward emitted per message. "queue f-strings" keeps those
+calls but enqueues records for the listener thread. "queue sampled" is the
+current path: one structured log_message() per message, rate-limited at
+INFO. Only the time on the calling thread (the event loop) is measured;
+records go to a file so the writer is never slowed by a terminal.
+"""
+import logging
+import sys
+import tempfile
+import time
+
+from tscraper import logs
+from tscraper.logs import log_message, setup_logging
+
+logger = logging.getLogger("tscraper.bench")
+
+
+def legacy_calls(message_id: int):
+    source, target = "-1001234567890", "@target"
+    logger.info("Received new message event")
+    logger.info("Received message event")
+    logger.info(f"Sending message from {source} to {target}")
+    logger.info(f"Successfully sent message from {source} to {target}")
+    logger.info(f"Message {message_id} from {source} was already forwarded, skipping")
+
+
+def sampled_calls(message_id: int):
+    log_message(logger, 'forwarded', chat_id=-1001234567890, message_id=message_id, category='news',
+                target='@target', stage='forward', duration=0.0312)
+
+
+def measure(calls, n: int) -> float:
+    t0 = time.perf_counter()
+    for message_id in range(n):
+        calls(message_id)
+    return (time.perf_counter() - t0) / n
+
+
+def reset_root():
+    logs._stop_listener()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    with tempfile.NamedTemporaryFile("w") as sink:
+        sys.stderr = sink
+        try:
+            reset_root()
+            logging.basicConfig(stream=sink, level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+            sync = measure(legacy_calls, n)
+
+            reset_root()
+            setup_logging({"log_message_rate": 0})
+            queued = measure(legacy_calls, n)
+
+            reset_root()
+            setup_logging({"log_message_rate": 10})
+            sampled = measure(sampled_calls, n)
+            setup_logging({"log_message_rate": 0})
+            structured = measure(sampled_calls, n)
+            reset_root()
+        finally:
+            sys.stderr = sys.__stderr__
+
+    print(f"{n} messages, event-loop time per message")
+    print(f"{'pipeline':>22} {'us/message':>11}")
+    print(f"{'sync f-strings':>22} {sync * 1e6:>11.1f}")
+    print(f"{'queue f-strings':>22} {queued * 1e6:>11.1f}")
+    print(f"{'queue structured':>22} {structured * 1e6:>11.1f}")
+    print(f"{'queue sampled 10/s':>22} {sampled * 1e6:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Files sent to a target when sources repost the same photos, per repeat_media action.
+
+    python -m benchmarks.bench_media [messages]
+
+Four sources post ``messages`` photos (default 4000), each drawn from a
+pool of 500 files with Zipf-like popularity (a few viral images reposted
+many times), and every photo carries its own caption. All of them go to
+one target through the full pipeline against FakeClient. "files" counts
+the photos that reached the target and "MB" their size, "calls" every RPC
+made to the target; the hit rate is that of the per-target lookups and
+"cache" the media cache's estimated memory. The last rows cap the cache
+so the LRU evicts, trading hit rate for memory.
+"""
+import asyncio
+import logging
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from prometheus_client import REGISTRY
+
+from benchmarks.bench_load import LoadScraper
+from benchmarks.fake_client import FakeClient
+from telethon.tl.types import MessageMediaPhoto, Photo, PhotoSize
+
+SOURCES = [-1003000000001, -1003000000002, -1003000000003, -1003000000004]
+POOL = 500
+
+
+def photo(index: int) -> MessageMediaPhoto:
+    size = 80_000 + index * 997 % 400_000
+    return MessageMediaPhoto(photo=Photo(10_000 + index, 77 * index, b"ref", datetime.now(timezone.utc),
+                                         [PhotoSize("y", 1280, 960, size)], 2))
+
+
+def build_events(messages: int):
+    rng = random.Random(1)
+    weights = [1 / (rank + 1) for rank in range(POOL)]
+    media = [photo(index) for index in range(POOL)]
+    events = []
+    for message_id in range(1, messages + 1):
+        chat_id = SOURCES[message_id % len(SOURCES)]
+        file = rng.choices(media, weights)[0]
+        events.append(SimpleNamespace(
+            id=message_id, chat_id=chat_id, date=datetime.now(timezone.utc), message=f"post {message_id}",
+            grouped_id=None, media=file, photo=file.photo, entities=None, noforwards=False,
+        ))
+    return events
+
+
+def lookups(result: str) -> float:
+    return REGISTRY.get_sample_value("tscraper_media_cache_lookups_total", {"kind": "sent", "result": result}) or 0
+
+
+async def run(events, repeat_media, cache_mb):
+    channels = {"load": [str(chat_id) for chat_id in SOURCES], "target_channels": {"load": "@media_target"}}
+    settings = {"forward_workers": 16, "per_target_concurrency": 16, "target_rate": 0, "account_rate": 0,
+                "repeat_media": repeat_media, "media_cache_mb": cache_mb}
+    scraper = LoadScraper(1, "hash", {"channels": channels, "settings": settings})
+    client = scraper.client = FakeClient(latency=0.001)
+    files = []
+    forward_messages = client.forward_messages
+
+    async def record_files(entity, messages, *args, **kwargs):
+        files.extend(m.media.photo for m in (messages if isinstance(messages, list) else [messages]))
+        return await forward_messages(entity, messages, *args, **kwargs)
+
+    client.forward_messages = record_files
+    hits, misses = lookups("hit"), lookups("miss")
+    t0 = time.perf_counter()
+    for message in events:
+        await scraper._handle_message(SimpleNamespace(message=message, chat_id=message.chat_id))
+    await scraper.queue.join()
+    elapsed = time.perf_counter() - t0
+    await scraper.queue.stop()
+    hits, misses = lookups("hit") - hits, lookups("miss") - misses
+    calls = sum(client.rpcs[m] for m in ("forward_messages", "send_message", "send_file"))
+    size = sum(p.sizes[0].size for p in files) / 2**20
+    cache = scraper.media_cache.size / 1024 if scraper.media_cache else 0
+    return calls, len(files), size, hits / (hits + misses) if hits + misses else None, cache, elapsed
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    logging.disable(logging.CRITICAL)
+    events = build_events(messages)
+    distinct = len({event.media.photo.id for event in events})
+    print(f"{messages} photo posts from {len(SOURCES)} sources, {distinct} distinct files")
+    print(f"{'repeat_media':>18} {'calls':>6} {'files':>6} {'MB':>7} {'hit rate':>9} {'cache KB':>9} {'s':>6}")
+    modes = [("forward", 16), ("skip", 16), ("caption", 16), ("skip", 0.1), ("skip", 0.05)]
+    for repeat_media, cache_mb in modes:
+        calls, files, size, hit_rate, cache, elapsed = asyncio.run(run(events, repeat_media, cache_mb))
+        name = repeat_media if cache_mb == 16 else f"{repeat_media} ({cache_mb * 1024:g} KB)"
+        rate = f"{hit_rate:.1%}" if hit_rate is not None else "-"
+        print(f"{name:>18} {calls:>6} {files:>6} {size:>7.1f} {rate:>9} {cache:>9.1f} {elapsed:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
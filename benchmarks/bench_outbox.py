@@ -0,0 +1,51 @@
+"""Cost of journaling a forward in the outbox, per group-commit interval.
+
+    python -m benchmarks.bench_outbox
+
+Every append is fsynced before it returns, so compare the latency against a
+typical forward_messages round trip (tens to hundreds of milliseconds).
+"""
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from tscraper.outbox import Outbox
+
+APPENDS = 2000
+CONCURRENCY = 50
+
+
+async def run(path: str, interval_ms: float):
+    outbox = Outbox(path, commit_interval=interval_ms / 1000)
+    latencies = []
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def append(i):
+        async with semaphore:
+            t0 = time.perf_counter()
+            entry_id = await outbox.append("@target", -1001, [i], "news", "@source")
+            latencies.append(time.perf_counter() - t0)
+            outbox.ack(entry_id)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(append(i) for i in range(APPENDS)))
+    elapsed = time.perf_counter() - t0
+    await outbox.close()
+    latencies.sort()
+    return APPENDS / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    print(f"{APPENDS} appends, {CONCURRENCY} concurrent writers")
+    print(f"{'interval':>9} {'appends/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for interval in (0, 2, 5, 20):
+            path = str(Path(tmp) / f"outbox-{interval}.sqlite3")
+            rate, p50, p99 = asyncio.run(run(path, interval))
+            print(f"{interval:>6} ms {rate:>10.0f} {p50 * 1000:>8.2f} {p99 * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
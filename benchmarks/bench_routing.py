@@ -0,0 +1,39 @@
+"""Compare per-message routing cost of the linear config scan and RoutingTable.
+
+    python -m benchmarks.bench_routing
+"""
+import timeit
+
+from tscraper.routing import RoutingTable
+
+
+def build_config(n_sources: int, n_categories: int = 20) -> dict:
+    channels = {f"cat{c}": [] for c in range(n_categories)}
+    for i in range(n_sources):
+        channels[f"cat{i % n_categories}"].append(f"@source{i}")
+    channels["target_channels"] = {f"cat{c}": f"@target{c}" for c in range(n_categories)}
+    return channels
+
+
+def linear_lookup(channels: dict, source: str):
+    # The scan _handle_message used to run twice per message
+    for category, sources in channels.items():
+        if category != "target_channels" and source in sources:
+            return category, channels["target_channels"].get(category)
+    return None
+
+
+def main():
+    number = 2000
+    print(f"{'sources':>8} {'linear us/op':>14} {'table us/op':>12}")
+    for n in (100, 1_000, 10_000):
+        channels = build_config(n)
+        routes = RoutingTable(channels)
+        probe = f"source{n - 1}"  # worst case for the scan: last entry
+        linear = timeit.timeit(lambda: linear_lookup(channels, "@" + probe), number=number)
+        table = timeit.timeit(lambda: routes.lookup(probe), number=number)
+        print(f"{n:>8} {linear / number * 1e6:>14.2f} {table / number * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
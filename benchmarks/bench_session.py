@@ -0,0 +1,101 @@
+"""Session storage cost per message: Telethon's SQLite session against WriteBehindSession.
+
+    python -m benchmarks.bench_session [messages]
+
+Replays the calls Telethon makes on the session while receiving channel
+posts at RATE per second: process_entities() for every update (the same 50
+channels, with a new entity every NEW_ENTITY_EVERY messages), and once a
+"minute" the update state plus save(). WriteBehindSession is flushed every
+10 or 60 simulated seconds (session_flush_interval) as its writer thread
+would; each flush rewrites the whole snapshot, so bytes grow with the
+number of known entities while write calls stay low. Disk writes
+are the process's write syscalls and bytes from /proc/self/io; "loop" times
+are the calls made on the event loop.
+"""
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from telethon.sessions import SQLiteSession
+from telethon.tl import types
+
+from tscraper.session import WriteBehindSession
+
+RATE = 100
+SAVE_EVERY = 60 * RATE
+NEW_ENTITY_EVERY = 500
+
+
+def channel(channel_id: int):
+    return types.Channel(
+        id=channel_id, title=f"Channel {channel_id}", photo=types.ChatPhotoEmpty(), date=None,
+        access_hash=channel_id * 7919, username=f"channel{channel_id}",
+    )
+
+
+def io_counters():
+    counters = {}
+    with open("/proc/self/io") as f:
+        for line in f:
+            key, value = line.split(":")
+            counters[key] = int(value)
+    return counters
+
+
+def run(session, messages: int, flush=None, flush_interval: int = 10):
+    channels = [channel(1000 + i) for i in range(50)]
+    update_costs, save_costs = [], []
+    before = io_counters()
+    for n in range(1, messages + 1):
+        source = channels[n % len(channels)]
+        if n % NEW_ENTITY_EVERY == 0:
+            source = channel(100_000 + n)
+        t0 = time.perf_counter()
+        session.process_entities(types.contacts.ResolvedPeer(None, [], [source]))
+        update_costs.append(time.perf_counter() - t0)
+        if n % SAVE_EVERY == 0:
+            t0 = time.perf_counter()
+            state = types.updates.State(pts=n, qts=0, date=datetime.now(timezone.utc), seq=n, unread_count=0)
+            session.set_update_state(0, state)
+            session.save()
+            save_costs.append(time.perf_counter() - t0)
+        if flush is not None and n % (flush_interval * RATE) == 0:
+            flush()
+    session.close()
+    after = io_counters()
+    return {
+        "update_us": statistics.mean(update_costs) * 1e6,
+        "save_ms": max(save_costs, default=0) * 1000,
+        "syscw": after["syscw"] - before["syscw"],
+        "bytes": after["write_bytes"] - before["write_bytes"] or after["wchar"] - before["wchar"],
+    }
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 60_000
+    directory = tempfile.mkdtemp()
+    try:
+        sqlite = run(SQLiteSession(os.path.join(directory, "bench")), messages)
+        # The writer thread is replaced by explicit flushes at the same simulated interval
+        write_behind = {}
+        for interval in (10, 60):
+            session = WriteBehindSession(os.path.join(directory, f"bench{interval}.session.json"), flush_interval=3600)
+            write_behind[interval] = run(session, messages, flush=session.flush, flush_interval=interval)
+    finally:
+        shutil.rmtree(directory)
+
+    print(f"{messages} updates at {RATE}/s simulated ({messages / RATE / 60:.0f} min), "
+          f"save() every 60 s, a new entity every {NEW_ENTITY_EVERY} updates")
+    print(f"{'session':>12} {'loop us/update':>15} {'max save ms':>12} {'writes':>8} {'writes/1k msg':>14} {'KB written':>11}")
+    rows = [("sqlite", sqlite)] + [(f"wb {interval}s", result) for interval, result in write_behind.items()]
+    for name, result in rows:
+        print(f"{name:>12} {result['update_us']:>15.1f} {result['save_ms']:>12.2f} {result['syscw']:>8} "
+              f"{result['syscw'] * 1000 / messages:>14.1f} {result['bytes'] / 1024:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
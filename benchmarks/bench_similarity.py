@@ -0,0 +1,79 @@
+"""Near-duplicate index: lookup latency and memory against the index size.
+
+    python -m benchmarks.bench_similarity [max_size]
+
+Fills one category of NearDuplicateIndex (4 bands) with random
+fingerprints, then times check() for unseen posts (the common case: a miss
+that is inserted; also counts random posts wrongly flagged) and for
+near-duplicates differing in exactly the threshold number of bits. Memory
+is the summed size of the index's containers and the objects they hold.
+
+Index sizes go up to ``max_size`` (default 100000, about 10 seconds);
+``1000000`` adds the 1M rows, which take several minutes to fill.
+"""
+import random
+import string
+import sys
+import time
+import timeit
+
+from tscraper.similarity import NearDuplicateIndex, fingerprint
+
+
+def index_memory(index: NearDuplicateIndex) -> int:
+    size = sys.getsizeof(index._entries) + sys.getsizeof(index._buckets)
+    for key, expires in index._entries.items():
+        size += sys.getsizeof(key) + sys.getsizeof(expires)
+    for bucket_key, bucket in index._buckets.items():
+        size += sys.getsizeof(bucket_key) + sys.getsizeof(bucket)
+    return size
+
+
+def flip(fp: int, bits: int, rng: random.Random) -> int:
+    for bit in rng.sample(range(64), bits):
+        fp ^= 1 << bit
+    return fp
+
+
+def main():
+    max_size = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(0)
+
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(100)]
+    text = " ".join(words)
+    number = 1000
+    cost = timeit.timeit(lambda: fingerprint(text), number=number) / number * 1e6
+    print(f"fingerprint of a 100-word post: {cost:.1f} us\n")
+
+    print(f"{'threshold':>9} {'entries':>9} {'miss us':>8} {'near-dup us':>12} "
+          f"{'recall':>7} {'false pos':>10} {'MB':>7} {'B/entry':>8}")
+    for threshold in (0.9, 0.85):
+        for size in (10_000, 100_000, 1_000_000):
+            if size > max_size:
+                continue
+            # Room for the probes, so nothing stored is evicted while measuring
+            index = NearDuplicateIndex(threshold=threshold, bands=4, window=3600, maxsize=size + 10 * number)
+            stored = []
+            while len(index) < size:
+                fp = rng.getrandbits(64)
+                if not index.check("news", fp, now=0.0):
+                    stored.append(fp)
+            memory = index_memory(index)
+
+            probes = [rng.getrandbits(64) for _ in range(number)]
+            t0 = time.perf_counter()
+            false_positives = sum(index.check("news", fp, now=1.0) for fp in probes)
+            miss = (time.perf_counter() - t0) / number * 1e6
+
+            # Near-duplicates right at the threshold distance
+            near = [flip(rng.choice(stored), index.max_distance, rng) for _ in range(number)]
+            t0 = time.perf_counter()
+            found = sum(index.check("news", fp, now=1.0) for fp in near)
+            hit = (time.perf_counter() - t0) / number * 1e6
+
+            print(f"{threshold:>9} {size:>9} {miss:>8.1f} {hit:>12.1f} {found / number:>7.1%} "
+                  f"{false_positives / number:>10.2%} {memory / 2**20:>7.1f} {memory / size:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""In-process stand-in for TelegramClient used by the load benchmarks.
+
+Implements the calls the forwarding path makes (forward_messages,
+send_message, send_file, iter_messages, get_messages, get_entity,
+get_permissions) with a configurable latency, a random error rate and
+injected FloodWaitError, and counts every RPC by method.
+"""
+import asyncio
+import random
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, List
+
+from telethon.errors import FloodWaitError
+
+
+class FakeClient:
+    def __init__(
+        self,
+        latency: float = 0.03,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        flood_rate: float = 0.0,
+        flood_seconds: int = 1,
+        history: Dict[int, List] | None = None,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.history = history or {}
+        self.rpcs = Counter()
+        self.errors = Counter()
+        self._random = random.Random(seed)
+
+    async def _rpc(self, method: str, fail: bool = False):
+        self.rpcs[method] += 1
+        delay = self.latency
+        if self.jitter:
+            delay += self._random.uniform(0, self.jitter)
+        await asyncio.sleep(delay)
+        if fail and self.flood_rate and self._random.random() < self.flood_rate:
+            self.errors['flood_wait'] += 1
+            raise FloodWaitError(request=None, capture=self.flood_seconds)
+        if fail and self.error_rate and self._random.random() < self.error_rate:
+            self.errors[method] += 1
+            raise RuntimeError(f"injected {method} error")
+
+    # Connection
+
+    def is_connected(self) -> bool:
+        return True
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def is_user_authorized(self) -> bool:
+        return True
+
+    def on(self, event):
+        return lambda handler: handler
+
+    # Sending
+
+    async def forward_messages(self, entity, messages, *args, **kwargs):
+        await self._rpc('forward_messages', fail=True)
+        return messages
+
+    async def send_message(self, entity, message='', *args, **kwargs):
+        await self._rpc('send_message', fail=True)
+        return SimpleNamespace(id=self.rpcs['send_message'])
+
+    async def send_file(self, entity, file, *args, **kwargs):
+        await self._rpc('send_file', fail=True)
+        return SimpleNamespace(id=self.rpcs['send_file'])
+
+    # Reading
+
+    async def get_entity(self, entity):
+        await self._rpc('get_entity')
+        if isinstance(entity, str):
+            return SimpleNamespace(id=abs(hash(entity)) % 10**9, username=entity.lstrip('@'), title=entity)
+        return SimpleNamespace(id=getattr(entity, 'channel_id', entity), username=None, title=str(entity))
+
+    async def get_permissions(self, entity, user=None):
+        await self._rpc('get_permissions')
+        return SimpleNamespace(is_admin=True, post_messages=True, is_creator=False)
+
+    async def get_messages(self, entity, limit=None, ids=None, **kwargs):
+        await self._rpc('get_messages')
+        history = self.history.get(entity, [])
+        if ids is not None:
+            wanted = set(ids if isinstance(ids, list) else [ids])
+            return [m for m in history if m.id in wanted]
+        return list(reversed(history))[:limit]
+
+    async def iter_messages(self, entity, limit=None, reverse=False, min_id=0, offset_date=None, **kwargs):
+        history = [m for m in self.history.get(entity, []) if m.id > min_id]
+        if offset_date is not None:
+            history = [m for m in history if m.date >= offset_date]
+        if not reverse:
+            history.reverse()
+        if limit is not None:
+            history = history[:limit]
+        for start in range(0, len(history), 100):
+            # One GetHistory request per page
+            await self._rpc('iter_messages')
+            for message in history[start:start + 100]:
+                yield message
@@ -0,0 +1,181 @@
+"""Record live NewMessage events to a compact trace and replay traces offline.
+
+    python -m benchmarks.recording OUTPUT.jsonl.gz [--duration SECONDS] [--config config.yaml] [--session NAME]
+
+Recording connects with the scraper's credentials and session and writes
+every message from the configured sources as one JSON array per line,
+``[offset_ms, chat_id, message_id, grouped_id, media_type, text]``, after a
+header line, gzipped. Media are stored as their kind only. ``replay()``
+feeds a trace into ``TelegramScraper._handle_message`` at the recorded pace
+scaled by ``speed`` (0 replays as fast as the scraper accepts events).
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Callable, Iterator, List, NamedTuple, Sequence
+
+from tscraper.filters import media_types
+
+VERSION = 1
+
+
+class TraceEvent(NamedTuple):
+    offset: float  # seconds since the start of the trace
+    chat_id: int
+    message_id: int
+    grouped_id: int | None
+    media_type: str
+    text: str
+
+
+class TraceWriter:
+    def __init__(self, path: str):
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._file.write(json.dumps({'version': VERSION, 'recorded_at': datetime.now(timezone.utc).isoformat()}) + '\n')
+        self._started = time.monotonic()
+        self.count = 0
+
+    def add(self, chat_id: int, message) -> None:
+        offset_ms = round((time.monotonic() - self._started) * 1000)
+        row = [offset_ms, chat_id, message.id, message.grouped_id, media_types(message)[0], message.message or '']
+        self._file.write(json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.count += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def load(path: str) -> List[TraceEvent]:
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(next(f))
+        if header.get('version') != VERSION:
+            raise ValueError(f"unsupported trace version {header.get('version')!r}")
+        return [
+            TraceEvent(offset_ms / 1000, chat_id, message_id, grouped_id, media_type, text)
+            for offset_ms, chat_id, message_id, grouped_id, media_type, text in map(json.loads, f)
+        ]
+
+
+def synthetic(
+    count: int, rate: float, sources: Sequence[int], album_share: float = 0.05, seed: int = 0
+) -> List[TraceEvent]:
+    """A generated trace: ``count`` messages at ``rate`` per second, spread over ``sources``."""
+    rng = random.Random(seed)
+    words = ["".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(2, 9))) for _ in range(2000)]
+    events = []
+    next_id = {chat_id: 1 for chat_id in sources}
+    index = 0
+    while index < count:
+        chat_id = rng.choice(sources)
+        size = rng.randint(2, 6) if rng.random() < album_share else 1
+        grouped_id = rng.getrandbits(62) if size > 1 else None
+        for part in range(min(size, count - index)):
+            text = " ".join(rng.choices(words, k=rng.randint(5, 60))) if part == 0 else ""
+            media_type = 'photo' if grouped_id else rng.choice(('text', 'text', 'text', 'photo'))
+            events.append(TraceEvent(index / rate, chat_id, next_id[chat_id], grouped_id, media_type, text))
+            next_id[chat_id] += 1
+            index += 1
+    return events
+
+
+def to_message(event: TraceEvent):
+    """A Message stand-in with the attributes the forwarding path reads; ``date`` is now."""
+    media = None
+    kinds = {}
+    if event.media_type != 'text':
+        media = SimpleNamespace()
+        kinds[event.media_type] = True
+    return SimpleNamespace(
+        id=event.message_id,
+        chat_id=event.chat_id,
+        date=datetime.now(timezone.utc),
+        message=event.text,
+        grouped_id=event.grouped_id,
+        media=media,
+        entities=None,
+        noforwards=False,
+        **kinds,
+    )
+
+
+async def replay(
+    handler: Callable, events: Sequence[TraceEvent], speed: float = 1.0,
+    on_event: Callable[[TraceEvent], None] | None = None,
+) -> float:
+    """Feed ``events`` to ``handler`` (``_handle_message``); returns the elapsed time."""
+    t0 = time.perf_counter()
+    for event in events:
+        if speed:
+            delay = event.offset / speed - (time.perf_counter() - t0)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        if on_event is not None:
+            on_event(event)
+        await handler(SimpleNamespace(message=to_message(event), chat_id=event.chat_id))
+        if not speed:
+            # Let workers run between events, as the update loop would
+            await asyncio.sleep(0)
+    return time.perf_counter() - t0
+
+
+def iter_sources(config: dict) -> Iterator[str]:
+    for category, sources in config['channels'].items():
+        if category != 'target_channels':
+            yield from sources
+
+
+async def record(output: str, duration: float | None, config_path: str, session: str | None) -> int:
+    from telethon import events
+    from tscraper.tscraper import TelegramScraper, load_credentials, load_yaml_config
+
+    api_id, api_hash = load_credentials()
+    config = load_yaml_config(config_path)
+    sessions = (config.get('settings') or {}).get('sessions') or []
+    scraper = TelegramScraper(api_id, api_hash, config, session=session or (sessions[0] if sessions else 'my_user_session'))
+    client = await scraper._setup_client()
+    await client.connect()
+    if not await client.is_user_authorized():
+        raise SystemExit(f"Session {scraper.session_name} is not authorized; run auth.py first")
+    await scraper._resolve_usernames()
+
+    writer = TraceWriter(output)
+
+    async def on_message(event):
+        if scraper.routes.lookup_all(event.chat_id):
+            writer.add(event.chat_id, event.message)
+
+    client.add_event_handler(on_message, events.NewMessage())
+    print(f"Recording to {output}" + (f" for {duration:.0f}s" if duration else "; Ctrl+C to stop"))
+    try:
+        if duration:
+            await asyncio.sleep(duration)
+        else:
+            await client.run_until_disconnected()
+    finally:
+        writer.close()
+        await client.disconnect()
+    return writer.count
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.recording', description='Record live messages to a trace.')
+    parser.add_argument('output')
+    parser.add_argument('--duration', type=float, help='seconds to record (default: until interrupted)')
+    parser.add_argument('--config', default=os.getenv('CONFIG_PATH', 'config.yaml'))
+    parser.add_argument('--session')
+    args = parser.parse_args()
+    try:
+        count = asyncio.run(record(args.output, args.duration, args.config, args.session))
+    except KeyboardInterrupt:
+        return
+    print(f"Recorded {count} messages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from tscraper.albums import AlbumAssembler
+
+
+def make_part(msg_id, grouped_id=1):
+    msg = MagicMock()
+    msg.id = msg_id
+    msg.grouped_id = grouped_id
+    return msg
+
+
+@pytest.mark.asyncio
+async def test_flush_after_quiet_window():
+    on_flush = AsyncMock()
+    albums = AlbumAssembler(on_flush, quiet_window=0.01)
+    parts = [make_part(i) for i in (3, 1, 2)]
+    for part in parts:
+        albums.add(100, part, "ctx")
+    on_flush.assert_not_called()
+
+    await asyncio.sleep(0.05)
+    on_flush.assert_awaited_once_with(sorted(parts, key=lambda m: m.id), "ctx")
+    assert len(albums) == 0
+
+
+@pytest.mark.asyncio
+async def test_flush_on_max_size_and_duplicate_parts():
+    on_flush = AsyncMock()
+    albums = AlbumAssembler(on_flush, quiet_window=60, max_size=2)
+    first = make_part(1)
+    albums.add(100, first)
+    albums.add(100, first)  # redelivered part is not counted twice
+    assert len(albums) == 1
+
+    albums.add(100, make_part(2))
+    await albums.drain()
+    on_flush.assert_awaited_once()
+    assert [m.id for m in on_flush.await_args.args[0]] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_oldest_group_flushed_when_full():
+    on_flush = AsyncMock()
+    albums = AlbumAssembler(on_flush, quiet_window=60, max_groups=2)
+    albums.add(100, make_part(1, grouped_id=1))
+    albums.add(100, make_part(2, grouped_id=2))
+    albums.add(100, make_part(3, grouped_id=3))
+    assert len(albums) == 2
+
+    await asyncio.sleep(0)
+    on_flush.assert_awaited_once()
+    assert on_flush.await_args.args[0][0].grouped_id == 1
+    await albums.drain()
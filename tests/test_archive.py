@@ -0,0 +1,134 @@
+import asyncio
+import gzip
+import json
+import pytest
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from prometheus_client import REGISTRY
+from telethon.tl.types import Message
+from tscraper import archive
+from tscraper.archive import ArchiveSink
+from tscraper.tscraper import TelegramScraper
+
+DATE = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+
+
+def post(msg_id: int, text: str = "hello", grouped_id=None):
+    return SimpleNamespace(id=msg_id, date=DATE, message=text, grouped_id=grouped_id)
+
+
+def finished(directory, suffix):
+    return sorted(path for path in directory.iterdir() if path.name.endswith(suffix))
+
+
+@pytest.mark.asyncio
+async def test_parquet_batches_and_rotation(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    sink = ArchiveSink(str(tmp_path), format="parquet", rotate_bytes=1)
+    for i in range(3):
+        sink.add(-1001, post(i, grouped_id=7 if i else None), "news", "photo")
+    await sink.flush()
+    sink.add(-1002, post(9, text="привет"), "news,all", "text")
+    await sink.close()
+
+    # Every batch exceeded rotate_bytes, so each became its own file
+    files = finished(tmp_path, ".parquet")
+    assert len(files) == 2
+    assert not list(tmp_path.glob("*.tmp"))
+    rows = pq.read_table(files[0]).to_pylist() + pq.read_table(files[1]).to_pylist()
+    assert [row["message_id"] for row in rows] == [0, 1, 2, 9]
+    assert rows[0]["grouped_id"] is None and rows[1]["grouped_id"] == 7
+    assert rows[3] == {
+        "chat_id": -1002, "message_id": 9, "date": DATE, "category": "news,all",
+        "text": "привет", "media_type": "text", "grouped_id": None,
+    }
+
+
+@pytest.mark.asyncio
+async def test_jsonl_fallback_without_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "pq", None)
+    sink = ArchiveSink(str(tmp_path), format="parquet")
+    assert sink.format == "jsonl"
+    sink.add(-1001, post(1), "news", "text")
+    await sink.close()
+
+    [path] = finished(tmp_path, ".jsonl.gz")
+    with gzip.open(path, "rt") as f:
+        assert [json.loads(line) for line in f] == [{
+            "chat_id": -1001, "message_id": 1, "date": DATE.isoformat(), "category": "news",
+            "text": "hello", "media_type": "text", "grouped_id": None,
+        }]
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_drops_instead_of_blocking(tmp_path):
+    sink = ArchiveSink(str(tmp_path), format="jsonl", buffer_size=2, batch_size=2, flush_interval=60)
+    before = REGISTRY.get_sample_value("tscraper_archive_records_dropped_total") or 0
+    for i in range(3):
+        sink.add(-1001, post(i), "news", "text")
+    assert len(sink) == 2
+    assert REGISTRY.get_sample_value("tscraper_archive_records_dropped_total") == before + 1
+
+    # Reaching batch_size wakes the writer well before flush_interval
+    writer = asyncio.create_task(sink.run())
+    for _ in range(100):
+        await asyncio.sleep(0.01)
+        if not len(sink):
+            break
+    writer.cancel()
+    await asyncio.gather(writer, return_exceptions=True)
+    assert len(sink) == 0
+    assert len(finished(tmp_path, ".jsonl.gz")) == 1
+
+
+@pytest.mark.asyncio
+async def test_received_messages_are_archived_before_filters(mock_client, tmp_path):
+    config = {
+        "channels": {"news": ["-1001"], "target_channels": {"news": "@news"}},
+        "filters": {"news": {"exclude": {"keywords": ["spam"]}}},
+        "settings": {"archive_path": str(tmp_path), "archive_format": "jsonl", "target_rate": 0, "account_rate": 0},
+    }
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = mock_client
+    message = MagicMock(spec=Message)
+    message.id = 5
+    message.date = DATE
+    message.message = "spam offer"
+    message.grouped_id = None
+    message.media = None
+    event = AsyncMock()
+    event.message = message
+    event.chat_id = -1001
+
+    await scraper._handle_message(event)
+    await scraper.queue.stop()
+
+    mock_client.forward_messages.assert_not_called()
+    assert scraper.archive._buffer == [(-1001, 5, DATE, "news", "spam offer", "text", None)]
+
+
+@pytest.mark.asyncio
+async def test_redelivered_message_is_archived_once(mock_client, tmp_path):
+    config = {
+        "channels": {"news": ["-1001"], "target_channels": {"news": "@news"}},
+        "settings": {"archive_path": str(tmp_path), "archive_format": "jsonl", "target_rate": 0, "account_rate": 0},
+    }
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = mock_client
+    message = MagicMock(spec=Message)
+    message.id = 5
+    message.date = DATE
+    message.message = "news"
+    message.grouped_id = None
+    message.media = None
+    routes = scraper.routes.lookup_all(-1001)
+
+    await scraper._process_message(message, -1001, routes)
+    await scraper.queue.join()
+    # Catch-up reads it again after a reconnect
+    await scraper._process_message(message, -1001, routes)
+    await scraper.queue.stop()
+
+    mock_client.forward_messages.assert_called_once()
+    assert [record[1] for record in scraper.archive._buffer] == [5]
@@ -0,0 +1,78 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+from telethon.tl.types import Message
+from tscraper.backfill import Backfill, backfill_config, parse_args
+from tscraper.checkpoints import CheckpointStore
+from tscraper.tscraper import ConfigError, TelegramScraper
+from tests.test_scraper import AsyncIteratorMock
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+CONFIG = {
+    "channels": {
+        "news": ["-1001"],
+        "sport": ["-1002"],
+        "target_channels": {"news": "@news", "sport": "@sport"},
+    },
+    "settings": {"target_rate": 0, "account_rate": 0, "outbox_path": "data/outbox.sqlite3",
+                 "backfill_batch_window_ms": 10},
+}
+
+
+def history(*ids):
+    messages = []
+    for msg_id in ids:
+        msg = MagicMock(spec=Message)
+        msg.id = msg_id
+        msg.grouped_id = None
+        msg.message = f"post {msg_id}"
+        msg.media = None
+        msg.date = START + timedelta(days=msg_id)
+        messages.append(msg)
+    return messages
+
+
+def test_args_and_config():
+    args = parse_args(["--since", "2024-01-02", "--until", "2024-02-01T12:00+03:00", "--category", "news"])
+    assert args.since == datetime(2024, 1, 2, tzinfo=timezone.utc)
+    assert args.until.utcoffset() == timedelta(hours=3)
+
+    config = backfill_config(CONFIG, args.categories)
+    assert list(config["channels"]) == ["news", "target_channels"]
+    assert config["settings"]["batch_window_ms"] == 10
+    assert "outbox_path" not in config["settings"]
+    with pytest.raises(ConfigError):
+        backfill_config(CONFIG, ["weather"])
+
+
+@pytest.mark.asyncio
+async def test_backfill_resumes_from_checkpoint_and_stops_at_until(mock_client, tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    previous = CheckpointStore(path, scope="backfill")
+    previous.update(-1001, 2)
+    await previous.close()
+
+    settings = dict(CONFIG["settings"], checkpoint_path=path)
+    scraper = TelegramScraper(123, "hash", backfill_config({**CONFIG, "settings": settings}, ["news"]))
+    scraper.client = mock_client
+    mock_client.get_messages = AsyncMock(return_value=history(9))
+    mock_client.iter_messages = MagicMock(return_value=AsyncIteratorMock(history(3, 4, 5, 6)))
+
+    backfill = Backfill(scraper, until=START + timedelta(days=5), concurrency=2)
+    assert await backfill.run() == 3
+    await scraper.queue.stop()
+
+    mock_client.iter_messages.assert_called_once()
+    call = mock_client.iter_messages.call_args
+    assert call.args[0] == -1001
+    assert call.kwargs["min_id"] == 2
+    assert call.kwargs["reverse"] is True
+    # Batched into one forward, checkpointed apart from live forwarding
+    forwarded = mock_client.forward_messages.call_args
+    assert forwarded.args[0] == "@news"
+    assert [m.id for m in forwarded.args[1]] == [3, 4, 5]
+    assert backfill.checkpoints.get(-1001) == 5
+    await backfill.checkpoints.close()
+    assert await CheckpointStore(path, scope="backfill").load() == {-1001: 5}
+    assert await CheckpointStore(path).load() == {}
@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from telethon.tl.types import Message
+from tscraper.batching import MessageBatcher
+from tscraper.tscraper import TelegramScraper
+
+
+@pytest.mark.asyncio
+async def test_batch_flushed_after_window_in_order():
+    on_flush = AsyncMock()
+    batcher = MessageBatcher(on_flush, window=0.01)
+    for i in range(3):
+        batcher.add(("chat", "@t"), i, "ctx")
+    batcher.add(("other", "@t"), 9, "ctx2")
+    on_flush.assert_not_called()
+
+    await asyncio.sleep(0.05)
+    assert on_flush.await_count == 2
+    on_flush.assert_any_await([0, 1, 2], "ctx")
+    on_flush.assert_any_await([9], "ctx2")
+
+
+@pytest.mark.asyncio
+async def test_batch_flushed_at_max_size():
+    on_flush = AsyncMock()
+    batcher = MessageBatcher(on_flush, window=60, max_size=2)
+    batcher.add("k", 1)
+    batcher.add("k", 2)
+    batcher.add("k", 3)
+    await asyncio.sleep(0)
+    on_flush.assert_awaited_once_with([1, 2], None)
+    await batcher.drain()
+    assert on_flush.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_scraper_forwards_burst_in_one_call(mock_client, config):
+    config = {**config, "settings": {"batch_window_ms": 10}}
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = mock_client
+
+    chat = AsyncMock()
+    chat.username = "public_channel"
+    chat.id = -1001234567890
+
+    messages = []
+    for i in range(5):
+        msg = MagicMock(spec=Message)
+        msg.id = i + 1
+        msg.grouped_id = None
+        messages.append(msg)
+        event = AsyncMock()
+        event.message = msg
+        event.get_chat.return_value = chat
+        event.chat_id = chat.id
+        await scraper._handle_message(event)
+
+    await scraper.batcher.drain()
+    await scraper.queue.join()
+    await scraper.queue.stop()
+    mock_client.forward_messages.assert_called_once_with("@target_ai", messages)
@@ -0,0 +1,139 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from telethon.tl.types import Message
+from tscraper.checkpoints import CheckpointStore
+from tscraper.tscraper import TelegramScraper
+from tests.test_scraper import AsyncIteratorMock
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_only_moves_forward(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    store = CheckpointStore(path)
+    store.update(-100, 10)
+    store.update(-100, 5)
+    assert store.get(-100) == 10
+    await store.close()
+
+    reopened = CheckpointStore(path)
+    assert await reopened.load() == {-100: 10}
+    # Scopes are independent
+    assert await CheckpointStore(path, scope="backfill").load() == {}
+    await reopened.close()
+
+
+def test_checkpoint_stays_below_messages_in_flight():
+    store = CheckpointStore()
+    for message_id in (11, 12, 13):
+        store.hold(-100, message_id)
+    # 12 and 13 finish first; 11 is still being forwarded
+    for message_id in (13, 12):
+        store.update(-100, message_id)
+        store.release(-100, message_id)
+    assert store.get(-100) == 10
+    store.update(-100, 11)
+    store.release(-100, 11)
+    assert store.get(-100) == 13
+
+    # A failed message keeps holding the checkpoint, so catch-up reads it again
+    store.hold(-100, 14)
+    store.hold(-100, 15)
+    store.release(-100, 14, failed=True)
+    store.update(-100, 15)
+    store.release(-100, 15)
+    assert store.get(-100) == 13
+
+
+@pytest.mark.asyncio
+async def test_catch_up_forwards_missed_messages_in_order(mock_client, config):
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = mock_client
+    scraper.checkpoints.update(-1001234567890, 10)
+
+    chat = MagicMock()
+    chat.username = "public_channel"
+    chat.id = -1001234567890
+
+    missed = []
+    for msg_id in (11, 12, 13):
+        msg = MagicMock(spec=Message)
+        msg.id = msg_id
+        msg.grouped_id = None
+        msg.get_chat = AsyncMock(return_value=chat)
+        missed.append(msg)
+    mock_client.iter_messages = MagicMock(return_value=AsyncIteratorMock(missed))
+
+    await scraper._catch_up()
+    await scraper.queue.join()
+    await scraper.queue.stop()
+
+    assert mock_client.iter_messages.call_args.kwargs["min_id"] == 10
+    assert mock_client.iter_messages.call_args.kwargs["reverse"] is True
+    forwarded = [c.args[1] for c in mock_client.forward_messages.call_args_list]
+    assert sorted(m.id for m in forwarded) == [11, 12, 13]
+    assert scraper.checkpoints.get(-1001234567890) == 13
+
+
+@pytest.mark.asyncio
+async def test_filtered_messages_advance_checkpoint_and_catch_up_reaches_gap(mock_client, config):
+    config = {**config, "filters": {"news_ai": {"exclude": {"keywords": ["giveaway"]}}},
+              "settings": {"catchup_max_messages": 2}}
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = mock_client
+    scraper.checkpoints.update(-1001234567890, 10)
+
+    history = []
+    for msg_id in range(11, 16):
+        msg = MagicMock(spec=Message)
+        msg.id = msg_id
+        msg.grouped_id = None
+        msg.media = None
+        msg.message = "giveaway" if msg_id < 13 else f"news {msg_id}"
+        history.append(msg)
+    mock_client.iter_messages = MagicMock(return_value=AsyncIteratorMock(history))
+
+    await scraper._catch_up()
+    await scraper.queue.join()
+    await scraper.queue.stop()
+
+    # Reads past the dropped messages; the limit counts recovered ones only
+    assert mock_client.iter_messages.call_args.kwargs["limit"] is None
+    assert sorted(c.args[1].id for c in mock_client.forward_messages.call_args_list) == [13, 14]
+    assert scraper.checkpoints.get(-1001234567890) == 14
+
+
+@pytest.mark.asyncio
+async def test_catch_up_skips_chats_this_process_does_not_route(mock_client, config):
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = mock_client
+    scraper.checkpoints.update(-1001234567890, 10)
+    # Left behind by a relayed job, e.g. before an upgrade
+    scraper.checkpoints.update(-1005555555555, 10)
+    mock_client.iter_messages = MagicMock(return_value=AsyncIteratorMock([]))
+
+    await scraper._catch_up()
+
+    assert [c.args[0] for c in mock_client.iter_messages.call_args_list] == [-1001234567890]
+
+
+@pytest.mark.asyncio
+async def test_failed_forward_holds_checkpoint(mock_client, config):
+    scraper = TelegramScraper(123, "hash", {**config, "settings": {"target_rate": 0, "account_rate": 0}})
+    scraper.client = mock_client
+    scraper.checkpoints.update(-1001234567890, 10)
+    mock_client.forward_messages.side_effect = [RuntimeError("forward failed"), None]
+    mock_client.send_message.side_effect = RuntimeError("copy failed")
+
+    for message_id in (11, 12):
+        message = MagicMock(spec=Message)
+        message.id = message_id
+        message.grouped_id = None
+        message.media = None
+        message.noforwards = False
+        await scraper._process_message(message, -1001234567890, scraper.routes.lookup_all(-1001234567890))
+    await scraper.queue.join()
+    await scraper.queue.stop()
+
+    # 12 was forwarded, 11 was not: catch-up must start before 11
+    assert await scraper.dedup.seen(-1001234567890, 12)
+    assert scraper.checkpoints.get(-1001234567890) == 10
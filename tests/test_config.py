@@ -29,3 +29,53 @@ channels:
     config = load_yaml_config()
     assert 'news_ai' in config['channels']
     assert config['channels']['target_channels']['news_ai'] == '@target'
+
+def test_load_yaml_config_keeps_settings_out_of_channels(tmp_path):
+    config_path = tmp_path / 'config.yaml'
+    config_path.write_text("""
+news_ai:
+    - "@channel1"
+target_channels:
+    news_ai: "@target"
+settings:
+    album_quiet_window: 0.2
+    """)
+    os.environ['CONFIG_PATH'] = str(config_path)
+    config = load_yaml_config()
+    assert 'settings' not in config['channels']
+    assert config['settings']['album_quiet_window'] == 0.2
+
+def test_load_yaml_config_validates_filters(tmp_path):
+    config_path = tmp_path / 'config.yaml'
+    config_path.write_text("""
+news_ai:
+    - "@channel1"
+target_channels:
+    news_ai: "@target"
+filters:
+    news_ai:
+        exclude:
+            regex: ["(unclosed"]
+    """)
+    os.environ['CONFIG_PATH'] = str(config_path)
+    with pytest.raises(ConfigError, match="Invalid regex"):
+        load_yaml_config()
+
+def test_load_yaml_config_parses_priorities(tmp_path):
+    config_path = tmp_path / 'config.yaml'
+    config_path.write_text("""
+breaking:
+    - "@channel1"
+target_channels:
+    breaking: "@target"
+priorities:
+    breaking: {priority: 10, max_lag: 5}
+    """)
+    os.environ['CONFIG_PATH'] = str(config_path)
+    config = load_yaml_config()
+    assert 'priorities' not in config['channels']
+    assert config['priorities']['breaking'] == {'priority': 10, 'max_lag': 5}
+
+    config_path.write_text(config_path.read_text().replace("priority: 10", "priority: 0"))
+    with pytest.raises(ConfigError, match="priority must be positive"):
+        load_yaml_config()
@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import pytest
+from unittest.mock import MagicMock
+from telethon.tl.functions.messages import UploadMediaRequest
+from telethon.tl.functions.upload import SaveBigFilePartRequest, SaveFilePartRequest
+from telethon.tl.types import (
+    Document, DocumentAttributeFilename, InputFile, InputFileBig, InputMediaPhoto,
+    Message, MessageMediaDocument, MessageMediaPhoto, Photo,
+)
+from tscraper import copier
+from tscraper.copier import MediaCopier
+from tscraper.tscraper import TelegramScraper
+
+
+def photo_message(msg_id: int, photo_id: int, noforwards: bool = True, text: str = "caption"):
+    message = MagicMock(spec=Message)
+    message.id = msg_id
+    message.message = text
+    message.entities = None
+    message.grouped_id = 7
+    message.noforwards = noforwards
+    message.media = MessageMediaPhoto(photo=Photo(photo_id, 1, b"ref", None, [], 2))
+    return message
+
+
+def fake_transfer(client, chunks, events):
+    """Wire iter_download and the raw API calls of a mocked client, logging their order."""
+    async def iter_download(media, **kwargs):
+        for i, chunk in enumerate(chunks):
+            await asyncio.sleep(0)
+            events.append(f"down{i}")
+            yield chunk
+
+    async def call(request):
+        if isinstance(request, (SaveFilePartRequest, SaveBigFilePartRequest)):
+            events.append(f"up{request.file_part}")
+            return True
+        if isinstance(request, UploadMediaRequest):
+            events.append("register")
+            return MessageMediaPhoto(photo=Photo(99, 1, b"new", None, [], 2))
+        raise AssertionError(request)
+
+    client.iter_download = iter_download
+    client.side_effect = call
+
+
+@pytest.mark.asyncio
+async def test_protected_photo_is_uploaded_once_for_all_targets(mock_client):
+    events = []
+    chunks = [b"a" * 10, b"b" * 10, b"c" * 5]
+    fake_transfer(mock_client, chunks, events)
+    media_copier = MediaCopier()
+    message = photo_message(1, photo_id=42)
+
+    await asyncio.gather(*(media_copier.send(mock_client, target, [message]) for target in ("@a", "@b")))
+    # Reposted later: served from the cache
+    await media_copier.send(mock_client, "@c", [photo_message(2, photo_id=42)])
+
+    assert events.count("register") == 1
+    assert [e for e in events if e.startswith("down")] == ["down0", "down1", "down2"]
+    assert mock_client.send_file.call_count == 3
+    sent = [call.args[1] for call in mock_client.send_file.call_args_list]
+    assert all(isinstance(media, InputMediaPhoto) and media.id.id == 99 for media in sent)
+
+    register = next(c.args[0] for c in mock_client.call_args_list if isinstance(c.args[0], UploadMediaRequest))
+    uploaded = register.media.file
+    assert isinstance(uploaded, InputFile)
+    assert uploaded.parts == 3
+    assert uploaded.md5_checksum == hashlib.md5(b"".join(chunks)).hexdigest()
+
+
+@pytest.mark.asyncio
+async def test_big_file_is_piped_with_a_bounded_buffer(mock_client, monkeypatch):
+    monkeypatch.setattr(copier, "BIG_FILE_SIZE", 1)
+    events = []
+    fake_transfer(mock_client, [b"x"] * 6, events)
+    size = 6 * copier.PART_SIZE
+    message = photo_message(1, photo_id=1)
+    message.media = MessageMediaDocument(document=Document(
+        5, 1, b"ref", None, "video/mp4", size, 2, [DocumentAttributeFilename("clip.mp4")]
+    ))
+
+    await MediaCopier(buffer_parts=1).send(mock_client, "@a", [message])
+
+    parts = [c.args[0] for c in mock_client.call_args_list if isinstance(c.args[0], SaveBigFilePartRequest)]
+    assert [p.file_part for p in parts] == list(range(6))
+    assert {p.file_total_parts for p in parts} == {6}
+    # Uploading starts while the download is still running
+    assert events.index("up0") < events.index("down3")
+    register = next(c.args[0] for c in mock_client.call_args_list if isinstance(c.args[0], UploadMediaRequest))
+    assert register.media.file == InputFileBig(register.media.file.id, 6, "clip.mp4")
+    assert register.media.mime_type == "video/mp4"
+
+
+@pytest.mark.asyncio
+async def test_copy_mode_always_sends_album_in_one_call(mock_client):
+    config = {
+        "channels": {"news": ["-1001"], "target_channels": {"news": "@target"}},
+        "settings": {"copy_mode": "always", "target_rate": 0, "account_rate": 0},
+    }
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = mock_client
+    messages = [photo_message(i, photo_id=i, noforwards=False, text=f"part {i}") for i in (1, 2)]
+
+    assert await scraper._forward("@target", messages, "news", "source", album=True)
+
+    mock_client.forward_messages.assert_not_called()
+    mock_client.send_file.assert_called_once()
+    call = mock_client.send_file.call_args
+    assert [media.id.id for media in call.args[1]] == [1, 2]
+    assert call.kwargs["caption"] == ["part 1", "part 2"]
+    # Unprotected media is re-sent by reference, without a transfer
+    mock_client.assert_not_called()
@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from tscraper.dedup import DedupStore
+from tscraper.tscraper import TelegramScraper
+
+
+@pytest.mark.asyncio
+async def test_memory_only_store():
+    store = DedupStore()
+    assert not await store.seen(-100, 1)
+    store.add(-100, 1, grouped_id=7)
+    assert await store.seen(-100, 1)
+    # Another part of an already forwarded album
+    assert await store.seen(-100, 2, grouped_id=7)
+    assert not await store.seen(-100, 2)
+
+
+@pytest.mark.asyncio
+async def test_survives_restart(tmp_path):
+    path = str(tmp_path / "dedup.sqlite3")
+    store = DedupStore(path)
+    store.add(-100, 1)
+    await store.close()
+
+    reopened = DedupStore(path)
+    assert await reopened.seen(-100, 1)
+    assert not await reopened.seen(-100, 2)
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_lru_bound_and_ttl(tmp_path):
+    store = DedupStore(str(tmp_path / "dedup.sqlite3"), capacity=2, ttl=3600)
+    for msg_id in range(5):
+        store.add(-100, msg_id)
+    assert len(store._lru) == 2
+    await store.flush()
+    # Evicted from memory but still found on disk
+    assert await store.seen(-100, 0)
+
+    store.ttl = 0
+    await store.prune()
+    store._lru.clear()
+    assert not await store.seen(-100, 0)
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_redelivered_message_forwarded_once(mock_client, mock_message, config):
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = mock_client
+    mock_message.grouped_id = None
+
+    chat = AsyncMock()
+    chat.username = "public_channel"
+    chat.id = -1001234567890
+
+    for _ in range(2):
+        event = AsyncMock()
+        event.message = mock_message
+        event.get_chat.return_value = chat
+        event.chat_id = chat.id
+        await scraper._handle_message(event)
+        await scraper.queue.join()
+    await scraper.queue.stop()
+
+    mock_client.forward_messages.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_reservation_held_until_added_or_released():
+    store = DedupStore()
+    store.reserve(-100, 1)
+    store.reserve(-100, 1)
+    assert await store.seen(-100, 1)
+    store.release(-100, 1)
+    assert await store.seen(-100, 1)  # one holder left
+    store.release(-100, 1)
+    assert not await store.seen(-100, 1)
+
+    store.reserve(-100, 2)
+    store.add(-100, 2)
+    store.release(-100, 2)
+    assert await store.seen(-100, 2)
+
+
+@pytest.mark.asyncio
+async def test_redelivery_while_in_flight_forwarded_once(mock_client, mock_message, config):
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = mock_client
+    mock_message.grouped_id = None
+    mock_message.media = None
+    release = asyncio.Event()
+
+    async def slow_forward(*args, **kwargs):
+        await release.wait()
+
+    mock_client.forward_messages.side_effect = slow_forward
+    for _ in range(2):
+        event = AsyncMock()
+        event.message = mock_message
+        event.chat_id = -1001234567890
+        await scraper._handle_message(event)
+        await asyncio.sleep(0.01)
+    release.set()
+    await scraper.queue.join()
+
+    mock_client.forward_messages.assert_called_once()
+    # A failed forward gives the message back
+    mock_client.forward_messages.side_effect = RuntimeError("down")
+    mock_client.send_message.side_effect = RuntimeError("down")
+    mock_message.id = 124
+    for _ in range(2):
+        event = AsyncMock()
+        event.message = mock_message
+        event.chat_id = -1001234567890
+        await scraper._handle_message(event)
+        await scraper.queue.join()
+    await scraper.queue.stop()
+    assert mock_client.forward_messages.call_count == 3
@@ -0,0 +1,118 @@
+import asyncio
+import pytest
+from telethon.extensions import html
+from tscraper import digest as digest_module
+from tscraper.digest import (
+    MAX_POST_LENGTH,
+    DigestBuffer,
+    DigestEntry,
+    DigestError,
+    DigestPolicy,
+    message_link,
+    parse_digests,
+    render,
+    snippet,
+    utf16_length,
+)
+
+
+def test_parse_digests():
+    policies = parse_digests({"crypto": {"interval_minutes": 30, "max_messages": 50, "title": "Crypto"}, "memes": None})
+    assert policies == {"crypto": DigestPolicy(1800.0, 50, "Crypto"), "memes": DigestPolicy()}
+    with pytest.raises(DigestError, match="unknown keys"):
+        parse_digests({"crypto": {"mode": "digest", "every": 5}})
+    with pytest.raises(DigestError, match="must be positive"):
+        parse_digests({"crypto": {"max_messages": 0}})
+
+
+def test_snippet_and_links():
+    assert snippet("  Breaking:\nmarkets   fall ", "text") == "Breaking: markets fall"
+    assert snippet("", "photo") == "[photo]"
+    assert snippet("x" * 300, "text", limit=10) == "x" * 9 + "…"
+    assert message_link("cryptonews", -1001111111111, 5) == "https://t.me/cryptonews/5"
+    assert message_link("-1001111111111", -1001111111111, 5) == "https://t.me/c/1111111111/5"
+    assert message_link("-4242", -4242, 5) is None
+
+
+def test_render_splits_within_telegram_limits():
+    entries = [DigestEntry(-1001111111111, n, None, "src", "ü" * 150 + " <b>", 0.0) for n in range(200)]
+    posts = render("Crypto & co", entries)
+    assert len(posts) > 1
+    assert posts[0].startswith(f"<b>Crypto &amp; co</b> (1/{len(posts)})")
+    assert sum(post.count("<a href=") for post in posts) == 200
+    assert "&lt;b&gt;" in posts[0]
+    for post in posts:
+        text, entities = html.parse(post)
+        assert utf16_length(text) <= MAX_POST_LENGTH
+        assert len(entities) <= 101
+
+
+@pytest.mark.asyncio
+async def test_buffer_closes_at_max_messages_and_ignores_repeats():
+    sent = []
+
+    async def send(digest):
+        sent.append(digest)
+
+    buffer = DigestBuffer(send, {"crypto": DigestPolicy(max_messages=3)})
+    assert await buffer.add("@t", "crypto", -1001, 1, "src", "one", "text")
+    assert not await buffer.add("@t", "crypto", -1001, 1, "src", "one", "text")
+    await buffer.add("@t", "crypto", -1001, 2, "src", "two", "text")
+    assert not sent
+    await buffer.add("@t", "crypto", -1001, 3, "src", "", "photo")
+    assert [entry.text for entry in sent[0].entries] == ["one", "two", "[photo]"]
+    assert buffer.buffered() == 0
+    # In flight until acknowledged
+    assert not await buffer.add("@t", "crypto", -1001, 3, "src", "", "photo")
+    buffer.ack(sent[0])
+    assert await buffer.add("@t", "crypto", -1001, 3, "src", "", "photo")
+
+
+@pytest.mark.asyncio
+async def test_buffer_closes_on_interval_and_memory_cap(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(digest_module.time, "time", lambda: clock[0])
+    sent = []
+
+    async def send(digest):
+        sent.append(digest)
+
+    buffer = DigestBuffer(send, {"a": DigestPolicy(interval=60), "b": DigestPolicy(interval=600)}, max_entries=3)
+    await buffer.add("@t", "a", -1001, 1, "src", "a1", "text")
+    clock[0] += 1
+    await buffer.add("@t", "b", -1001, 2, "src", "b1", "text")
+    clock[0] += 59
+    await buffer.close_due()
+    assert [(d.category, len(d.entries)) for d in sent] == [("a", 1)]
+
+    for n in range(3, 6):
+        await buffer.add("@t", "a", -1001, n, "src", "a", "text")
+    # Four entries buffered: the oldest buffer (b) is sent early
+    assert [(d.category, len(d.entries)) for d in sent[1:]] == [("b", 1)]
+    assert buffer.buffered() == 3
+
+
+@pytest.mark.asyncio
+async def test_buffer_restores_unsent_entries(tmp_path):
+    path = str(tmp_path / "digest.sqlite3")
+    sent = []
+
+    async def send(digest):
+        sent.append(digest)
+
+    policies = {"crypto": DigestPolicy(max_messages=2)}
+    buffer = DigestBuffer(send, policies, path=path)
+    await buffer.add("@t", "crypto", -1001, 1, "src", "one", "text")
+    await buffer.add("@t", "crypto", -1001, 2, "src", "two", "text")
+    buffer.ack(sent[0])
+    await buffer.add("@t", "crypto", -1001, 3, "src", "three", "text")
+    await buffer.close()
+
+    restarted = DigestBuffer(send, policies, path=path)
+    task = asyncio.create_task(restarted.run())
+    await asyncio.sleep(0.05)
+    assert restarted.buffered() == 1
+    await restarted.add("@t", "crypto", -1001, 4, "src", "four", "text")
+    assert [entry.text for entry in sent[1].entries] == ["three", "four"]
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
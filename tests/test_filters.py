@@ -0,0 +1,118 @@
+import re
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from telethon.tl.types import Message
+from tscraper import filters
+from tscraper.filters import ContentFilter, FilterError, KeywordMatcher, RegexMatcher, media_types, trie_pattern
+from tscraper.tscraper import ConfigError, TelegramScraper
+
+
+RULES = {
+    "crypto": {
+        "include": {"keywords": ["Bitcoin", "eth"], "regex": [r"\bBTC/\w+"]},
+        "exclude": {"keywords": ["giveaway"], "regex": [r"t\.me/\+\w+"], "media": ["sticker"]},
+        "min_length": 5,
+        "max_length": 200,
+    },
+}
+
+
+@pytest.mark.parametrize("aho", [True, False])
+def test_keyword_matcher_backends(monkeypatch, aho):
+    if not aho:
+        monkeypatch.setattr(filters, "ahocorasick", None)
+    elif filters.ahocorasick is None:
+        pytest.skip("pyahocorasick is not installed")
+    matcher = KeywordMatcher(["Bitcoin", "coin", "eth"])
+    assert matcher.search("buy bitcoin now") in ("bitcoin", "coin")
+    assert matcher.search("ethereum") == "eth"
+    assert matcher.search("stocks") is None
+    assert not KeywordMatcher([])
+
+
+def test_trie_pattern_matches_exactly_the_keywords():
+    words = ["eth", "ether", "ethereum", "btc", "b.t.c", "a", "ab"]
+    pattern = re.compile(trie_pattern(words))
+    assert all(pattern.fullmatch(word) for word in words)
+    assert not pattern.fullmatch("ethe")
+    assert not pattern.fullmatch("bxtxc")
+    assert pattern.search("buy ethereum").group() == "ethereum"
+
+
+def test_regex_matcher_reports_rule():
+    matcher = RegexMatcher([r"\d{3}", r"(buy|sell) now", r"(ab)\1"])
+    assert matcher.search("SELL NOW") == "(buy|sell) now"
+    assert matcher.search("xxabab") == r"(ab)\1"
+    assert matcher.search("nothing") is None
+    with pytest.raises(FilterError):
+        RegexMatcher(["("])
+
+
+def test_regex_matcher_merges_compatible_rules():
+    matcher = RegexMatcher([r"spam\d+", r"(ab)\1", r"(?x) foo \s bar", r"(?P<w>x)(?P=w)", r"(?P<w>zz)", r"q(u)(i)ck"])
+    # Backreferences, global flags and reused group names are searched on their own
+    assert [pattern for pattern, _ in matcher._separate] == [r"(ab)\1", r"(?x) foo \s bar", r"(?P<w>x)(?P=w)"]
+    assert matcher.search("SPAM42") == r"spam\d+"
+    assert matcher.search("Quick") == r"q(u)(i)ck"
+    assert matcher.search("zz") == r"(?P<w>zz)"
+    assert matcher.search("foo bar") == r"(?x) foo \s bar"
+    assert matcher.search("xx") == r"(?P<w>x)(?P=w)"
+
+
+def test_rules_name_the_dropping_rule():
+    content = ContentFilter(RULES)
+    text = ("text",)
+    assert content.check("crypto", "Bitcoin hits a new high", text) is None
+    assert content.check("crypto", "BTC/USDT breakout", text) is None
+    assert content.check("crypto", "Stocks rally", text) == "include"
+    assert content.check("crypto", "Bitcoin GIVEAWAY", text) == "exclude:keyword:giveaway"
+    assert content.check("crypto", "eth group t.me/+abc", text) == r"exclude:regex:t\.me/\+\w+"
+    assert content.check("crypto", "eth", text) == "min_length"
+    assert content.check("crypto", "eth " * 100, text) == "max_length"
+    assert content.check("crypto", "bitcoin sticker", ("sticker",)) == "exclude:media:sticker"
+    assert content.check("other", "anything", text) is None
+
+
+def test_media_types():
+    assert media_types(SimpleNamespace(media=None)) == ("text",)
+    video = SimpleNamespace(media=object(), photo=None, video=object(), gif=None, sticker=None,
+                            voice=None, audio=None, document=object(), poll=None, web_preview=None)
+    assert media_types(video) == ("video",)
+
+
+def test_invalid_filters_are_config_errors():
+    config = {"channels": {"a": [], "target_channels": {"a": "@t"}}, "filters": {"a": {"exclude": {"media": ["hologram"]}}}}
+    with pytest.raises(ConfigError):
+        TelegramScraper(123, "hash", config)
+
+
+@pytest.mark.asyncio
+async def test_filtered_message_is_not_forwarded(mock_client):
+    config = {
+        "channels": {
+            "crypto": ["-1001234567890"],
+            "all": ["-1001234567890"],
+            "target_channels": {"crypto": "@crypto", "all": "@all"},
+        },
+        "filters": RULES,
+        "settings": {"target_rate": 0, "account_rate": 0},
+    }
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = mock_client
+
+    message = MagicMock(spec=Message)
+    message.id = 1
+    message.message = "Stocks rally"
+    message.grouped_id = None
+    message.media = None
+    event = AsyncMock()
+    event.message = message
+    event.chat_id = -1001234567890
+
+    await scraper._handle_message(event)
+    await scraper.queue.join()
+    await scraper.queue.stop()
+
+    # Dropped for crypto only; the unfiltered category still gets it
+    mock_client.forward_messages.assert_called_once_with("@all", message)
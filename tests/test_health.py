@@ -0,0 +1,65 @@
+import asyncio
+import json
+import socket
+import threading
+import urllib.request
+import pytest
+from prometheus_client import CollectorRegistry, Counter
+from tscraper import health
+from tscraper.health import MetricsCache, serve_health
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_metrics_cache_regenerates_at_most_every_max_age(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(health.time, "monotonic", lambda: clock[0])
+    registry = CollectorRegistry()
+    counter = Counter("cached_total", "Cached", registry=registry)
+    cache = MetricsCache(registry, max_age=5)
+
+    assert b"cached_total 0.0" in cache.get()
+    counter.inc()
+    clock[0] = 4.9
+    assert b"cached_total 0.0" in cache.get()
+    clock[0] = 5.0
+    assert b"cached_total 1.0" in cache.get()
+
+
+def test_status_updates_publish_new_snapshots(monkeypatch):
+    monkeypatch.setattr(health, "_scraper_status", {"connected": False, "last_error": None})
+    before = health.scraper_status()
+    health.set_scraper_status(connected=True)
+    assert before == {"connected": False, "last_error": None}
+    assert health.scraper_status() == {"connected": True, "last_error": None}
+
+
+@pytest.mark.asyncio
+async def test_server_runs_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(health, "_scraper_status", {"connected": True, "last_error": None})
+    port = free_port()
+    server = asyncio.create_task(serve_health(port, metrics_cache_seconds=60))
+
+    def get(path):
+        for _ in range(100):
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as response:
+                    return response.read()
+            except OSError:
+                threading.Event().wait(0.05)
+        raise AssertionError(f"{path} not served")
+
+    try:
+        body = json.loads(await asyncio.to_thread(get, "/health"))
+        assert body["status"] == "healthy"
+        assert b"# TYPE" in await asyncio.to_thread(get, "/metrics")
+        assert any(thread.name == "health-server" for thread in threading.enumerate())
+    finally:
+        server.cancel()
+        await asyncio.gather(server, return_exceptions=True)
+        health.set_metrics_cache_seconds(1.0)
+    assert not any(thread.name == "health-server" for thread in threading.enumerate())
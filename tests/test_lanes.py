@@ -0,0 +1,93 @@
+import asyncio
+import time
+import pytest
+from prometheus_client import REGISTRY
+from tscraper.lanes import LanePolicy, LaneQueue, PriorityError, parse_priorities
+from tscraper.workers import ForwardJob
+
+
+def job(category, n=0, waited=0.0):
+    return ForwardJob("@t", n, category, "@s", enqueued_at=time.monotonic() - waited)
+
+
+def drain(queue):
+    order = []
+    while not queue.empty():
+        order.append(queue.get_nowait().category)
+        queue.task_done()
+    return order
+
+
+def test_parse_priorities():
+    policies = parse_priorities({"breaking": {"priority": 10, "max_lag": 5}, "crypto": 3})
+    assert policies == {"breaking": LanePolicy(10.0, 5.0), "crypto": LanePolicy(3.0)}
+    assert parse_priorities(None) == {}
+    with pytest.raises(PriorityError, match="unknown keys"):
+        parse_priorities({"news": {"weight": 2}})
+    with pytest.raises(PriorityError, match="must be numbers"):
+        parse_priorities({"news": "high"})
+
+
+@pytest.mark.asyncio
+async def test_lanes_are_served_in_proportion_to_priority():
+    queue = LaneQueue(priorities={"breaking": LanePolicy(3)})
+    for n in range(8):
+        queue.put_nowait(job("bulk", n))
+    for n in range(6):
+        queue.put_nowait(job("breaking", n))
+    order = drain(queue)
+    # Three breaking jobs per bulk job while both have a backlog, then the rest of bulk
+    assert order[:8] == ["breaking"] * 3 + ["bulk"] + ["breaking"] * 3 + ["bulk"]
+    assert order[8:] == ["bulk"] * 6
+
+
+@pytest.mark.asyncio
+async def test_idle_lane_does_not_bank_turns():
+    queue = LaneQueue()
+    for n in range(5):
+        queue.put_nowait(job("a", n))
+    assert drain(queue) == ["a"] * 5
+    queue.put_nowait(job("a"))
+    queue.put_nowait(job("a"))
+    queue.put_nowait(job("b"))
+    queue.put_nowait(job("b"))
+    assert drain(queue) == ["a", "b", "a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_overdue_lane_is_served_first():
+    queue = LaneQueue(priorities={"breaking": LanePolicy(100), "slow": LanePolicy(1, max_lag=30)})
+    before = REGISTRY.get_sample_value("tscraper_forward_lane_overdue_total", {"priority": "1"}) or 0
+    for n in range(3):
+        queue.put_nowait(job("breaking", n))
+    queue.put_nowait(job("slow", waited=31))
+    assert drain(queue) == ["slow", "breaking", "breaking", "breaking"]
+    assert REGISTRY.get_sample_value("tscraper_forward_lane_overdue_total", {"priority": "1"}) == before + 1
+
+
+@pytest.mark.asyncio
+async def test_full_queue_admits_highest_priority_putter_first():
+    queue = LaneQueue(maxsize=1, priorities={"breaking": LanePolicy(10)})
+    queue.put_nowait(job("bulk", 0))
+    low = asyncio.create_task(queue.put(job("bulk", 1)))
+    await asyncio.sleep(0)
+    high = asyncio.create_task(queue.put(job("breaking")))
+    await asyncio.sleep(0)
+    assert (await queue.get()).messages == 0
+    await asyncio.sleep(0)
+    assert high.done() and not low.done()
+    assert (await queue.get()).category == "breaking"
+    await low
+    assert (await queue.get()).messages == 1
+
+
+@pytest.mark.asyncio
+async def test_shed_evicts_newest_job_of_a_lower_lane():
+    queue = LaneQueue(maxsize=2, priorities={"breaking": LanePolicy(10)})
+    queue.put_nowait(job("bulk", 0))
+    queue.put_nowait(job("bulk", 1))
+    assert queue.shed(job("bulk")) is None
+    assert queue.shed(job("breaking")).messages == 1
+    queue.put_nowait(job("breaking"))
+    assert drain(queue) == ["breaking", "bulk"]
+    await asyncio.wait_for(queue.join(), 1)
@@ -0,0 +1,71 @@
+import json
+import logging
+import threading
+import pytest
+from tscraper import logs
+from tscraper.logs import JsonFormatter, MessageSampler, log_message, setup_logging
+
+
+@pytest.fixture
+def root_logging():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield root
+    logs._stop_listener()
+    logs._sampler = MessageSampler()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def test_sampler_rate_limits_info_but_not_errors(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(logs.time, "monotonic", lambda: clock[0])
+    sampler = MessageSampler(max_per_second=2)
+
+    assert [sampler.allow(logging.INFO) for _ in range(3)] == [True, True, False]
+    assert all(sampler.allow(logging.ERROR) for _ in range(10))
+    clock[0] += 0.5
+    assert sampler.allow(logging.INFO)
+    assert not sampler.allow(logging.INFO)
+    assert sampler.suppressed == 2
+
+
+def test_json_records_carry_message_fields():
+    record = logging.LogRecord("tscraper.tscraper", logging.INFO, __file__, 1, "forwarded", None, None)
+    record.fields = {"chat_id": -1001, "message_id": 5, "category": "news", "target": "@t",
+                     "stage": "forward", "duration": 0.12, "count": None}
+
+    entry = json.loads(JsonFormatter({"shard": 1}).format(record))
+    assert entry["message"] == "forwarded"
+    assert entry["level"] == "INFO" and entry["shard"] == 1
+    assert {key: entry[key] for key in ("chat_id", "message_id", "category", "target", "stage", "duration")} == {
+        "chat_id": -1001, "message_id": 5, "category": "news", "target": "@t", "stage": "forward", "duration": 0.12,
+    }
+    assert "count" not in entry
+
+
+def test_records_are_formatted_on_the_listener_thread(root_logging, capsys):
+    formatted_on = []
+
+    class Recording(JsonFormatter):
+        def format(self, record):
+            formatted_on.append(threading.current_thread())
+            return super().format(record)
+
+    listener = setup_logging({"log_format": "json", "log_message_rate": 1})
+    listener.handlers[0].setFormatter(Recording())
+    logger = logging.getLogger("tscraper.test")
+    for message_id in range(5):
+        log_message(logger, "forwarded", chat_id=-1001, message_id=message_id)
+    log_message(logger, "Fallback forwarding also failed", logging.ERROR, chat_id=-1001, message_id=9)
+    logs._stop_listener()
+
+    lines = [json.loads(line) for line in capsys.readouterr().err.splitlines()]
+    # One INFO record within the rate limit; the error is always emitted
+    assert [(line["level"], line["message_id"]) for line in lines] == [("INFO", 0), ("ERROR", 9)]
+    assert formatted_on and threading.main_thread() not in formatted_on
+
+
+def test_invalid_log_format(root_logging):
+    with pytest.raises(ValueError):
+        setup_logging({"log_format": "xml"})
@@ -0,0 +1,158 @@
+import pytest
+from unittest.mock import MagicMock
+from prometheus_client import REGISTRY
+from telethon.tl.types import (
+    Document, InputMediaPhoto, Message, MessageMediaDocument, MessageMediaPhoto, Photo, PhotoSize,
+    PhotoStrippedSize,
+)
+from tscraper import media
+from tscraper.copier import MediaCopier
+from tscraper.media import ENTRY_BYTES, MediaCache, media_fingerprint
+from tscraper.tscraper import ConfigError, TelegramScraper
+from tscraper.workers import ForwardJob
+
+
+def photo(photo_id: int, file_reference: bytes = b"ref", size: int = 1000) -> MessageMediaPhoto:
+    sizes = [PhotoStrippedSize("i", b"xx"), PhotoSize("x", 800, 600, size // 2), PhotoSize("y", 1280, 960, size)]
+    return MessageMediaPhoto(photo=Photo(photo_id, 7, file_reference, None, sizes, 2))
+
+
+def photo_message(msg_id: int, photo_id: int, text: str = "caption", noforwards: bool = False):
+    message = MagicMock(spec=Message)
+    message.id = msg_id
+    message.message = text
+    message.entities = None
+    message.grouped_id = None
+    message.noforwards = noforwards
+    message.media = photo(photo_id)
+    return message
+
+
+def scraper_for(mock_client, **settings):
+    config = {
+        "channels": {"news": ["-1001"], "target_channels": {"news": "@target"}},
+        "settings": {"target_rate": 0, "account_rate": 0, **settings},
+    }
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = mock_client
+    return scraper
+
+
+def test_fingerprint_identifies_the_file():
+    assert media_fingerprint(photo_message(1, photo_id=5)) == ("photo", 5, 7, 1000)
+    # The message around the file and its file reference do not matter
+    repost = photo_message(2, photo_id=5, text="other")
+    repost.media = photo(5, file_reference=b"other")
+    assert media_fingerprint(repost) == media_fingerprint(photo_message(1, photo_id=5))
+
+    document = photo_message(3, photo_id=0)
+    document.media = MessageMediaDocument(document=Document(9, 8, b"ref", None, "video/mp4", 12345, 2, []))
+    assert media_fingerprint(document) == ("document", 9, 8, 12345)
+    text = photo_message(4, photo_id=0)
+    text.media = None
+    assert media_fingerprint(text) is None
+
+
+def test_cache_tracks_files_per_target():
+    cache = MediaCache()
+    fp = ("photo", 1, 2, 3)
+    hits = REGISTRY.get_sample_value("tscraper_media_cache_lookups_total", {"kind": "sent", "result": "hit"}) or 0
+
+    assert not cache.seen("@a", fp)
+    cache.add("@a", fp)
+    assert cache.seen("@a", fp)
+    assert not cache.seen("@b", fp)
+    assert cache.reference(fp) is None
+
+    assert REGISTRY.get_sample_value("tscraper_media_cache_lookups_total", {"kind": "sent", "result": "hit"}) == hits + 1
+
+
+def test_cache_expires_and_evicts_by_memory(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(media.time, "monotonic", lambda: now[0])
+    cache = MediaCache(max_bytes=3 * (ENTRY_BYTES + 2), ttl=60)
+    for photo_id in (1, 2, 3):
+        cache.add("@a", ("photo", photo_id, 0, 0))
+    assert cache.seen("@a", ("photo", 1, 0, 0))  # now the most recently used
+
+    cache.add("@a", ("photo", 4, 0, 0))
+    assert len(cache) == 3 and cache.size <= cache.max_bytes
+    assert not cache.seen("@a", ("photo", 2, 0, 0))
+    assert cache.seen("@a", ("photo", 1, 0, 0))
+    assert REGISTRY.get_sample_value("tscraper_media_cache_bytes") == cache.size
+
+    now[0] += 61
+    assert not cache.seen("@a", ("photo", 1, 0, 0))
+    assert len(cache) == 2
+
+
+@pytest.mark.asyncio
+async def test_repeated_media_is_skipped(mock_client):
+    scraper = scraper_for(mock_client, repeat_media="skip")
+    await scraper._process_job(ForwardJob("@target", photo_message(1, photo_id=5), "news", "source", chat_id=-1001))
+    skipped = REGISTRY.get_sample_value("tscraper_media_repeats_total", {"category": "news", "action": "skipped"}) or 0
+
+    # A batch with one repost and one new file: only the new one is forwarded
+    batch = [photo_message(2, photo_id=5), photo_message(3, photo_id=6)]
+    await scraper._process_job(ForwardJob("@target", batch, "news", "source", chat_id=-1001))
+
+    assert mock_client.forward_messages.call_args.args == ("@target", [batch[1]])
+    assert REGISTRY.get_sample_value(
+        "tscraper_media_repeats_total", {"category": "news", "action": "skipped"}
+    ) == skipped + 1
+    # The skipped repost counts as handled
+    assert await scraper.dedup.seen(-1001, 2)
+    assert scraper.checkpoints.get(-1001) == 3
+
+
+@pytest.mark.asyncio
+async def test_repeated_media_sends_caption_only(mock_client):
+    scraper = scraper_for(mock_client, repeat_media="caption")
+    await scraper._process_job(ForwardJob("@target", photo_message(1, photo_id=5), "news", "source", chat_id=-1001))
+    await scraper._process_job(ForwardJob("@target", photo_message(2, photo_id=5, text="again"), "news", "source",
+                                          chat_id=-1001))
+    # Another target has not seen the file yet
+    await scraper._process_job(ForwardJob("@other", photo_message(3, photo_id=5), "news", "source", chat_id=-1001))
+
+    assert mock_client.forward_messages.call_count == 2
+    mock_client.send_message.assert_called_once_with("@target", "again", formatting_entities=None,
+                                                      link_preview=False)
+
+
+@pytest.mark.asyncio
+async def test_fallback_reuses_reference_of_sent_copy(mock_client):
+    scraper = scraper_for(mock_client, copy_mode="off")
+    sent = MagicMock(spec=Message)
+    sent.media = photo(5, file_reference=b"target copy")
+    mock_client.forward_messages.return_value = sent
+    await scraper._forward("@target", photo_message(1, photo_id=5), "news", "source")
+
+    # A protected repost cannot be forwarded; the fallback sends the earlier copy
+    mock_client.forward_messages.side_effect = RuntimeError("forwards restricted")
+    assert await scraper._forward("@other", photo_message(2, photo_id=5, noforwards=True), "news", "source")
+
+    file = mock_client.send_message.call_args.kwargs["file"]
+    assert isinstance(file, InputMediaPhoto) and file.id.file_reference == b"target copy"
+
+
+@pytest.mark.asyncio
+async def test_copier_reuses_reference_instead_of_uploading(mock_client):
+    cache = MediaCache()
+    reference = InputMediaPhoto(id=MagicMock())
+    cache.add("@a", media_fingerprint(photo_message(1, photo_id=5)), reference)
+    reused = REGISTRY.get_sample_value("tscraper_copy_media_total", {"result": "reused"}) or 0
+
+    await MediaCopier(references=cache).send(mock_client, "@b", [photo_message(2, photo_id=5, noforwards=True)])
+
+    assert mock_client.send_file.call_args.args == ("@b", reference)
+    mock_client.iter_download.assert_not_called()
+    assert REGISTRY.get_sample_value("tscraper_copy_media_total", {"result": "reused"}) == reused + 1
+
+
+def test_repeat_media_needs_the_cache():
+    config = {
+        "channels": {"news": ["-1001"], "target_channels": {"news": "@target"}},
+        "settings": {"repeat_media": "skip", "media_cache_mb": 0},
+    }
+    with pytest.raises(ConfigError):
+        TelegramScraper(123, "hash", config)
@@ -0,0 +1,125 @@
+import asyncio
+import sqlite3
+import pytest
+from unittest.mock import MagicMock
+from telethon.tl.types import Message
+from tscraper.outbox import Outbox
+from tscraper.tscraper import TelegramScraper
+
+
+@pytest.mark.asyncio
+async def test_unacked_entries_survive_restart(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    outbox = Outbox(path)
+    first, second = await asyncio.gather(
+        outbox.append("@t", -100, [1], "cat", "@s"),
+        outbox.append("@t", -100, [2, 3], "cat", "@s", album=True),
+    )
+    assert first != second
+    outbox.ack(first)
+    await outbox.close()
+
+    reopened = Outbox(path)
+    pending = await reopened.pending()
+    assert [(e.id, e.message_ids, e.album) for e in pending] == [(second, [2, 3], True)]
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_disabled_without_path():
+    outbox = Outbox()
+    assert await outbox.append("@t", -100, [1], "cat", "@s") is None
+    assert await outbox.pending() == []
+
+
+@pytest.mark.asyncio
+async def test_replay_forwards_and_acknowledges(tmp_path, mock_client, config):
+    path = str(tmp_path / "outbox.sqlite3")
+    crashed = Outbox(path)
+    await crashed.append("@target_ai", -1001234567890, [7], "news_ai", "public_channel")
+    await crashed.close()
+
+    config = {**config, "settings": {"outbox_path": path}}
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = mock_client
+    message = MagicMock(spec=Message)
+    message.id = 7
+    message.grouped_id = None
+    mock_client.get_messages.return_value = [message]
+
+    await scraper._replay_outbox()
+    await scraper.queue.join()
+    await scraper.queue.stop()
+    mock_client.forward_messages.assert_called_once_with("@target_ai", message)
+
+    await scraper.outbox.close()
+    assert await Outbox(path).pending() == []
+
+
+@pytest.mark.asyncio
+async def test_start_replays_previous_run_only_before_live_events(tmp_path, mock_client, config):
+    path = str(tmp_path / "outbox.sqlite3")
+    crashed = Outbox(path)
+    await crashed.append("@target_ai", -1001234567890, [7], "news_ai", "public_channel")
+    await crashed.close()
+
+    scraper = TelegramScraper(123, "hash", {**config, "settings": {"outbox_path": path}})
+    scraper.client = mock_client
+    order = []
+    mock_client.is_connected.return_value = False
+
+    async def connect():
+        order.append("connect")
+        # A live job of this run, journaled while the update loop is already running
+        await scraper.outbox.append("@target_ai", -1001234567890, [8], "news_ai", "public_channel")
+
+    async def get_messages(peer, ids):
+        order.append(f"replay {ids}")
+        return []
+
+    def on(event):
+        order.append("handler")
+        return lambda handler: handler
+
+    disconnected = asyncio.Event()
+    mock_client.connect.side_effect = connect
+    mock_client.get_messages.side_effect = get_messages
+    mock_client.on = MagicMock(side_effect=on)
+    mock_client.run_until_disconnected.side_effect = disconnected.wait
+
+    task = asyncio.create_task(scraper.start())
+    for _ in range(200):
+        if "handler" in order:
+            break
+        await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await scraper.queue.stop()
+    await scraper.outbox.close()
+
+    assert order == ["connect", "replay [7]", "handler"]
+
+
+@pytest.mark.asyncio
+async def test_acks_survive_failed_commit_and_shutdown(tmp_path, monkeypatch):
+    path = str(tmp_path / "outbox.sqlite3")
+    outbox = Outbox(path)
+    service = asyncio.create_task(outbox.run())
+    first = await outbox.append("@t", -100, [1], "cat", "@s")
+    second = await outbox.append("@t", -100, [2], "cat", "@s")
+
+    db_commit = outbox._db_commit
+
+    def failing(rows, acks):
+        monkeypatch.setattr(outbox, "_db_commit", db_commit)
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(outbox, "_db_commit", failing)
+    outbox.ack(first)
+    await asyncio.sleep(0.05)  # that commit failed
+    outbox.ack(second)
+    # Shutting down commits the acks still queued, including the failed one
+    service.cancel()
+    await asyncio.gather(service, return_exceptions=True)
+
+    assert await Outbox(path).pending() == []
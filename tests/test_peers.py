@@ -0,0 +1,79 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from telethon.tl.types import Message
+from tscraper.cache import TTLCache
+from tscraper.peers import PeerMap
+from tscraper.tscraper import TelegramScraper
+
+
+def test_ttl_cache_bounds_and_expiry():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache[1] = "a"
+    cache[2] = "b"
+    cache.get(1)
+    cache[3] = "c"  # evicts 2, the least recently used
+    assert 2 not in cache
+    assert cache[1] == "a"
+
+    cache.ttl = -1
+    cache[4] = "d"
+    assert cache.get(4) is None
+
+
+def test_peer_map_persists_atomically(tmp_path):
+    path = str(tmp_path / "peers.json")
+    peers = PeerMap(path)
+    peers.set("@Public_Channel", -1001)
+    peers.save()
+    assert PeerMap(path).get("public_channel") == -1001
+    assert PeerMap(path).stale(["@public_channel", "@other"]) == ["@other"]
+    assert list(tmp_path.iterdir()) == [tmp_path / "peers.json"]
+
+
+@pytest.mark.asyncio
+async def test_username_learned_once_then_routed_by_id(tmp_path, mock_client):
+    config = {
+        "channels": {"news": ["@public_channel"], "target_channels": {"news": "@target"}},
+        "settings": {"peer_map_path": str(tmp_path / "peers.json")},
+    }
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = mock_client
+
+    chat = MagicMock()
+    chat.username = "public_channel"
+    for msg_id in (1, 2):
+        message = MagicMock(spec=Message)
+        message.id = msg_id
+        message.grouped_id = None
+        event = AsyncMock()
+        event.message = message
+        event.chat_id = -1007777
+        event.get_chat.return_value = chat
+        await scraper._handle_message(event)
+    await scraper.queue.join()
+    await scraper.queue.stop()
+
+    # Only the first event needed get_chat(); the id is remembered across restarts
+    assert mock_client.forward_messages.call_count == 2
+    event.get_chat.assert_not_called()
+    assert PeerMap(config["settings"]["peer_map_path"]).get("@public_channel") == -1007777
+    assert TelegramScraper(123, "hash", config).routes.lookup(-1007777).target == "@target"
+
+
+def test_source_name_survives_channel_cache_expiry(tmp_path):
+    config = {
+        "channels": {"news": ["@newsfeed"], "target_channels": {"news": "@target"}},
+        "settings": {"peer_map_path": str(tmp_path / "peers.json"), "channel_cache_ttl": 60},
+    }
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.peer_map.set("@NewsFeed", -1000000000777)
+    scraper._remember_chat(-1000000000777, MagicMock(username="NewsFeed"))
+    assert scraper._source_name(-1000000000777) == "NewsFeed"
+
+    scraper.channel_cache.ttl = -1
+    scraper._remember_chat(-1000000000777, MagicMock(username="NewsFeed"))  # now expired
+    assert scraper._source_name(-1000000000777) == "newsfeed"
+    scraper.peer_map.save()
+    # Known after a restart too, before anything was resolved again
+    assert TelegramScraper(123, "hash", config)._source_name(-1000000000777) == "newsfeed"
+    assert scraper._source_name(-1000000000778) == "-1000000000778"
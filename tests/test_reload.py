@@ -0,0 +1,118 @@
+import asyncio
+import os
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from telethon import events
+from telethon.tl.types import PeerChannel
+from tscraper.lanes import LanePolicy
+from tscraper.reload import ConfigWatcher
+from tscraper.tscraper import ConfigError, TelegramScraper, load_yaml_config
+
+
+CONFIG = """
+news:
+  - "-1001111111111"
+target_channels:
+  news: "@target_news"
+"""
+
+NEW_CONFIG = """
+sport:
+  - "-1002222222222"
+target_channels:
+  sport: "@target_sport"
+"""
+
+
+def write(path, text, mtime):
+    path.write_text(text)
+    os.utime(path, ns=(mtime, mtime))
+
+
+@pytest.mark.asyncio
+async def test_watcher_reloads_on_change_and_keeps_config_on_error(tmp_path):
+    path = tmp_path / "config.yaml"
+    write(path, CONFIG, 1_000_000_000)
+    applied = []
+
+    async def on_change(config):
+        applied.append(config)
+
+    watcher = ConfigWatcher(str(path), load_yaml_config, on_change)
+    assert not await watcher.check()
+
+    write(path, NEW_CONFIG, 2_000_000_000)
+    assert await watcher.check()
+    assert "sport" in applied[-1]["channels"]
+
+    write(path, "news: [", 3_000_000_000)
+    assert not await watcher.check()
+    assert len(applied) == 1
+
+    # SIGHUP forces a reload even if the stamp did not change
+    write(path, CONFIG, 4_000_000_000)
+    await watcher.check()
+    watcher.trigger()
+    assert await watcher.check()
+    assert len(applied) == 3
+
+
+@pytest.mark.asyncio
+async def test_apply_config_swaps_routes_and_chat_filter():
+    scraper = TelegramScraper(123, "hash", {"channels": {"news": ["-1001111111111"], "target_channels": {"news": "@target_news"}}})
+    scraper.new_message = events.NewMessage(chats={-1001111111111})
+    old_route = scraper.routes.lookup(-1001111111111)
+
+    await scraper.apply_config({"channels": {
+        "sport": ["-1002222222222", "@unresolved"],
+        "target_channels": {"sport": "@target_sport"},
+    }})
+
+    assert scraper.routes.lookup(-1001111111111) is None
+    assert scraper.routes.lookup(-1002222222222).target == "@target_sport"
+    assert scraper.new_message.chats == {-1002222222222}
+    # A message routed before the swap keeps its snapshot
+    assert old_route.target == "@target_news"
+
+    with pytest.raises(ConfigError):
+        await scraper.apply_config({"channels": {"sport": []}})
+    assert scraper.routes.lookup(-1002222222222) is not None
+
+
+@pytest.mark.asyncio
+async def test_apply_config_resolves_new_usernames():
+    scraper = TelegramScraper(123, "hash", {"channels": {"news": ["@old"], "target_channels": {"news": "@target"}}})
+    scraper.client = AsyncMock()
+    scraper.client.get_entity.return_value = PeerChannel(3333333333)
+    scraper.new_message = events.NewMessage(chats=set())
+
+    await scraper.apply_config({"channels": {"news": ["@fresh"], "target_channels": {"news": "@target"}}})
+
+    scraper.client.get_entity.assert_awaited_once_with("@fresh")
+    assert scraper.new_message.chats == {-1003333333333}
+    assert scraper.routes.lookup(-1003333333333).category == "news"
+
+
+@pytest.mark.asyncio
+async def test_apply_config_updates_priorities():
+    channels = {"news": ["-1001111111111"], "target_channels": {"news": "@target"}}
+    scraper = TelegramScraper(123, "hash", {"channels": channels})
+    assert scraper.queue._queue.policy("news").priority == 1
+
+    await scraper.apply_config({"channels": channels, "priorities": {"news": {"priority": 5, "max_lag": 10}}})
+    assert scraper.queue._queue.policy("news") == LanePolicy(5, 10)
+
+
+@pytest.mark.asyncio
+async def test_startup_filter_matches_reload_filter():
+    config = {"channels": {"news": ["-1001111111111", "2222222222", "@fresh"], "target_channels": {"news": "@t"}}}
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = AsyncMock()
+    scraper.client.on = MagicMock(return_value=lambda handler: handler)
+    scraper.client.get_entity.return_value = PeerChannel(3333333333)
+    scraper.resolver = asyncio.create_task(scraper._resolve_usernames())
+
+    await scraper._register_handler()
+
+    expected = {-1001111111111, -1002222222222, -1003333333333}
+    assert scraper.new_message.chats == expected == scraper._chat_filter(scraper.routes)
@@ -0,0 +1,33 @@
+from tscraper.routing import RoutingTable, Route, canonical_source
+
+
+def test_canonical_source_forms():
+    assert canonical_source("@Public_Channel") == "@public_channel"
+    assert canonical_source("public_channel") == "@public_channel"
+    assert canonical_source("-1001234567890") == "-1001234567890"
+    assert canonical_source("1234567891") == "-1001234567891"
+    assert canonical_source(-1001234567890) == "-1001234567890"
+
+
+def test_lookup_by_username_and_id(config):
+    routes = RoutingTable(config["channels"])
+    assert routes.lookup("public_channel") == Route("news_ai", "@target_ai")
+    assert routes.lookup(None, -1001234567890) == Route("news_ai", "@target_ai")
+    # Bare digits in the config match the marked id delivered by events
+    assert routes.lookup(-1001234567891) == Route("news_ai", "@target_ai")
+    assert routes.lookup("unknown_channel") is None
+
+
+def test_source_fans_out_to_all_targets():
+    routes = RoutingTable({
+        "a": ["@dup"],
+        "b": ["@dup", "@other"],
+        "c": ["@dup"],
+        "target_channels": {"a": "@ta", "b": ["@tb", "@tb2"], "c": "@ta"},
+    })
+    # A target reached through two categories is forwarded to once, first category wins
+    assert routes.lookup_all("@dup") == (Route("a", "@ta"), Route("b", "@tb"), Route("b", "@tb2"))
+    assert routes.lookup("@dup") == Route("a", "@ta")
+    assert routes.lookup_all("@unknown") == ()
+    assert routes.targets() == ["@ta", "@tb", "@tb2"]
+    assert len(routes) == 2
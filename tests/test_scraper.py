@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from tscraper.tscraper import TelegramScraper
+from telethon.errors import FloodWaitError
 from telethon.tl.types import Message, PeerChannel, Channel
 
 
@@ -81,11 +82,16 @@ async def test_handle_message(mock_client, mock_message, mock_channel, config):
     chat.username = "public_channel"  # Matches the source channel in config
     chat.id = -1001234567890
     event.get_chat.return_value = chat
+    event.chat_id = chat.id
 
     await scraper._handle_message(event)
+    await scraper.queue.join()
+    await scraper.queue.stop()
 
     # Verify forward_messages was called with correct target
     mock_client.forward_messages.assert_called_once_with("@target_ai", mock_message)
+    # Routing used event.chat_id only
+    event.get_chat.assert_not_called()
 
 @pytest.mark.asyncio
 async def test_handle_message_no_target(mock_client, mock_message, mock_channel, config):
@@ -97,7 +103,9 @@ async def test_handle_message_no_target(mock_client, mock_message, mock_channel,
 
     chat = AsyncMock()
     chat.username = "unknown_channel"  # Channel not in config
+    chat.id = -1005555555555
     event.get_chat.return_value = chat
+    event.chat_id = chat.id
 
     await scraper._handle_message(event)
 
@@ -125,14 +133,18 @@ async def test_message_handler_with_media(mock_client, config):
     chat.username = "public_channel"  # Matches the source channel in config
     chat.id = -1001234567890
     event.get_chat.return_value = chat
+    event.chat_id = chat.id
 
     await scraper._handle_message(event)
+    await scraper.queue.join()
+    await scraper.queue.stop()
     mock_client.forward_messages.assert_called_once_with("@target_ai", message)
 
 @pytest.mark.asyncio
 async def test_message_handler_with_album(mock_client, config):
     scraper = TelegramScraper(123, "hash", config)
     scraper.client = mock_client
+    mock_client.iter_messages = MagicMock()
 
     grouped_id = "group1"
     messages = []
@@ -146,22 +158,59 @@ async def test_message_handler_with_album(mock_client, config):
         msg.message = f"Album message {i}"
         messages.append(msg)
 
-    # iter_messages returns an async iterator (not a coroutine)
-    mock_client.iter_messages = MagicMock(return_value=AsyncIteratorMock(messages))
-
-    # Create event with first message
-    event = AsyncMock()
-    event.message = messages[0]
-
     chat = AsyncMock()
     chat.username = "public_channel"
     chat.id = -1001234567890
-    event.get_chat.return_value = chat
 
-    await scraper._handle_message(event)
+    # Album parts arrive as separate events, out of order
+    for msg in (messages[1], messages[0], messages[2]):
+        event = AsyncMock()
+        event.message = msg
+        event.get_chat.return_value = chat
+        event.chat_id = chat.id
+        await scraper._handle_message(event)
+
+    mock_client.forward_messages.assert_not_called()
+    await scraper.albums.drain()
+    await scraper.queue.join()
+    await scraper.queue.stop()
 
-    # Verify album forwarding
+    # One forward for the whole album, no history reads
     mock_client.forward_messages.assert_called_once_with("@target_ai", messages)
+    mock_client.iter_messages.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_fan_out_isolates_failing_target(mock_client, mock_message):
+    config = {
+        "channels": {
+            "news": ["-1001234567890"],
+            "mirror": ["-1001234567890"],
+            "target_channels": {"news": ["@target_a", "@target_b"], "mirror": "@target_c"},
+        },
+        "settings": {"target_rate": 0, "account_rate": 0},
+    }
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = mock_client
+
+    async def forward(target, message):
+        if target == "@target_b":
+            raise Exception("Forward failed")
+
+    mock_client.forward_messages.side_effect = forward
+    mock_client.send_message.side_effect = Exception("Send failed")
+
+    event = AsyncMock()
+    event.message = mock_message
+    event.chat_id = -1001234567890
+    await scraper._handle_message(event)
+    await scraper.queue.join()
+    await scraper.queue.stop()
+
+    # Received and routed once, sent to every target
+    event.get_chat.assert_not_called()
+    targets = sorted(call.args[0] for call in mock_client.forward_messages.call_args_list)
+    assert targets == ["@target_a", "@target_b", "@target_c"]
+    mock_client.send_message.assert_called_once_with("@target_b", mock_message.message, file=None)
 
 @pytest.mark.asyncio
 async def test_connect_unauthorized():
@@ -199,3 +248,117 @@ async def test_connect_authorized(mock_client, config):
     mock_client.connect.assert_called_once()
     mock_client.is_user_authorized.assert_called_once()
     assert scraper.connection_start_time is not None
+
+@pytest.mark.asyncio
+async def test_stage_lag_and_fallback_metrics(mock_client, mock_message):
+    from datetime import datetime, timedelta, timezone
+    from prometheus_client import REGISTRY
+
+    config = {
+        "channels": {"staged": ["-1001234567890"], "target_channels": {"staged": "@staged"}},
+        "settings": {"target_rate": 0, "account_rate": 0},
+    }
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = mock_client
+    mock_client.forward_messages.side_effect = Exception("Forward failed")
+    mock_message.date = datetime.now(timezone.utc) - timedelta(seconds=30)
+
+    event = AsyncMock()
+    event.message = mock_message
+    event.chat_id = -1001234567890
+    await scraper._handle_message(event)
+    await scraper.queue.join()
+    await scraper.queue.stop()
+
+    def count(metric, **labels):
+        return REGISTRY.get_sample_value(metric, labels) or 0
+
+    for stage in ("route", "dedup", "queue", "forward", "fallback"):
+        assert count("tscraper_stage_duration_seconds_count", category="staged", stage=stage) == 1
+    # No filters or near-dup index configured, so those stages are not timed
+    assert count("tscraper_stage_duration_seconds_count", category="staged", stage="filter") == 0
+    # copy_mode defaults to fallback, so the copier re-sends the message
+    assert count("tscraper_forward_fallbacks_total", category="staged", method="copy", result="ok") == 1
+    assert count("tscraper_message_lag_seconds_count", category="staged") == 1
+    assert 30 <= count("tscraper_message_lag_seconds_sum", category="staged") < 60
+
+@pytest.mark.asyncio
+async def test_monitor_loop_lag(config):
+    import asyncio
+    import time
+    from prometheus_client import REGISTRY
+
+    scraper = TelegramScraper(123, "hash", config)
+    monitor = asyncio.create_task(scraper._monitor_loop_lag(interval=0.05))
+    await asyncio.sleep(0)
+    time.sleep(0.2)  # blocks the loop while the monitor sleeps
+    await asyncio.sleep(0.01)
+    monitor.cancel()
+    await asyncio.gather(monitor, return_exceptions=True)
+    assert REGISTRY.get_sample_value("tscraper_event_loop_lag_seconds") >= 0.1
+
+@pytest.mark.asyncio
+async def test_digest_category_sends_one_post(mock_client):
+    config = {
+        "channels": {
+            "news": ["-1001234567890"],
+            "bulk": ["-1001234567890"],
+            "target_channels": {"news": "@target_news", "bulk": "@target_bulk"},
+        },
+        "digests": {"bulk": {"max_messages": 2, "title": "Bulk"}},
+        "settings": {"target_rate": 0, "account_rate": 0},
+    }
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = mock_client
+    for message_id in (1, 2):
+        message = MagicMock(spec=Message)
+        message.id = message_id
+        message.message = f"post {message_id}"
+        message.grouped_id = None
+        message.media = None
+        event = AsyncMock()
+        event.message = message
+        event.chat_id = -1001234567890
+        await scraper._handle_message(event)
+    await scraper.queue.join()
+    await scraper.queue.stop()
+
+    # Regular category forwarded per message, the digest category once for both
+    assert [call.args[0] for call in mock_client.forward_messages.call_args_list] == ["@target_news"] * 2
+    mock_client.send_message.assert_called_once()
+    target, post = mock_client.send_message.call_args.args
+    assert target == "@target_bulk"
+    assert post.startswith("<b>Bulk</b>") and "post 1" in post and "https://t.me/c/1234567890/2" in post
+    assert mock_client.send_message.call_args.kwargs == {"parse_mode": "html", "link_preview": False}
+    assert await scraper.dedup.seen(-1001234567890, 2)
+
+
+@pytest.mark.asyncio
+async def test_abandoned_digest_is_not_restored(mock_client, tmp_path):
+    path = str(tmp_path / "digest.sqlite3")
+    config = {
+        "channels": {"bulk": ["-1001234567890"], "target_channels": {"bulk": "@target_bulk"}},
+        "digests": {"bulk": {"max_messages": 1}},
+        "settings": {"target_rate": 0, "account_rate": 0, "max_flood_retries": 0, "digest_path": path},
+    }
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = mock_client
+    mock_client.send_message.side_effect = FloodWaitError(request=None, capture=0)
+    message = MagicMock(spec=Message)
+    message.id = 1
+    message.message = "post"
+    message.grouped_id = None
+    message.media = None
+    event = AsyncMock()
+    event.message = message
+    event.chat_id = -1001234567890
+    await scraper._handle_message(event)
+    await scraper.queue.join()
+    await scraper.queue.stop()
+    await scraper.digests.close()
+
+    # Given up after the FloodWait: a restart does not send it with the next digest
+    restarted = TelegramScraper(123, "hash", config)
+    await restarted.digests._restore()
+    assert restarted.digests.buffered() == 0
+    await restarted.digests.close()
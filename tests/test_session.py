@@ -0,0 +1,93 @@
+import json
+import pytest
+from datetime import datetime, timezone
+from telethon.crypto import AuthKey
+from telethon.sessions import SQLiteSession
+from telethon.tl import types
+from tscraper.session import WriteBehindSession, open_session
+
+STATE = types.updates.State(pts=10, qts=0, date=datetime(2024, 5, 1, tzinfo=timezone.utc), seq=3, unread_count=0)
+
+
+def resolved(channel_id=1234, username="News"):
+    channel = types.Channel(
+        id=channel_id, title="News", photo=types.ChatPhotoEmpty(), date=None,
+        access_hash=987654321, username=username,
+    )
+    return types.contacts.ResolvedPeer(types.PeerChannel(channel_id), [channel], [])
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = tmp_path / "sessions" / "acc.session.json"
+    session = WriteBehindSession(str(path), flush_interval=3600)
+    session.set_dc(2, "149.154.167.51", 443)
+    session.auth_key = AuthKey(bytes(range(256)))
+    session.process_entities(resolved())
+    session.set_update_state(0, STATE)
+    session.close()
+
+    assert not list(path.parent.glob("*.tmp"))
+    restored = WriteBehindSession(str(path))
+    assert (restored.dc_id, restored.server_address, restored.port) == (2, "149.154.167.51", 443)
+    assert restored.auth_key.key == bytes(range(256))
+    assert restored.get_update_state(0) == STATE
+    assert restored.get_input_entity("@news") == types.InputPeerChannel(1234, 987654321)
+    assert restored.get_input_entity(-1000000001234) == types.InputPeerChannel(1234, 987654321)
+
+
+def test_only_changes_are_written(tmp_path):
+    session = WriteBehindSession(str(tmp_path / "acc.session.json"), flush_interval=3600)
+    session.process_entities(resolved())
+    session.set_update_state(0, STATE)
+    assert session.flush()
+
+    # Telethon reports the same entities and state with every update batch
+    session.process_entities(resolved())
+    session.set_update_state(0, STATE)
+    assert not session.flush()
+
+    session.process_entities(resolved(username="renamed"))
+    assert session.flush()
+    assert session.get_entity_rows_by_username("news") is None
+    assert session.get_entity_rows_by_username("renamed") == (-1000000001234, 987654321)
+    session.close()
+
+
+def test_failed_write_keeps_previous_snapshot(tmp_path, monkeypatch):
+    path = tmp_path / "acc.session.json"
+    session = WriteBehindSession(str(path), flush_interval=3600)
+    session.set_update_state(0, STATE)
+    session.flush()
+    before = path.read_text()
+
+    session.process_entities(resolved())
+    monkeypatch.setattr("tscraper.session.os.fsync", lambda fd: (_ for _ in ()).throw(OSError("disk full")))
+    with pytest.raises(OSError):
+        session.flush()
+    assert path.read_text() == before
+    json.loads(before)
+
+
+def test_imports_sqlite_session(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    legacy = SQLiteSession("acc")
+    legacy.set_dc(4, "149.154.167.91", 443)
+    legacy.auth_key = AuthKey(b"k" * 256)
+    legacy.process_entities(resolved())
+    legacy.set_update_state(0, STATE)
+    legacy.save()
+    legacy.close()
+
+    session = open_session("acc", {"session_backend": "write_behind", "session_dir": "state"})
+    assert session.path.resolve() == tmp_path / "state" / "acc.session.json"
+    assert session.auth_key.key == b"k" * 256 and session.dc_id == 4
+    assert session.get_input_entity("news") == types.InputPeerChannel(1234, 987654321)
+    assert session.get_update_state(0).pts == 10
+    session.close()
+    assert session.path.exists()
+
+
+def test_open_session_defaults_to_sqlite():
+    assert open_session("acc") == "acc"
+    with pytest.raises(ValueError):
+        open_session("acc", {"session_backend": "redis"})
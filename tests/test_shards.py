@@ -0,0 +1,135 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from prometheus_client import CollectorRegistry, generate_latest
+from tscraper import health
+from tscraper.outbox import Outbox
+from tscraper.shards import (
+    ShardMetricsCollector,
+    assign_shard,
+    partition_channels,
+    shard_config,
+    shard_path,
+)
+from tscraper.tscraper import TelegramScraper
+
+
+def test_assignment_is_stable_and_canonical():
+    assert assign_shard("@Some_Channel", 4) == assign_shard("some_channel", 4)
+    assert assign_shard("1234567890", 4) == assign_shard("-1001234567890", 4)
+    counts = [0, 0, 0]
+    for i in range(300):
+        counts[assign_shard(f"@source{i}", 3)] += 1
+    assert min(counts) > 50
+
+
+def test_partition_keeps_every_source_once(config):
+    parts = partition_channels(config["channels"], 3)
+    sources = sorted(s for part in parts for s in part["news_ai"] + part["news_tech"])
+    assert sources == sorted(config["channels"]["news_ai"] + config["channels"]["news_tech"])
+    assert all(part["target_channels"] == config["channels"]["target_channels"] for part in parts)
+
+
+def test_shard_state_files_are_separate():
+    assert shard_path("data/dedup.sqlite3", 1) == "data/dedup.shard1.sqlite3"
+    cfg = shard_config({"settings": {"outbox_path": "data/outbox.sqlite3", "forward_workers": 2}}, 0, {})
+    assert cfg["settings"] == {"outbox_path": "data/outbox.shard0.sqlite3", "forward_workers": 2}
+
+
+def test_metrics_merged_with_shard_label():
+    collector = ShardMetricsCollector()
+    collector.texts = {
+        "0": '# HELP x_total X\n# TYPE x_total counter\nx_total{category="a"} 1.0\n',
+        "1": '# HELP x_total X\n# TYPE x_total counter\nx_total{category="a"} 2.0\n',
+    }
+    registry = CollectorRegistry()
+    registry.register(collector)
+    text = generate_latest(registry).decode()
+    assert 'x_total{category="a",shard="0"} 1.0' in text
+    assert 'x_total{category="a",shard="1"} 2.0' in text
+    assert text.count("# TYPE x_total counter") == 1
+
+
+def test_health_aggregates_shards(monkeypatch):
+    monkeypatch.setattr(health, "_shard_status", {})
+    health.set_shard_status("0", connected=True)
+    health.set_shard_status("1", connected=False, last_error="Disconnected")
+    assert health._scraper_status == {"connected": False, "last_error": "Disconnected"}
+    health.set_shard_status("1", connected=True)
+    assert health._scraper_status["connected"] is True
+
+
+@pytest.mark.asyncio
+async def test_unpostable_target_is_relayed(mock_client, mock_message, config):
+    scraper = TelegramScraper(123, "hash", config, session="acc1")
+    scraper.client = mock_client
+    scraper.postable = {"@target_tech"}
+    scraper.relay = MagicMock()
+    mock_message.grouped_id = None
+
+    chat = AsyncMock()
+    chat.username = "public_channel"
+    chat.id = -1001234567890
+    event = AsyncMock()
+    event.message = mock_message
+    event.get_chat.return_value = chat
+    event.chat_id = chat.id
+    await scraper._handle_message(event)
+
+    mock_client.forward_messages.assert_not_called()
+    payload = scraper.relay.call_args.args[0]
+    assert payload["target"] == "@target_ai"
+    assert payload["message_ids"] == [123]
+    # The origin records the handed-over message; the receiving shard does not read this chat
+    assert await scraper.dedup.seen(chat.id, 123)
+    assert scraper.checkpoints.get(chat.id) == 123
+
+
+@pytest.mark.asyncio
+async def test_relayed_job_is_journaled_until_forwarded(tmp_path, mock_client, mock_message, config):
+    path = str(tmp_path / "outbox.sqlite3")
+    scraper = TelegramScraper(123, "hash", {**config, "settings": {"outbox_path": path}}, session="acc2")
+    scraper.client = mock_client
+    payload = {"target": "@target_ai", "chat_id": -1009999, "message_ids": [123],
+               "category": "news_ai", "source": "other_channel", "album": False}
+    mock_client.get_messages.side_effect = ConnectionError("disconnected")
+    await scraper._forward_relayed(payload)
+    await scraper.outbox.close()
+
+    # The restarted shard replays it, fetching by username like the relay did
+    restarted = TelegramScraper(123, "hash", {**config, "settings": {"outbox_path": path}}, session="acc2")
+    restarted.client = mock_client
+    mock_message.grouped_id = None
+    mock_client.get_messages.side_effect = None
+    mock_client.get_messages.return_value = [mock_message]
+    await restarted._replay_outbox()
+    await restarted.queue.join()
+    await restarted.queue.stop()
+
+    assert mock_client.get_messages.call_args.args[0] == "@other_channel"
+    mock_client.forward_messages.assert_called_once_with("@target_ai", mock_message)
+    assert restarted.checkpoints.get(-1009999) is None
+    await restarted.outbox.close()
+    assert await Outbox(path).pending() == []
+
+
+def test_relay_peer_keeps_numeric_ids_as_ints():
+    # Telethon would take a numeric string for a phone number
+    assert TelegramScraper._relay_peer("-1001234567890") == -1001234567890
+    assert TelegramScraper._relay_peer("public_channel") == "@public_channel"
+
+
+def test_supervisor_relays_to_shard_that_can_post(config, monkeypatch):
+    from tscraper.shards import Supervisor
+
+    monkeypatch.setattr(health, "_shard_status", {})
+    supervisor = Supervisor(123, "hash", config, ["acc0", "acc1", "acc2"])
+    supervisor.handle_report(("report", 1, {
+        "connected": True, "last_error": None, "postable": ["@target_ai"], "metrics": "",
+    }))
+    supervisor.handle_report(("report", 2, {
+        "connected": True, "last_error": None, "postable": ["@target_tech"], "metrics": "",
+    }))
+    payload = {"target": "@target_ai", "source": "public_channel"}
+    supervisor.handle_report(("relay", 0, payload))
+    assert supervisor.inboxes[1].get(timeout=5) == payload
+    assert supervisor.inboxes[2].empty()
@@ -0,0 +1,64 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from telethon.tl.types import Message
+from tscraper.similarity import NearDuplicateIndex, fingerprint
+from tscraper.tscraper import TelegramScraper
+
+
+POST = ("Central bank raises the key rate by 50 basis points to 7.5 percent, "
+        "citing persistent inflation and strong labour market data")
+
+
+def distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def test_fingerprint_similarity():
+    original = fingerprint(POST)
+    repost = fingerprint("BREAKING: " + POST + " Subscribe @daily_news")
+    other = fingerprint("Football: the home team wins the cup final after a dramatic penalty shootout tonight")
+    assert distance(original, repost) <= 9
+    assert distance(original, other) > 9
+    assert fingerprint("too short") is None
+    # Media weighs as much as the text
+    assert distance(fingerprint(POST, [1]), fingerprint(POST, [2])) > 9
+    assert fingerprint("", [42]) == fingerprint("", [42])
+
+
+def test_index_window_namespaces_and_bound():
+    index = NearDuplicateIndex(threshold=0.85, bands=4, window=60, maxsize=3)
+    fp = fingerprint(POST)
+    assert not index.check("news", fp, now=0)
+    assert index.check("news", fp ^ 0b101, now=10)
+    assert not index.check("sport", fp, now=10)
+    # Expired after the window
+    assert not index.check("news", fp ^ 0b101, now=100)
+    for i in range(5):
+        index.check("news", fp ^ (0xFFFF << (16 * (i % 4))) ^ i, now=100)
+    assert len(index) == 3
+    assert sum(len(bucket) for bucket in index._buckets.values()) == 3 * 4
+
+
+@pytest.mark.asyncio
+async def test_near_duplicate_from_another_source_is_skipped(mock_client):
+    config = {
+        "channels": {"news": ["-1001", "-1002"], "target_channels": {"news": "@target"}},
+        "settings": {"near_dup_threshold": 0.85, "target_rate": 0, "account_rate": 0},
+    }
+    scraper = TelegramScraper(123, "hash", config)
+    scraper.client = mock_client
+
+    for chat_id, text in ((-1001, POST), (-1002, POST + " via @source_two")):
+        message = MagicMock(spec=Message)
+        message.id = 1
+        message.message = text
+        message.grouped_id = None
+        message.media = None
+        event = AsyncMock()
+        event.message = message
+        event.chat_id = chat_id
+        await scraper._handle_message(event)
+    await scraper.queue.join()
+    await scraper.queue.stop()
+
+    assert mock_client.forward_messages.call_count == 1
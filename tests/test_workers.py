@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from tscraper.lanes import LanePolicy
+from tscraper.workers import ForwardJob, ForwardQueue
+
+
+@pytest.mark.asyncio
+async def test_jobs_processed_by_workers():
+    done = []
+
+    async def handler(job):
+        done.append(job.messages)
+
+    queue = ForwardQueue(handler, workers=2)
+    for i in range(5):
+        assert await queue.put(ForwardJob("@t", i, "cat", "@s"))
+    await queue.join()
+    await queue.stop()
+    assert sorted(done) == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_drop_policy_rejects_when_full():
+    release = asyncio.Event()
+
+    async def handler(job):
+        await release.wait()
+
+    queue = ForwardQueue(handler, maxsize=1, workers=1, policy='drop')
+    assert await queue.put(ForwardJob("@t", 1, "cat", "@s"))
+    await asyncio.sleep(0)  # worker takes the first job
+    assert await queue.put(ForwardJob("@t", 2, "cat", "@s"))
+    assert not await queue.put(ForwardJob("@t", 3, "cat", "@s"))
+    release.set()
+    await queue.join()
+    await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_per_target_concurrency_cap():
+    active = {"@a": 0}
+    peak = {"@a": 0}
+
+    async def handler(job):
+        active[job.target] += 1
+        peak[job.target] = max(peak[job.target], active[job.target])
+        await asyncio.sleep(0.01)
+        active[job.target] -= 1
+
+    queue = ForwardQueue(handler, workers=4, per_target=1)
+    for i in range(4):
+        await queue.put(ForwardJob("@a", i, "cat", "@s"))
+    await queue.join()
+    await queue.stop()
+    assert peak["@a"] == 1
+
+
+@pytest.mark.asyncio
+async def test_drop_policy_evicts_lower_priority_job():
+    release = asyncio.Event()
+    done, evicted = [], []
+
+    async def handler(job):
+        await release.wait()
+        done.append(job.messages)
+
+    queue = ForwardQueue(
+        handler, maxsize=1, workers=1, policy='drop',
+        priorities={"breaking": LanePolicy(10)}, on_evict=evicted.append,
+    )
+    assert await queue.put(ForwardJob("@t", 1, "bulk", "@s"))
+    await asyncio.sleep(0)  # worker takes the first job
+    assert await queue.put(ForwardJob("@t", 2, "bulk", "@s"))
+    assert await queue.put(ForwardJob("@t", 3, "breaking", "@s"))
+    assert not await queue.put(ForwardJob("@t", 4, "bulk", "@s"))
+    assert [job.messages for job in evicted] == [2]
+    release.set()
+    await queue.join()
+    await queue.stop()
+    assert done == [1, 3]
+
+
+class GatedScheduler:
+    """Defers the first send to ``@t``, then lets everything through."""
+
+    def __init__(self):
+        self.gated = True
+
+    def reserve(self, target):
+        if target == "@t" and self.gated:
+            self.gated = False
+            return 0.01
+        return 0.0
+
+
+@pytest.mark.asyncio
+async def test_drop_policy_does_not_evict_requeued_parked_job():
+    release = asyncio.Event()
+    done, evicted = [], []
+
+    async def handler(job):
+        if job.target == "@busy":
+            await release.wait()
+        done.append(job.messages)
+
+    queue = ForwardQueue(
+        handler, maxsize=1, workers=1, policy='drop', scheduler=GatedScheduler(),
+        priorities={"breaking": LanePolicy(10)}, on_evict=evicted.append,
+    )
+    assert await queue.put(ForwardJob("@t", 1, "bulk", "@s"))
+    await asyncio.sleep(0)  # parked
+    assert await queue.put(ForwardJob("@busy", 2, "bulk", "@s"))
+    await asyncio.sleep(0.05)  # job 1 is back in the full queue
+    assert not await queue.put(ForwardJob("@x", 3, "breaking", "@s"))
+    release.set()
+    await asyncio.sleep(0)
+    assert await queue.put(ForwardJob("@t", 4, "bulk", "@s"))
+    await asyncio.wait_for(queue.join(), 1)
+    await queue.stop()
+    assert evicted == []
+    assert done == [2, 1, 4]
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+FlushCallback = Callable[[List[Any], Any], Awaitable[None]]
+
+
+class _Group:
+    __slots__ = ('parts', 'context', 'created', 'handle')
+
+    def __init__(self, context: Any):
+        self.parts: Dict[int, Any] = {}
+        self.context = context
+        self.created = time.monotonic()
+        self.handle: asyncio.TimerHandle | None = None
+
+
+class AlbumAssembler:
+    """Collect media album parts from NewMessage events and flush each album once.
+
+    Parts are buffered per ``(chat_id, grouped_id)``. A group is flushed when no
+    new part arrived for ``quiet_window`` seconds, when it reaches ``max_size``
+    parts, when it has been open for ``max_age`` seconds, or when it is the
+    oldest group and ``max_groups`` would be exceeded.
+    """
+
+    def __init__(
+        self,
+        on_flush: FlushCallback,
+        quiet_window: float = 0.5,
+        max_size: int = 10,
+        max_groups: int = 1000,
+        max_age: float = 10.0,
+    ):
+        self._on_flush = on_flush
+        self.quiet_window = quiet_window
+        self.max_size = max_size
+        self.max_groups = max_groups
+        self.max_age = max_age
+        self._groups: OrderedDict[Tuple[int, Hashable], _Group] = OrderedDict()
+        self._tasks: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def add(self, chat_id: int, message: Any, context: Any = None) -> None:
+        """Buffer one album part; ``context`` is handed to the flush callback."""
+        key = (chat_id, message.grouped_id)
+        group = self._groups.get(key)
+        if group is None:
+            self._evict_stale()
+            while len(self._groups) >= self.max_groups:
+                self._flush(next(iter(self._groups)))
+            group = self._groups[key] = _Group(context)
+
+        group.parts[message.id] = message
+        if group.handle:
+            group.handle.cancel()
+
+        if len(group.parts) >= self.max_size or time.monotonic() - group.created >= self.max_age:
+            self._flush(key)
+            return
+        group.handle = asyncio.get_running_loop().call_later(self.quiet_window, self._flush, key)
+
+    async def drain(self) -> None:
+        """Flush every buffered group and wait for all pending flushes."""
+        for key in list(self._groups):
+            self._flush(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _evict_stale(self) -> None:
+        now = time.monotonic()
+        for key, group in list(self._groups.items()):
+            if now - group.created < self.max_age:
+                break
+            self._flush(key)
+
+    def _flush(self, key: Tuple[int, Hashable]) -> None:
+        group = self._groups.pop(key, None)
+        if group is None:
+            return
+        if group.handle:
+            group.handle.cancel()
+        parts = [group.parts[msg_id] for msg_id in sorted(group.parts)]
+        task = asyncio.get_running_loop().create_task(self._run_flush(parts, group.context))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_flush(self, parts: List[Any], context: Any) -> None:
+        try:
+            await self._on_flush(parts, context)
+        except Exception as e:
+            logger.error(f"Album flush failed: {e}", exc_info=True)
@@ -0,0 +1,208 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, List, Tuple
+
+from .metrics import (
+    archive_buffer_records,
+    archive_files_total,
+    archive_records_dropped_total,
+    archive_records_written_total,
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: pip install pyarrow
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMATS = ('parquet', 'jsonl')
+FIELDS = ('chat_id', 'message_id', 'date', 'category', 'text', 'media_type', 'grouped_id')
+
+# (chat_id, message_id, date, category, text, media_type, grouped_id)
+Record = Tuple[int, int, datetime | None, str, str, str, int | None]
+
+
+def _schema():
+    return pa.schema([
+        ('chat_id', pa.int64()),
+        ('message_id', pa.int64()),
+        ('date', pa.timestamp('s', tz='UTC')),
+        ('category', pa.string()),
+        ('text', pa.string()),
+        ('media_type', pa.string()),
+        ('grouped_id', pa.int64()),
+    ])
+
+
+class _ParquetFile:
+    suffix = '.parquet'
+
+    def __init__(self, path: str, compression: str):
+        self.schema = _schema()
+        self._writer = pq.ParquetWriter(path, self.schema, compression=compression)
+
+    def write(self, rows: List[Record]) -> None:
+        # One row group per batch; columns are built straight from the tuples
+        self._writer.write_batch(pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(zip(*rows), self.schema)],
+            schema=self.schema,
+        ))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+class _JsonlFile:
+    suffix = '.jsonl.gz'
+
+    def __init__(self, path: str, compression: str):
+        self._file = gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+
+    def write(self, rows: List[Record]) -> None:
+        lines = []
+        for row in rows:
+            record = dict(zip(FIELDS, row))
+            if record['date'] is not None:
+                record['date'] = record['date'].isoformat()
+            lines.append(json.dumps(record, ensure_ascii=False))
+        lines.append('')
+        self._file.write('\n'.join(lines))
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ArchiveSink:
+    """Append-only archive of received messages in rotated Parquet or gzipped JSONL files.
+
+    ``add()`` only appends a tuple to an in-memory buffer and never waits:
+    when ``buffer_size`` records are already pending the record is dropped
+    and counted. ``run()`` hands the buffer to a dedicated thread every
+    ``flush_interval`` seconds, or as soon as ``batch_size`` records are
+    pending, and each batch becomes one Parquet row group or one block of
+    JSON lines. A file is written as ``*.tmp`` and renamed when it is
+    rotated, after ``rotate_bytes`` or ``rotate_seconds``, so complete files
+    are the ones without the suffix. Without pyarrow, ``parquet`` falls back
+    to JSONL.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        format: str = 'parquet',
+        buffer_size: int = 100_000,
+        batch_size: int = 10_000,
+        flush_interval: float = 5.0,
+        rotate_bytes: int = 64 * 2**20,
+        rotate_seconds: float = 3600,
+        compression: str = 'zstd',
+    ):
+        if format not in ARCHIVE_FORMATS:
+            raise ValueError(f"archive format must be one of {', '.join(ARCHIVE_FORMATS)}")
+        if format == 'parquet' and pq is None:
+            logger.warning("pyarrow is not installed, archiving to gzipped JSONL instead of Parquet")
+            format = 'jsonl'
+        self.directory = Path(directory)
+        self.format = format
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compression = compression
+        self._buffer: List[Record] = []
+        self._wakeup = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='archive')
+        # Writer-thread state
+        self._file: _ParquetFile | _JsonlFile | None = None
+        self._path: Path | None = None
+        self._opened = 0.0
+        # Unique per sink, so processes can share a directory; names sort by time
+        self._token = uuid.uuid4().hex[:8]
+        self._sequence = 0
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def add(self, chat_id: int, message: Any, category: str, media_type: str) -> None:
+        """Queue one received message; drops it if the writer is too far behind."""
+        if len(self._buffer) >= self.buffer_size:
+            archive_records_dropped_total.inc()
+            return
+        self._buffer.append((
+            chat_id, message.id, message.date, category, message.message or '', media_type, message.grouped_id,
+        ))
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+        await asyncio.shield(asyncio.get_running_loop().run_in_executor(self._executor, self._write, rows))
+
+    async def run(self) -> None:
+        """Background writer loop; flushes and closes the current file on cancel."""
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                try:
+                    await self.flush()
+                    # Rotate by age even when nothing arrives
+                    await asyncio.get_running_loop().run_in_executor(self._executor, self._rotate_expired)
+                except Exception as e:
+                    logger.error(f"Archive write failed: {e}")
+                archive_buffer_records.set(len(self._buffer))
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close_file)
+
+    # The methods below run on the sink's executor thread only
+
+    def _rotate_expired(self) -> None:
+        if self._file is not None and time.monotonic() - self._opened >= self.rotate_seconds:
+            self._close_file()
+
+    def _write(self, rows: List[Record]) -> None:
+        self._rotate_expired()
+        if self._file is None:
+            self._open_file()
+        self._file.write(rows)
+        archive_records_written_total.inc(len(rows))
+        if os.path.getsize(self._path) >= self.rotate_bytes:
+            self._close_file()
+
+    def _open_file(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        writer = _ParquetFile if self.format == 'parquet' else _JsonlFile
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        self._sequence += 1
+        self._path = self.directory / f"messages-{stamp}-{self._token}-{self._sequence:06d}{writer.suffix}.tmp"
+        self._file = writer(str(self._path), self.compression)
+        self._opened = time.monotonic()
+
+    def _close_file(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._path.rename(self._path.with_suffix(''))
+        archive_files_total.inc()
+        self._file = None
+        self._path = None
@@ -0,0 +1,206 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Sequence
+
+from .checkpoints import CheckpointStore
+from .health import serve_health
+from .logs import setup_logging
+from .metrics import backfill_messages_total, backfill_remaining_messages, backfill_sources
+from .tscraper import ConfigError, TelegramScraper, load_credentials, load_yaml_config
+
+logger = logging.getLogger(__name__)
+
+SOURCE_STATES = ('pending', 'running', 'done', 'failed')
+
+
+def parse_date(value: str) -> datetime:
+    """ISO date or datetime; naive values are taken as UTC."""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date: {value!r}")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog='tscraper backfill',
+        description='Forward the history of the configured sources to their targets.',
+    )
+    parser.add_argument('--since', type=parse_date, help='first post date (ISO 8601, UTC if no offset)')
+    parser.add_argument('--until', type=parse_date, help='last post date (ISO 8601, UTC if no offset)')
+    parser.add_argument('--category', action='append', dest='categories', metavar='NAME',
+                        help='only this category; repeatable (default: all)')
+    parser.add_argument('--concurrency', type=int, help='sources read in parallel (default: backfill_concurrency)')
+    parser.add_argument('--session', help='session file (default: the first of settings.sessions)')
+    parser.add_argument('--config', default=os.getenv('CONFIG_PATH', 'config.yaml'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('BACKFILL_PORT', '8001')),
+                        help='port for /metrics while running, 0 to disable (default: 8001)')
+    return parser.parse_args(argv)
+
+
+def backfill_config(config: Dict, categories: Sequence[str] | None = None) -> Dict:
+    """Config for a backfill run: the selected categories, history batching, no outbox, archive or digests."""
+    channels = config['channels']
+    known = [name for name in channels if name != 'target_channels']
+    unknown = sorted(set(categories or ()) - set(known))
+    if unknown:
+        raise ConfigError(f"Unknown categories: {', '.join(unknown)}")
+    selected = {name: channels[name] for name in known if not categories or name in categories}
+    selected['target_channels'] = channels['target_channels']
+
+    settings = dict(config.get('settings') or {})
+    settings['batch_window_ms'] = settings.get('backfill_batch_window_ms', 1000)
+    # Progress is kept in checkpoints; the outbox and archive belong to the live process
+    settings.pop('outbox_path', None)
+    settings.pop('archive_path', None)
+    # History is forwarded message by message; digests are built from live traffic only
+    settings.pop('digest_path', None)
+    return {**config, 'channels': selected, 'settings': settings, 'digests': None}
+
+
+class Backfill:
+    """Replays source history through the scraper's routing, filters, dedup and batching.
+
+    Sources are read oldest first with up to ``concurrency`` in parallel,
+    each in pages of 100 (the GetHistory maximum). Forwarded positions are
+    checkpointed under the ``backfill`` scope, separate from live
+    forwarding, so an interrupted run resumes after the last forwarded
+    message of each source. The forwarding queue applies backpressure, so
+    reading never runs far ahead of sending.
+    """
+
+    def __init__(self, scraper: TelegramScraper, since: datetime | None = None, until: datetime | None = None,
+                 concurrency: int = 4, page_delay: float = 0.0):
+        self.scraper = scraper
+        self.since = since
+        self.until = until
+        self.concurrency = concurrency
+        self.page_delay = page_delay
+        # Workers advance these after each forward
+        self.checkpoints = scraper.checkpoints = CheckpointStore(
+            scraper.settings.get('checkpoint_path'), scope='backfill'
+        )
+
+    async def _sources(self) -> List[int]:
+        await self.scraper._resolve_usernames()
+        sources = []
+        for source in await self.scraper._resolve_channels():
+            if isinstance(source, str):
+                source = await self.scraper._resolve_channel(source)
+            if isinstance(source, int):
+                sources.append(source)
+            else:
+                logger.warning(f"Skipping {source}: username could not be resolved")
+        return list(dict.fromkeys(sources))
+
+    async def run(self) -> int:
+        """Backfill all sources; returns the number of messages queued for forwarding."""
+        await self.checkpoints.load()
+        sources = await self._sources()
+        for state in SOURCE_STATES:
+            backfill_sources.labels(state=state).set(0)
+        backfill_sources.labels(state='pending').set(len(sources))
+        semaphore = asyncio.Semaphore(self.concurrency)
+        t0 = time.monotonic()
+
+        results = await asyncio.gather(*(self._backfill_source(chat_id, semaphore) for chat_id in sources))
+        await self.scraper.albums.drain()
+        if self.scraper.batcher is not None:
+            await self.scraper.batcher.drain()
+        await self.scraper.queue.join()
+
+        queued = sum(results)
+        logger.info(f"Backfill queued {queued} messages from {len(sources)} sources in {time.monotonic() - t0:.1f}s")
+        return queued
+
+    async def _backfill_source(self, chat_id: int, semaphore: asyncio.Semaphore) -> int:
+        queued = 0
+        remaining = 0
+        async with semaphore:
+            backfill_sources.labels(state='pending').dec()
+            backfill_sources.labels(state='running').inc()
+            state = 'done'
+            try:
+                client = self.scraper.client
+                routes = self.scraper.routes.lookup_all(chat_id)
+                newest = await client.get_messages(chat_id, limit=1)
+                newest_id = newest[0].id if newest else 0
+                last_id = self.checkpoints.get(chat_id)
+                if last_id:
+                    logger.info(f"Resuming backfill of {chat_id} after message {last_id}")
+                    position = {'min_id': last_id}
+                else:
+                    position = {'offset_date': self.since}
+                async for message in client.iter_messages(
+                    chat_id, reverse=True, wait_time=self.page_delay, **position
+                ):
+                    if self.until is not None and message.date > self.until:
+                        break
+                    left = max(newest_id - message.id, 0)
+                    backfill_remaining_messages.inc(left - remaining)
+                    remaining = left
+                    if await self.scraper._process_message(message, chat_id, routes):
+                        queued += 1
+                        backfill_messages_total.labels(result='queued').inc()
+                    else:
+                        backfill_messages_total.labels(result='skipped').inc()
+            except Exception as e:
+                state = 'failed'
+                logger.error(f"Backfill failed for {chat_id}: {e}")
+            finally:
+                backfill_remaining_messages.dec(remaining)
+                backfill_sources.labels(state='running').dec()
+                backfill_sources.labels(state=state).inc()
+        return queued
+
+
+async def run_backfill(scraper: TelegramScraper, args: argparse.Namespace) -> int:
+    client = await scraper._setup_client()
+    await client.connect()
+    if not await client.is_user_authorized():
+        raise ConfigError(f"Session {scraper.session_name} is not authorized; run auth.py first")
+
+    backfill = Backfill(
+        scraper,
+        since=args.since,
+        until=args.until,
+        concurrency=args.concurrency or int(scraper.settings.get('backfill_concurrency', 4)),
+        page_delay=float(scraper.settings.get('backfill_page_delay', 0)),
+    )
+    services = [asyncio.create_task(scraper.dedup.run()), asyncio.create_task(backfill.checkpoints.run())]
+    if args.port:
+        services.append(asyncio.create_task(serve_health(args.port)))
+    try:
+        return await backfill.run()
+    finally:
+        await scraper.queue.stop()
+        for task in services:
+            task.cancel()
+        # The stores flush on cancel
+        await asyncio.gather(*services, return_exceptions=True)
+        await client.disconnect()
+
+
+def main(argv: Sequence[str] | None = None):
+    try:
+        args = parse_args(argv)
+        if args.until and args.since and args.until < args.since:
+            raise ConfigError("--until is before --since")
+        api_id, api_hash = load_credentials()
+        config = backfill_config(load_yaml_config(args.config), args.categories)
+        setup_logging(config['settings'])
+        sessions = config['settings'].get('sessions') or []
+        session = args.session or (sessions[0] if sessions else 'my_user_session')
+        scraper = TelegramScraper(api_id, api_hash, config, session=session)
+        asyncio.run(run_backfill(scraper, args))
+    except KeyboardInterrupt:
+        logger.info("\nBackfill stopped by user; run it again to resume")
+    except Exception as e:
+        logger.error(f"Fatal error: {e}")
+        sys.exit(1)
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+logger = logging.getLogger(__name__)
+
+FlushCallback = Callable[[List[Any], Any], Awaitable[None]]
+
+# Telegram accepts at most this many ids in one ForwardMessagesRequest
+MAX_FORWARD_IDS = 100
+
+
+class _Batch:
+    __slots__ = ('messages', 'context', 'handle')
+
+    def __init__(self, context: Any):
+        self.messages: List[Any] = []
+        self.context = context
+        self.handle: asyncio.TimerHandle | None = None
+
+
+class MessageBatcher:
+    """Coalesce messages per key (source chat, target) into one forward call.
+
+    A batch is flushed ``window`` seconds after its first message or as soon
+    as it holds ``max_size`` messages. Messages keep their arrival order.
+    """
+
+    def __init__(self, on_flush: FlushCallback, window: float = 0.25, max_size: int = MAX_FORWARD_IDS):
+        self._on_flush = on_flush
+        self.window = window
+        self.max_size = min(max_size, MAX_FORWARD_IDS)
+        self._batches: Dict[Hashable, _Batch] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._batches)
+
+    def add(self, key: Hashable, message: Any, context: Any = None) -> None:
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = _Batch(context)
+            batch.handle = asyncio.get_running_loop().call_later(self.window, self._flush, key)
+        batch.messages.append(message)
+        if len(batch.messages) >= self.max_size:
+            self._flush(key)
+
+    async def drain(self) -> None:
+        """Flush every open batch and wait for all pending flushes."""
+        for key in list(self._batches):
+            self._flush(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _flush(self, key: Hashable) -> None:
+        batch = self._batches.pop(key, None)
+        if batch is None:
+            return
+        batch.handle.cancel()
+        task = asyncio.get_running_loop().create_task(self._run_flush(batch.messages, batch.context))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_flush(self, messages: List[Any], context: Any) -> None:
+        try:
+            await self._on_flush(messages, context)
+        except Exception as e:
+            logger.error(f"Batch flush failed: {e}", exc_info=True)
@@ -0,0 +1,146 @@
+import asyncio
+import heapq
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointStore:
+    """Highest message id per source chat below which every message was handled.
+
+    Jobs finish out of order, so messages in flight are held with ``hold()``
+    and ``release()``: ``update()`` records a handled message, and the
+    checkpoint advances up to it but never past the oldest message still
+    held. A message released as failed keeps holding the checkpoint for the
+    lifetime of the process, so the next catch-up (or resumed backfill)
+    reads it again.
+
+    Kept in memory and written behind to SQLite when ``path`` is set, so a
+    restarted process knows where each source left off. ``scope`` separates
+    independent progress records (live forwarding, backfill) in one file.
+    """
+
+    def __init__(self, path: str | None = None, scope: str = 'live', flush_interval: float = 1.0):
+        self.path = path
+        self.scope = scope
+        self.flush_interval = flush_interval
+        self._positions: Dict[int, int] = {}
+        self._handled: Dict[int, int] = {}
+        # Messages in flight per chat (message id -> holds) and a heap of their ids
+        self._holds: Dict[int, Dict[int, int]] = {}
+        self._held: Dict[int, List[int]] = {}
+        self._dirty: Dict[int, int] = {}
+        self._loaded = False
+        self._db: sqlite3.Connection | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='checkpoints') if path else None
+
+    def get(self, chat_id: int) -> int | None:
+        return self._positions.get(chat_id)
+
+    def update(self, chat_id: int, message_id: int) -> None:
+        """Record ``message_id`` as handled; the checkpoint never moves backwards."""
+        if message_id > self._handled.get(chat_id, 0):
+            self._handled[chat_id] = message_id
+            self._advance(chat_id)
+
+    def hold(self, chat_id: int, message_id: int) -> None:
+        """Keep the checkpoint of ``chat_id`` below ``message_id`` until it is released."""
+        holds = self._holds.setdefault(chat_id, {})
+        count = holds.get(message_id, 0)
+        if not count:
+            heapq.heappush(self._held.setdefault(chat_id, []), message_id)
+        holds[message_id] = count + 1
+
+    def release(self, chat_id: int, message_id: int, failed: bool = False) -> None:
+        """Drop one hold; a failed message keeps it. No-op if nothing is held."""
+        holds = self._holds.get(chat_id)
+        if failed or not holds or message_id not in holds:
+            return
+        if holds[message_id] > 1:
+            holds[message_id] -= 1
+            return
+        del holds[message_id]
+        self._advance(chat_id)
+
+    def _advance(self, chat_id: int) -> None:
+        position = self._handled.get(chat_id, 0)
+        holds = self._holds.get(chat_id)
+        if holds:
+            held = self._held[chat_id]
+            while held[0] not in holds:
+                heapq.heappop(held)
+            position = min(position, held[0] - 1)
+        else:
+            self._holds.pop(chat_id, None)
+            self._held.pop(chat_id, None)
+        if position > self._positions.get(chat_id, 0):
+            self._positions[chat_id] = position
+            if self._executor:
+                self._dirty[chat_id] = position
+
+    async def load(self) -> Dict[int, int]:
+        """Merge persisted checkpoints into memory and return a snapshot."""
+        if self._executor and not self._loaded:
+            rows = await asyncio.get_running_loop().run_in_executor(self._executor, self._db_load)
+            for chat_id, message_id in rows.items():
+                if message_id > self._positions.get(chat_id, 0):
+                    self._positions[chat_id] = message_id
+            self._loaded = True
+        return dict(self._positions)
+
+    async def flush(self) -> None:
+        if not self._executor or not self._dirty:
+            return
+        rows, self._dirty = self._dirty, {}
+        await asyncio.shield(asyncio.get_running_loop().run_in_executor(self._executor, self._db_write, rows))
+
+    async def run(self) -> None:
+        """Background write-behind loop; flushes and closes the database on cancel."""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        if not self._executor:
+            return
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._db_close)
+
+    # The methods below run on the store's executor thread only
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS checkpoints ('
+                'scope TEXT NOT NULL, chat_id INTEGER NOT NULL, message_id INTEGER NOT NULL, '
+                'PRIMARY KEY (scope, chat_id)) WITHOUT ROWID'
+            )
+        return self._db
+
+    def _db_load(self) -> Dict[int, int]:
+        rows = self._conn().execute(
+            'SELECT chat_id, message_id FROM checkpoints WHERE scope = ?', (self.scope,)
+        ).fetchall()
+        return dict(rows)
+
+    def _db_write(self, rows: Dict[int, int]) -> None:
+        db = self._conn()
+        with db:
+            db.executemany(
+                'INSERT INTO checkpoints VALUES (?, ?, ?) '
+                'ON CONFLICT (scope, chat_id) DO UPDATE SET message_id = MAX(message_id, excluded.message_id)',
+                [(self.scope, chat_id, message_id) for chat_id, message_id in rows.items()],
+            )
+
+    def _db_close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+import logging
+import random
+from typing import Dict, Hashable, List, Sequence
+
+from telethon import utils
+from telethon.errors import ChatForwardsRestrictedError, FileReferenceExpiredError, FileReferenceInvalidError
+from telethon.tl.functions.messages import UploadMediaRequest
+from telethon.tl.functions.upload import SaveBigFilePartRequest, SaveFilePartRequest
+from telethon.tl.types import (
+    DocumentAttributeFilename,
+    InputFile,
+    InputFileBig,
+    InputMediaUploadedDocument,
+    InputMediaUploadedPhoto,
+    MessageMediaDocument,
+    MessageMediaPhoto,
+)
+
+from .cache import TTLCache
+from .media import MediaCache, media_fingerprint
+from .metrics import copy_bytes_total, copy_media_total, copy_transfers_active
+
+logger = logging.getLogger(__name__)
+
+COPY_MODES = ('off', 'fallback', 'always')
+# Largest upload part Telegram accepts; also a valid download request size,
+# so every downloaded chunk is exactly one upload part
+PART_SIZE = 512 * 1024
+# Files above this size must be uploaded with SaveBigFilePart
+BIG_FILE_SIZE = 10 * 1024 * 1024
+
+
+def copyable(message) -> bool:
+    """True if the message carries a photo or document that can be re-uploaded."""
+    return isinstance(getattr(message, 'media', None), (MessageMediaPhoto, MessageMediaDocument))
+
+
+def media_key(message) -> Hashable:
+    """Cache key of the file behind a message: reposts of the same file share it."""
+    media = message.media
+    if isinstance(media, MessageMediaPhoto):
+        return ('photo', media.photo.id)
+    return ('document', media.document.id)
+
+
+class MediaCopier:
+    """Re-send messages as new posts instead of forwarding them.
+
+    Media of ordinary sources is re-sent by reference, which costs no
+    transfer. Media of protected (noforwards) sources is streamed: chunks
+    from ``iter_download`` are uploaded as file parts while the download
+    continues, through a queue of at most ``buffer_parts`` chunks, so memory
+    per transfer is bounded by a few parts and nothing touches the disk. At
+    most ``concurrency`` transfers run at once per account. The uploaded
+    file is registered with Telegram once and cached by source file id, so
+    the same file sent to several targets, or reposted, is uploaded once.
+    With ``references`` a protected file this account already posted is
+    re-sent by the reference of that copy, without downloading it.
+    """
+
+    def __init__(self, concurrency: int = 2, buffer_parts: int = 4, cache_size: int = 10_000,
+                 cache_ttl: float = 86400, references: MediaCache | None = None):
+        self.concurrency = concurrency
+        self.buffer_parts = buffer_parts
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.references = references
+        self._slots = asyncio.Semaphore(concurrency)
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+
+    async def send(self, client, target: str, messages: Sequence, album: bool = False) -> List:
+        """Send one message, or one album as a single grouped send_file call; returns the sent messages."""
+        restricted = any(getattr(message, 'noforwards', False) is True for message in messages)
+        try:
+            return await self._send(client, target, messages, album, restricted)
+        except ChatForwardsRestrictedError:
+            if restricted:
+                raise
+            # The source is protected although the message was not marked so
+            return await self._send(client, target, messages, album, True)
+        except (FileReferenceExpiredError, FileReferenceInvalidError):
+            # A cached upload (or the source reference) went stale: upload afresh
+            for message in messages:
+                if copyable(message):
+                    self.cache.pop(media_key(message))
+                    if self.references is not None:
+                        self.references.forget(media_fingerprint(message))
+            return await self._send(client, target, messages, album, True)
+
+    async def _send(self, client, target: str, messages: Sequence, album: bool, restricted: bool) -> List:
+        if album:
+            items = [message for message in messages if copyable(message)]
+            files = await asyncio.gather(*(self.input_media(client, target, m, restricted) for m in items))
+            sent = await client.send_file(
+                target,
+                list(files),
+                caption=[m.message or '' for m in items],
+                formatting_entities=[m.entities or [] for m in items],
+                parse_mode=None,
+            )
+            return sent if isinstance(sent, list) else [sent]
+        sent = []
+        for message in messages:
+            if copyable(message):
+                sent.append(await client.send_file(
+                    target,
+                    await self.input_media(client, target, message, restricted),
+                    caption=message.message or '',
+                    formatting_entities=message.entities,
+                    parse_mode=None,
+                ))
+            else:
+                sent.append(await client.send_message(target, message.message, file=message.media))
+        return sent
+
+    async def input_media(self, client, target: str, message, restricted: bool):
+        """InputMedia for re-sending the message's file: a reference, or a (cached) upload."""
+        if not restricted:
+            copy_media_total.labels(result='reference').inc()
+            return utils.get_input_media(message.media)
+        if self.references is not None:
+            media = self.references.reference(media_fingerprint(message))
+            if media is not None:
+                copy_media_total.labels(result='reused').inc()
+                return media
+        key = media_key(message)
+        media = self.cache.get(key)
+        if media is not None:
+            copy_media_total.labels(result='cached').inc()
+            return media
+        pending = self._pending.get(key)
+        if pending is None:
+            # Concurrent sends of the same file (fan-out) share one upload
+            pending = self._pending[key] = asyncio.ensure_future(self._upload(client, target, message))
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        else:
+            copy_media_total.labels(result='cached').inc()
+        return await asyncio.shield(pending)
+
+    async def _upload(self, client, target: str, message):
+        media = message.media
+        async with self._slots:
+            copy_transfers_active.inc()
+            try:
+                input_file = await self._stream(client, message)
+            finally:
+                copy_transfers_active.dec()
+        if isinstance(media, MessageMediaPhoto):
+            uploaded = InputMediaUploadedPhoto(file=input_file)
+        else:
+            document = media.document
+            uploaded = InputMediaUploadedDocument(
+                file=input_file, mime_type=document.mime_type, attributes=document.attributes
+            )
+        # Register the upload once; the result is reusable for any target
+        result = await client(UploadMediaRequest(await client.get_input_entity(target), uploaded))
+        input_media = utils.get_input_media(result)
+        self.cache.set(media_key(message), input_media)
+        copy_media_total.labels(result='uploaded').inc()
+        return input_media
+
+    async def _stream(self, client, message):
+        """Pipe ``iter_download`` chunks into upload parts; returns the InputFile."""
+        media = message.media
+        document = getattr(media, 'document', None)
+        size = getattr(document, 'size', None)
+        big = size is not None and size > BIG_FILE_SIZE
+        total_parts = -(-size // PART_SIZE) if big else -1
+        file_id = random.getrandbits(63)
+        md5 = hashlib.md5()
+        parts: asyncio.Queue = asyncio.Queue(self.buffer_parts)
+
+        async def download():
+            try:
+                async for chunk in client.iter_download(media, request_size=PART_SIZE, file_size=size):
+                    await parts.put(chunk)
+            except Exception as e:
+                await parts.put(e)
+            else:
+                await parts.put(None)
+
+        downloader = asyncio.create_task(download())
+        part = 0
+        try:
+            while (chunk := await parts.get()) is not None:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                if big:
+                    await client(SaveBigFilePartRequest(file_id, part, total_parts, chunk))
+                else:
+                    md5.update(chunk)
+                    await client(SaveFilePartRequest(file_id, part, chunk))
+                copy_bytes_total.inc(len(chunk))
+                part += 1
+        finally:
+            downloader.cancel()
+
+        name = 'photo.jpg'
+        if document is not None:
+            name = next((a.file_name for a in document.attributes if isinstance(a, DocumentAttributeFilename)), 'file')
+        logger.debug(f"Streamed {name} in {part} parts")
+        if big:
+            return InputFileBig(file_id, part, name)
+        return InputFile(file_id, part, name, md5.hexdigest())
+
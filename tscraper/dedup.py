@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from .metrics import dedup_hits_total, dedup_misses_total
+
+logger = logging.getLogger(__name__)
+
+KIND_MESSAGE = 0
+KIND_GROUP = 1
+
+Key = Tuple[int, int, int]
+
+
+class DedupStore:
+    """Record of already forwarded messages and albums.
+
+    Keys are ``(chat_id, message_id)`` and ``(chat_id, grouped_id)``. Lookups
+    hit a bounded in-memory LRU first and fall back to an SQLite table; new
+    keys are written behind in batches and expired after ``ttl`` seconds.
+    All SQLite work runs on one dedicated thread, never on the event loop.
+    Without a ``path`` the store is memory-only.
+
+    Messages on their way to a target are ``reserve()``d: ``seen()`` is
+    True for them until the forward is recorded with ``add()`` or given up
+    with ``release()``, so a redelivered update is not forwarded twice
+    while the first copy is still queued. Reservations are counted, one per
+    holder (the pipeline, each job), and kept in memory only.
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        capacity: int = 100_000,
+        ttl: float = 7 * 24 * 3600,
+        flush_interval: float = 1.0,
+    ):
+        self.path = path
+        self.capacity = capacity
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._lru: OrderedDict[Key, float] = OrderedDict()
+        self._inflight: Dict[Key, int] = {}
+        self._pending: List[Tuple[int, int, int, float]] = []
+        self._db: sqlite3.Connection | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dedup') if path else None
+
+    def _remember(self, key: Key, ts: float) -> None:
+        self._lru[key] = ts
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    async def seen(self, chat_id: int, message_id: int, grouped_id: int | None = None) -> bool:
+        """True if the message, or the album it belongs to, was already forwarded."""
+        keys = [(chat_id, KIND_MESSAGE, message_id)]
+        if grouped_id:
+            keys.append((chat_id, KIND_GROUP, grouped_id))
+
+        if keys[0] in self._inflight:
+            dedup_hits_total.labels(tier='inflight').inc()
+            return True
+
+        now = time.time()
+        for key in keys:
+            ts = self._lru.get(key)
+            if ts is not None and now - ts < self.ttl:
+                self._lru.move_to_end(key)
+                dedup_hits_total.labels(tier='memory').inc()
+                return True
+
+        if self._executor:
+            ts = await asyncio.get_running_loop().run_in_executor(self._executor, self._db_lookup, keys, now - self.ttl)
+            if ts is not None:
+                self._remember(keys[0], ts)
+                dedup_hits_total.labels(tier='disk').inc()
+                return True
+
+        dedup_misses_total.inc()
+        return False
+
+    def add(self, chat_id: int, message_id: int, grouped_id: int | None = None) -> None:
+        """Mark a message (and its album) as forwarded; persisted on the next flush."""
+        now = time.time()
+        keys = [(chat_id, KIND_MESSAGE, message_id)]
+        if grouped_id:
+            keys.append((chat_id, KIND_GROUP, grouped_id))
+        for key in keys:
+            self._remember(key, now)
+            if self._executor:
+                self._pending.append((*key, now))
+
+    def reserve(self, chat_id: int, message_id: int) -> None:
+        """Hold a message as in flight; ``seen()`` is True for it until every holder released it."""
+        key = (chat_id, KIND_MESSAGE, message_id)
+        self._inflight[key] = self._inflight.get(key, 0) + 1
+
+    def release(self, chat_id: int, message_id: int) -> None:
+        """Drop one hold on a message; a no-op if it holds none."""
+        key = (chat_id, KIND_MESSAGE, message_id)
+        count = self._inflight.get(key, 0)
+        if count > 1:
+            self._inflight[key] = count - 1
+        else:
+            self._inflight.pop(key, None)
+
+    async def flush(self) -> None:
+        if not self._executor or not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        await asyncio.shield(asyncio.get_running_loop().run_in_executor(self._executor, self._db_write, rows))
+
+    async def prune(self) -> None:
+        if self._executor:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._db_prune, time.time() - self.ttl)
+
+    async def run(self, prune_interval: float = 3600) -> None:
+        """Background write-behind loop; flushes and closes the database on cancel."""
+        last_prune = 0.0
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+                if time.monotonic() - last_prune >= prune_interval:
+                    await self.prune()
+                    last_prune = time.monotonic()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        if not self._executor:
+            return
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._db_close)
+
+    # The methods below run on the store's executor thread only
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS forwarded ('
+                'chat_id INTEGER NOT NULL, kind INTEGER NOT NULL, item_id INTEGER NOT NULL, ts REAL NOT NULL, '
+                'PRIMARY KEY (chat_id, kind, item_id)) WITHOUT ROWID'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS forwarded_ts ON forwarded (ts)')
+        return self._db
+
+    def _db_lookup(self, keys: List[Key], min_ts: float) -> float | None:
+        db = self._conn()
+        for chat_id, kind, item_id in keys:
+            row = db.execute(
+                'SELECT ts FROM forwarded WHERE chat_id = ? AND kind = ? AND item_id = ? AND ts >= ?',
+                (chat_id, kind, item_id, min_ts),
+            ).fetchone()
+            if row:
+                return row[0]
+        return None
+
+    def _db_write(self, rows: List[Tuple[int, int, int, float]]) -> None:
+        db = self._conn()
+        with db:
+            db.executemany('INSERT OR REPLACE INTO forwarded VALUES (?, ?, ?, ?)', rows)
+
+    def _db_prune(self, min_ts: float) -> None:
+        db = self._conn()
+        with db:
+            deleted = db.execute('DELETE FROM forwarded WHERE ts < ?', (min_ts,)).rowcount
+        if deleted:
+            logger.info(f"Pruned {deleted} expired dedup entries")
+
+    def _db_close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,310 @@
+import asyncio
+import html
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, NamedTuple, Set, Tuple
+
+from .metrics import digest_buffered_messages, digest_flushes_total
+
+logger = logging.getLogger(__name__)
+
+# Telegram's limit for the text of one message, in UTF-16 code units
+MAX_POST_LENGTH = 4096
+# Formatting entities are capped per message too; every line carries one link
+MAX_POST_LINES = 100
+MAX_TITLE_LENGTH = 256
+
+
+class DigestError(ValueError):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class DigestPolicy:
+    """A category in digest mode: sent every ``interval`` seconds or at ``max_messages``."""
+    interval: float = 3600.0
+    max_messages: int = 100
+    title: str | None = None
+
+
+def parse_digests(section: Mapping[str, Any] | None) -> Dict[str, DigestPolicy]:
+    """Policies from the ``digests`` config section.
+
+    Each category maps to ``{interval_minutes, max_messages, title}``, all
+    optional; an empty entry uses the defaults (60 minutes, 100 messages).
+    """
+    if section is None:
+        return {}
+    if not isinstance(section, dict):
+        raise DigestError("digests must map categories to digest settings")
+    policies = {}
+    for category, spec in section.items():
+        spec = spec or {}
+        if not isinstance(spec, dict):
+            raise DigestError(f"digests.{category}: expected interval_minutes, max_messages or title")
+        unknown = set(spec) - {'interval_minutes', 'max_messages', 'title'}
+        if unknown:
+            raise DigestError(f"digests.{category}: unknown keys {', '.join(sorted(unknown))}")
+        try:
+            interval = float(spec.get('interval_minutes', 60)) * 60
+            max_messages = int(spec.get('max_messages', 100))
+        except (TypeError, ValueError):
+            raise DigestError(f"digests.{category}: interval_minutes and max_messages must be numbers")
+        if interval <= 0 or max_messages < 1:
+            raise DigestError(f"digests.{category}: interval_minutes and max_messages must be positive")
+        title = spec.get('title')
+        if title is not None and len(str(title)) > MAX_TITLE_LENGTH:
+            raise DigestError(f"digests.{category}: title is longer than {MAX_TITLE_LENGTH} characters")
+        policies[str(category)] = DigestPolicy(interval, max_messages, str(title) if title is not None else None)
+    return policies
+
+
+class DigestEntry(NamedTuple):
+    chat_id: int
+    message_id: int
+    grouped_id: int | None
+    source: str  # username, or the marked chat id
+    text: str  # the line shown in the digest
+    added_at: float  # time.time()
+
+
+@dataclass(slots=True)
+class Digest:
+    """A closed digest on its way to the target; ``sent`` counts the posts already delivered."""
+    target: str
+    category: str
+    entries: List[DigestEntry]
+    posts: List[str]
+    sent: int = 0
+
+
+def snippet(text: str | None, kind: str, limit: int = 200) -> str:
+    """``text`` on one line, cut to ``limit`` characters; ``[kind]`` for a post without text."""
+    line = ' '.join(text.split()) if text else ''
+    if not line:
+        return f'[{kind}]'
+    return line if len(line) <= limit else line[:limit - 1].rstrip() + '…'
+
+
+def message_link(source: str, chat_id: int, message_id: int) -> str | None:
+    """t.me link to a message: public by username, ``/c/`` for channels without one."""
+    if not source.lstrip('-').isdigit():
+        return f'https://t.me/{source.lstrip("@")}/{message_id}'
+    if chat_id <= -1_000_000_000_000:
+        return f'https://t.me/c/{-chat_id - 1_000_000_000_000}/{message_id}'
+    return None  # basic groups have no message links
+
+
+def utf16_length(text: str) -> int:
+    return len(text.encode('utf-16-le')) // 2
+
+
+def render(title: str, entries: List[DigestEntry], limit: int = MAX_POST_LENGTH) -> List[str]:
+    """HTML posts listing ``entries``, one line each, split to fit Telegram's limits."""
+    # Room for the bold title, a " (12/34)" part counter and the blank line
+    header = utf16_length(title) + 12
+    posts: List[List[str]] = []
+    lines: List[str] = []
+    size = header
+    for entry in entries:
+        link = message_link(entry.source, entry.chat_id, entry.message_id)
+        name = html.escape(entry.source)
+        if link:
+            name = f'<a href="{html.escape(link)}">{name}</a>'
+        length = utf16_length(f'• {entry.source}: {entry.text}') + 1
+        if lines and (size + length > limit or len(lines) >= MAX_POST_LINES):
+            posts.append(lines)
+            lines, size = [], header
+        lines.append(f'• {name}: {html.escape(entry.text)}')
+        size += length
+    if lines:
+        posts.append(lines)
+    heading = f'<b>{html.escape(title)}</b>'
+    if len(posts) == 1:
+        return [heading + '\n\n' + '\n'.join(posts[0])]
+    return [f'{heading} ({n}/{len(posts)})\n\n' + '\n'.join(body) for n, body in enumerate(posts, 1)]
+
+
+class DigestBuffer:
+    """Messages of digest categories, collected per (target, category) and sent as summary posts.
+
+    ``add()`` keeps one line per message (a snippet and a link, not the
+    message) and ignores messages already buffered or in flight for the
+    target, so catch-up after a reconnect adds nothing twice. A buffer is
+    closed when it reaches its category's ``max_messages``, when its oldest
+    entry is ``interval`` seconds old (checked by ``run()``), and when all
+    buffers together exceed ``max_entries`` (the oldest buffer goes early).
+    A closed buffer is rendered into posts and handed to ``send``; ``ack()``
+    forgets it once it was delivered or given up.
+
+    With a ``path`` entries are written behind to SQLite every
+    ``flush_interval`` seconds and deleted on ``ack()``. ``run()`` first
+    restores what was buffered or in flight when the process stopped, so a
+    restart sends it with the next digest instead of losing it.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Digest], Awaitable[None]],
+        policies: Mapping[str, DigestPolicy] | None = None,
+        path: str | None = None,
+        max_entries: int = 10_000,
+        snippet_chars: int = 200,
+        flush_interval: float = 1.0,
+    ):
+        self._send = send
+        self.policies: Dict[str, DigestPolicy] = dict(policies or {})
+        self.path = path
+        self.max_entries = max_entries
+        self.snippet_chars = snippet_chars
+        self.flush_interval = flush_interval
+        self._buffers: Dict[Tuple[str, str], List[DigestEntry]] = {}
+        self._keys: Set[Tuple[str, int, int]] = set()  # buffered or in flight
+        self._size = 0
+        self._pending: List[tuple] = []
+        self._acked: List[Tuple[str, int, int]] = []
+        self._db: sqlite3.Connection | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='digest') if path else None
+
+    def policy(self, category: str) -> DigestPolicy | None:
+        return self.policies.get(category)
+
+    def configure(self, policies: Mapping[str, DigestPolicy]) -> None:
+        """Apply new policies; buffers of categories that left digest mode are sent by ``run()``."""
+        self.policies = dict(policies)
+
+    def buffered(self) -> int:
+        return self._size
+
+    async def add(self, target: str, category: str, chat_id: int, message_id: int, source: str,
+                  text: str | None, kind: str, grouped_id: int | None = None) -> bool:
+        """Buffer a message for the target's digest; False if it is already buffered or in flight."""
+        key = (target, chat_id, message_id)
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        entry = DigestEntry(chat_id, message_id, grouped_id, source, snippet(text, kind, self.snippet_chars), time.time())
+        buffer = self._buffers.setdefault((target, category), [])
+        buffer.append(entry)
+        self._size += 1
+        digest_buffered_messages.labels(category=category).inc()
+        if self._executor:
+            self._pending.append((target, category, *entry))
+        policy = self.policy(category)
+        if policy is None or len(buffer) >= policy.max_messages:
+            await self._close(target, category, 'size')
+        elif self._size > self.max_entries:
+            oldest = min(self._buffers, key=lambda buffer_key: self._buffers[buffer_key][0].added_at)
+            await self._close(*oldest, 'memory')
+        return True
+
+    def ack(self, digest: Digest) -> None:
+        for entry in digest.entries:
+            key = (digest.target, entry.chat_id, entry.message_id)
+            self._keys.discard(key)
+            if self._executor:
+                self._acked.append(key)
+
+    async def close_due(self) -> None:
+        """Close buffers whose interval passed, that are full, or whose category left digest mode."""
+        now = time.time()
+        for (target, category), entries in list(self._buffers.items()):
+            policy = self.policy(category)
+            if policy is None:
+                await self._close(target, category, 'reload')
+            elif len(entries) >= policy.max_messages:
+                await self._close(target, category, 'size')
+            elif now - entries[0].added_at >= policy.interval:
+                await self._close(target, category, 'interval')
+
+    async def flush(self) -> None:
+        if not self._executor or not (self._pending or self._acked):
+            return
+        rows, self._pending = self._pending, []
+        acked, self._acked = self._acked, []
+        await asyncio.shield(asyncio.get_running_loop().run_in_executor(self._executor, self._db_write, rows, acked))
+
+    async def run(self) -> None:
+        """Restore persisted entries, then send due digests and write behind until cancelled."""
+        try:
+            await self._restore()
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+                await self.close_due()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        if not self._executor:
+            return
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._db_close)
+
+    async def _close(self, target: str, category: str, reason: str) -> None:
+        entries = self._buffers.pop((target, category), None)
+        if not entries:
+            return
+        self._size -= len(entries)
+        digest_buffered_messages.labels(category=category).dec(len(entries))
+        digest_flushes_total.labels(category=category, reason=reason).inc()
+        policy = self.policy(category) or DigestPolicy()
+        posts = render(policy.title or f'{category} digest', entries)
+        await self._send(Digest(target, category, entries, posts))
+
+    async def _restore(self) -> None:
+        if not self._executor:
+            return
+        rows = await asyncio.get_running_loop().run_in_executor(self._executor, self._db_load)
+        restored = 0
+        for target, category, *fields in rows:
+            entry = DigestEntry(*fields)
+            key = (target, entry.chat_id, entry.message_id)
+            if key in self._keys:
+                continue
+            self._keys.add(key)
+            self._buffers.setdefault((target, category), []).append(entry)
+            digest_buffered_messages.labels(category=category).inc()
+            restored += 1
+        if restored:
+            for entries in self._buffers.values():
+                entries.sort(key=lambda entry: entry.added_at)
+            self._size += restored
+            logger.info(f"Restored {restored} messages waiting for a digest")
+
+    # The methods below run on the buffer's executor thread only
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS digest_entries ('
+                'target TEXT NOT NULL, category TEXT NOT NULL, chat_id INTEGER NOT NULL, '
+                'message_id INTEGER NOT NULL, grouped_id INTEGER, source TEXT NOT NULL, text TEXT NOT NULL, '
+                'added_at REAL NOT NULL, PRIMARY KEY (target, chat_id, message_id)) WITHOUT ROWID'
+            )
+        return self._db
+
+    def _db_write(self, rows: List[tuple], acked: List[Tuple[str, int, int]]) -> None:
+        db = self._conn()
+        with db:
+            db.executemany('INSERT OR REPLACE INTO digest_entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            db.executemany(
+                'DELETE FROM digest_entries WHERE target = ? AND chat_id = ? AND message_id = ?', acked
+            )
+
+    def _db_load(self) -> List[tuple]:
+        return self._conn().execute(
+            'SELECT target, category, chat_id, message_id, grouped_id, source, text, added_at '
+            'FROM digest_entries ORDER BY added_at'
+        ).fetchall()
+
+    def _db_close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,248 @@
+import re
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from .metrics import messages_filtered_total
+
+try:
+    import ahocorasick
+except ImportError:  # optional: pip install pyahocorasick
+    ahocorasick = None
+
+# Telethon Message properties that identify the kind of media attached
+MEDIA_TYPES = ('photo', 'video', 'gif', 'sticker', 'voice', 'audio', 'document', 'poll', 'web_preview')
+
+
+class FilterError(ValueError):
+    pass
+
+
+def media_types(message: Any) -> Tuple[str, ...]:
+    """Media kinds of a message; ``('text',)`` for a message without media."""
+    if not getattr(message, 'media', None):
+        return ('text',)
+    kinds = tuple(kind for kind in MEDIA_TYPES if getattr(message, kind, None))
+    # video/gif/sticker/voice/audio are documents too; report the most specific kind
+    if len(kinds) > 1 and 'document' in kinds:
+        kinds = tuple(kind for kind in kinds if kind != 'document')
+    return kinds or ('other',)
+
+
+def trie_pattern(words: Iterable[str]) -> str:
+    """One regex matching any of ``words``, shaped as a prefix trie.
+
+    ``re`` tries a flat ``a|b|c`` alternation branch by branch at every
+    position; with shared prefixes factored out each character is examined
+    about once.
+    """
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def emit(node: Dict) -> str:
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        singles = [branch for branch in branches if len(branch) == 1]
+        alternatives = [branch for branch in branches if len(branch) != 1]
+        if len(singles) > 1:
+            alternatives.append('[' + ''.join(singles) + ']')
+        else:
+            alternatives.extend(singles)
+        body = alternatives[0] if len(alternatives) == 1 else '(?:' + '|'.join(alternatives) + ')'
+        if '' in node:
+            # A keyword ends here; longer ones continue the match greedily
+            body = f'(?:{body})?' if len(body) > 1 else body + '?'
+        return body
+
+    return emit(trie)
+
+
+class KeywordMatcher:
+    """Case-insensitive substring search for many keywords in one pass.
+
+    Uses an Aho-Corasick automaton when ``pyahocorasick`` is installed and
+    a trie-shaped regex otherwise.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = list(dict.fromkeys(str(k).casefold() for k in keywords if str(k)))
+        self._automaton = None
+        self._regex = None
+        if not self.keywords:
+            return
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for keyword in self.keywords:
+                self._automaton.add_word(keyword, keyword)
+            self._automaton.make_automaton()
+        else:
+            self._regex = re.compile(trie_pattern(self.keywords))
+
+    def search(self, folded: str) -> str | None:
+        """First keyword found in ``folded`` (already casefolded text)."""
+        if self._automaton is not None:
+            for _, keyword in self._automaton.iter(folded):
+                return keyword
+            return None
+        if self._regex is not None:
+            match = self._regex.search(folded)
+            return match.group() if match else None
+        return None
+
+    def __bool__(self) -> bool:
+        return bool(self.keywords)
+
+
+class RegexMatcher:
+    """Case-insensitive regex rules, compiled once; reports which one matched.
+
+    The rules are merged into one non-capturing alternation, so a message
+    is scanned once whatever the number of rules. On a hit the rules are
+    tried in order at the match position, which finds the branch the
+    alternation took. Capturing (or named) groups per rule would name it
+    directly but disable ``re``'s prefix scan and are several times slower
+    (see benchmarks/bench_filters.py). Rules that cannot share a pattern
+    (backreferences, global inline flags, group names used by another rule)
+    are searched on their own.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = [str(p) for p in patterns]
+        self._merged: List[Tuple[str, re.Pattern]] = []
+        self._separate: List[Tuple[str, re.Pattern]] = []
+        self._regex = None
+        names = set()
+        for pattern in self.patterns:
+            try:
+                compiled = re.compile(pattern, re.IGNORECASE)
+            except re.error as e:
+                raise FilterError(f"Invalid regex {pattern!r}: {e}")
+            if _mergeable(pattern) and names.isdisjoint(compiled.groupindex):
+                names.update(compiled.groupindex)
+                self._merged.append((pattern, compiled))
+            else:
+                self._separate.append((pattern, compiled))
+        if self._merged:
+            self._regex = re.compile('|'.join(f'(?:{p})' for p, _ in self._merged), re.IGNORECASE)
+
+    def search(self, text: str) -> str | None:
+        if self._regex is not None:
+            match = self._regex.search(text)
+            if match:
+                start = match.start()
+                for pattern, compiled in self._merged:
+                    if compiled.match(text, start):
+                        return pattern
+        for pattern, compiled in self._separate:
+            if compiled.search(text):
+                return pattern
+        return None
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+
+
+# Backreferences and conditionals count groups or names across the whole
+# pattern, which the merged alternation would renumber
+_REFERENCE = re.compile(r'\\(?:[1-9]|g<)|\(\?P=|\(\?\(')
+
+
+def _mergeable(pattern: str) -> bool:
+    if _REFERENCE.search(pattern):
+        return False
+    try:
+        # Global flags such as (?x) are only valid at the start of the whole pattern
+        re.compile(f'(?:{pattern})')
+    except re.error:
+        return False
+    return True
+
+
+def _rule_list(section: Dict, key: str) -> List:
+    value = section.get(key) or []
+    if isinstance(value, str):
+        return [value]
+    if not isinstance(value, list):
+        raise FilterError(f"'{key}' must be a list")
+    return value
+
+
+class RuleSet:
+    """Compiled include/exclude rules of one category.
+
+    ``check()`` returns the name of the rule that drops a message, or None
+    if it may be forwarded.
+    """
+
+    def __init__(self, rules: Dict):
+        if not isinstance(rules, dict):
+            raise FilterError("Filter rules must be a mapping")
+        include = rules.get('include') or {}
+        exclude = rules.get('exclude') or {}
+        if not isinstance(include, dict) or not isinstance(exclude, dict):
+            raise FilterError("'include' and 'exclude' must be mappings")
+        self.include_keywords = KeywordMatcher(_rule_list(include, 'keywords'))
+        self.include_regex = RegexMatcher(_rule_list(include, 'regex'))
+        self.include_media = set(_rule_list(include, 'media'))
+        self.exclude_keywords = KeywordMatcher(_rule_list(exclude, 'keywords'))
+        self.exclude_regex = RegexMatcher(_rule_list(exclude, 'regex'))
+        self.exclude_media = set(_rule_list(exclude, 'media'))
+        for kind in self.include_media | self.exclude_media:
+            if kind not in MEDIA_TYPES + ('text', 'other'):
+                raise FilterError(f"Unknown media type {kind!r}")
+        self.min_length = int(rules.get('min_length') or 0)
+        self.max_length = int(rules['max_length']) if rules.get('max_length') is not None else None
+
+    def check(self, text: str, media: Sequence[str]) -> str | None:
+        length = len(text)
+        if length < self.min_length:
+            return 'min_length'
+        if self.max_length is not None and length > self.max_length:
+            return 'max_length'
+        for kind in media:
+            if kind in self.exclude_media:
+                return f'exclude:media:{kind}'
+        if self.include_media and not self.include_media.intersection(media):
+            return 'include:media'
+
+        folded = text.casefold() if self.exclude_keywords or self.include_keywords else text
+        keyword = self.exclude_keywords.search(folded)
+        if keyword is not None:
+            return f'exclude:keyword:{keyword}'
+        pattern = self.exclude_regex.search(text)
+        if pattern is not None:
+            return f'exclude:regex:{pattern}'
+        if self.include_keywords or self.include_regex:
+            if self.include_keywords.search(folded) is None and self.include_regex.search(text) is None:
+                return 'include'
+        return None
+
+
+class ContentFilter:
+    """Per-category rule sets from the top-level ``filters`` config section."""
+
+    def __init__(self, filters: Dict | None = None):
+        if not isinstance(filters or {}, dict):
+            raise FilterError("Invalid filters section")
+        self.rules: Dict[str, RuleSet] = {}
+        for category, rules in (filters or {}).items():
+            try:
+                self.rules[category] = RuleSet(rules or {})
+            except FilterError as e:
+                raise FilterError(f"Invalid filter for category {category}: {e}")
+
+    def check(self, category: str, text: str, media: Sequence[str]) -> str | None:
+        """Rule dropping the message for ``category`` (counted), or None."""
+        rules = self.rules.get(category)
+        if rules is None:
+            return None
+        rule = rules.check(text, media)
+        if rule is not None:
+            messages_filtered_total.labels(category=category, rule=rule).inc()
+        return rule
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
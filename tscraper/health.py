@@ -1,31 +1,96 @@
+import asyncio
+import logging
+import threading
+import time
+
+import uvicorn
 from fastapi import FastAPI, status
 from fastapi.responses import JSONResponse, Response
-from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import REGISTRY, CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI()
 start_time = datetime.now()
 
-# Shared state — set by the scraper at runtime
+# Shared state — set by the scraper at runtime. Writers publish a new dict
+# instead of mutating it, so the server thread always reads a consistent
+# snapshot without a lock.
 _scraper_status: dict = {"connected": False, "last_error": None}
 
+# Per-shard state, set by the supervisor in sharded mode (copy-on-write too)
+_shard_status: dict = {}
+
+_metrics_registry: CollectorRegistry = REGISTRY
+
+
+class MetricsCache:
+    """``generate_latest()`` output, regenerated at most every ``max_age`` seconds."""
+
+    def __init__(self, registry: CollectorRegistry, max_age: float = 1.0):
+        self.registry = registry
+        self.max_age = max_age
+        self._body = b""
+        self._generated = float("-inf")
+        self._lock = threading.Lock()
+
+    def get(self) -> bytes:
+        with self._lock:
+            if time.monotonic() - self._generated >= self.max_age:
+                self._body = generate_latest(self.registry)
+                self._generated = time.monotonic()
+            return self._body
+
+
+_metrics_cache = MetricsCache(_metrics_registry)
+
+
+def scraper_status() -> dict:
+    """The current status snapshot; never mutated once published."""
+    return _scraper_status
+
 
 def set_scraper_status(*, connected: bool, last_error: str | None = None):
-    _scraper_status["connected"] = connected
-    _scraper_status["last_error"] = last_error
+    global _scraper_status
+    _scraper_status = {"connected": connected, "last_error": last_error}
+
+
+def set_shard_status(shard: str, *, connected: bool, last_error: str | None = None):
+    global _shard_status
+    shards = {**_shard_status, shard: {"connected": connected, "last_error": last_error}}
+    _shard_status = shards
+    set_scraper_status(
+        connected=all(state["connected"] for state in shards.values()),
+        last_error=next((state["last_error"] for state in shards.values() if state["last_error"]), None),
+    )
+
+
+def set_metrics_registry(registry: CollectorRegistry):
+    global _metrics_registry
+    _metrics_registry = registry
+    _metrics_cache.registry = registry
+
+
+def set_metrics_cache_seconds(max_age: float):
+    _metrics_cache.max_age = max_age
 
 
 @app.get("/health")
 async def health_check():
-    connected = _scraper_status["connected"]
+    scraper = _scraper_status
+    shards = _shard_status
+    connected = scraper["connected"]
     payload = {
         "status": "healthy" if connected else "degraded",
         "scraper_connected": connected,
         "uptime": str(datetime.now() - start_time),
         "timestamp": datetime.now().isoformat(),
     }
-    if _scraper_status["last_error"]:
-        payload["last_error"] = _scraper_status["last_error"]
+    if scraper["last_error"]:
+        payload["last_error"] = scraper["last_error"]
+    if shards:
+        payload["shards"] = {shard: dict(state) for shard, state in sorted(shards.items())}
 
     code = status.HTTP_200_OK if connected else status.HTTP_503_SERVICE_UNAVAILABLE
     return JSONResponse(status_code=code, content=payload)
@@ -34,6 +99,36 @@ async def health_check():
 @app.get("/metrics")
 async def metrics():
     return Response(
-        content=generate_latest(),
+        content=_metrics_cache.get(),
         media_type=CONTENT_TYPE_LATEST,
     )
+
+
+async def serve_health(port: int, metrics_cache_seconds: float = 1.0):
+    """Serve ``app`` from a dedicated thread with its own event loop until cancelled.
+
+    Scrapes of /metrics and /health never run on the caller's loop, which
+    keeps serializing a large registry away from Telegram update handling.
+    """
+    set_metrics_cache_seconds(metrics_cache_seconds)
+    server = uvicorn.Server(uvicorn.Config(app=app, host="0.0.0.0", port=port, loop="asyncio"))
+    stopped = asyncio.get_running_loop().create_future()
+
+    def run():
+        try:
+            asyncio.run(server.serve())
+        except BaseException as e:
+            logger.error(f"Health server stopped: {e}")
+        finally:
+            try:
+                stopped.get_loop().call_soon_threadsafe(lambda: stopped.done() or stopped.set_result(None))
+            except RuntimeError:
+                pass  # the caller's loop is already closed
+
+    thread = threading.Thread(target=run, name="health-server", daemon=True)
+    thread.start()
+    try:
+        await stopped
+    finally:
+        server.should_exit = True
+        await asyncio.to_thread(thread.join, 5)
@@ -0,0 +1,256 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Mapping, Tuple
+
+from .metrics import forward_lane_depth, forward_lane_overdue_total, forward_queue_wait_seconds
+
+DEFAULT_PRIORITY = 1.0
+
+
+class PriorityError(ValueError):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class LanePolicy:
+    """Scheduling weight of a category and how long its jobs may wait for a worker."""
+    priority: float = DEFAULT_PRIORITY
+    max_lag: float | None = None
+
+    @property
+    def label(self) -> str:
+        return f'{self.priority:g}'
+
+
+DEFAULT_POLICY = LanePolicy()
+
+
+def parse_priorities(section: Mapping[str, Any] | None) -> Dict[str, LanePolicy]:
+    """Policies from the ``priorities`` config section.
+
+    Each category maps to a priority or to ``{priority, max_lag}``;
+    categories not listed get priority 1 and no ``max_lag``.
+    """
+    if section is None:
+        return {}
+    if not isinstance(section, dict):
+        raise PriorityError("priorities must map categories to a priority")
+    policies = {}
+    for category, spec in section.items():
+        if not isinstance(spec, dict):
+            spec = {'priority': spec}
+        unknown = set(spec) - {'priority', 'max_lag'}
+        if unknown:
+            raise PriorityError(f"priorities.{category}: unknown keys {', '.join(sorted(unknown))}")
+        try:
+            priority = float(spec.get('priority', DEFAULT_PRIORITY))
+            max_lag = float(spec['max_lag']) if spec.get('max_lag') is not None else None
+        except (TypeError, ValueError):
+            raise PriorityError(f"priorities.{category}: priority and max_lag must be numbers")
+        if priority <= 0:
+            raise PriorityError(f"priorities.{category}: priority must be positive")
+        if max_lag is not None and max_lag <= 0:
+            raise PriorityError(f"priorities.{category}: max_lag must be positive")
+        policies[str(category)] = LanePolicy(priority, max_lag)
+    return policies
+
+
+class _Lane:
+    __slots__ = ('category', 'policy', 'jobs', 'finish', 'last')
+
+    def __init__(self, category: str, policy: LanePolicy):
+        self.category = category
+        self.policy = policy
+        self.jobs: Deque[Any] = deque()
+        self.finish = 0.0  # virtual finish time of the job at the head
+        self.last = 0.0  # virtual finish time of the last job taken
+
+
+class LaneQueue:
+    """Bounded job queue with a FIFO lane per category, served by weighted fair queuing.
+
+    Jobs are tagged with a virtual finish time that grows by ``1 / priority``
+    per job of their lane (self-clocked fair queuing), and ``get`` takes the
+    head with the smallest tag. Under backlog a lane of priority 10 is served
+    ten times as often as one of priority 1, and every lane with jobs keeps
+    its share, so low priorities slow down but never stop. A lane that was
+    idle starts again at the current virtual time instead of claiming the
+    turns it skipped. When the head of a lane with ``max_lag`` has waited
+    that long it is taken first, earliest deadline first.
+
+    The capacity is shared by all lanes. ``put`` waits while the queue is
+    full and a freed slot goes to the waiting job with the highest
+    priority; ``shed()`` makes room by evicting the newest job of a
+    lower-priority lane. Implements the part of ``asyncio.Queue`` that
+    ForwardQueue uses.
+    """
+
+    def __init__(self, maxsize: int = 0, priorities: Mapping[str, LanePolicy] | None = None):
+        self.maxsize = maxsize
+        self._policies: Dict[str, LanePolicy] = dict(priorities or {})
+        self._lanes: Dict[str, _Lane] = {}
+        self._active: Dict[str, _Lane] = {}  # lanes with jobs
+        self._size = 0
+        self._vtime = 0.0
+        self._getters: Deque[asyncio.Future] = deque()
+        self._putters: List[Tuple[float, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._unfinished = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    def policy(self, category: str) -> LanePolicy:
+        return self._policies.get(category, DEFAULT_POLICY)
+
+    def configure(self, priorities: Mapping[str, LanePolicy]) -> None:
+        """Apply new policies; queued jobs keep their place in their lane."""
+        self._policies = dict(priorities)
+        for lane in self._lanes.values():
+            policy = self.policy(lane.category)
+            if policy != lane.policy and lane.jobs:
+                forward_lane_depth.labels(priority=lane.policy.label).dec(len(lane.jobs))
+                forward_lane_depth.labels(priority=policy.label).inc(len(lane.jobs))
+            lane.policy = policy
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return not self._size
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= self._size
+
+    def put_nowait(self, job: Any) -> None:
+        if self.full():
+            raise asyncio.QueueFull
+        lane = self._lanes.get(job.category)
+        if lane is None:
+            lane = self._lanes[job.category] = _Lane(job.category, self.policy(job.category))
+        if not lane.jobs:
+            lane.finish = max(lane.last, self._vtime) + 1 / lane.policy.priority
+            self._active[lane.category] = lane
+        lane.jobs.append(job)
+        self._size += 1
+        self._unfinished += 1
+        self._finished.clear()
+        forward_lane_depth.labels(priority=lane.policy.label).inc()
+        self._wake_getter()
+
+    async def put(self, job: Any) -> None:
+        while self.full():
+            putter = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._putters, (-self.policy(job.category).priority, next(self._order), putter))
+            try:
+                await putter
+            except BaseException:
+                putter.cancel()  # skipped by _wake_putter
+                if not self.full() and not putter.cancelled():
+                    self._wake_putter()
+                raise
+        self.put_nowait(job)
+
+    def get_nowait(self) -> Any:
+        if not self._size:
+            raise asyncio.QueueEmpty
+        now = time.monotonic()
+        lane = self._overdue(now)
+        overdue = lane is not None
+        if lane is None:
+            lane = min(self._active.values(), key=lambda active: (active.finish, -active.policy.priority))
+            self._vtime = lane.finish
+        job = lane.jobs.popleft()
+        lane.last = lane.finish
+        if lane.jobs:
+            lane.finish = lane.last + 1 / lane.policy.priority
+        else:
+            del self._active[lane.category]
+        self._size -= 1
+        label = lane.policy.label
+        forward_lane_depth.labels(priority=label).dec()
+        forward_queue_wait_seconds.labels(priority=label).observe(now - job.enqueued_at)
+        if overdue:
+            forward_lane_overdue_total.labels(priority=label).inc()
+        self._wake_putter()
+        return job
+
+    async def get(self) -> Any:
+        while not self._size:
+            getter = asyncio.get_running_loop().create_future()
+            self._getters.append(getter)
+            try:
+                await getter
+            except BaseException:
+                getter.cancel()
+                try:
+                    self._getters.remove(getter)
+                except ValueError:
+                    pass
+                if self._size and not getter.cancelled():
+                    self._wake_getter()
+                raise
+        return self.get_nowait()
+
+    def shed(self, job: Any, keep: Callable[[Any], bool] | None = None) -> Any | None:
+        """Evict the newest job of the lowest lane below ``job``'s priority; returns it, or None.
+
+        Jobs for which ``keep`` returns True are never evicted.
+        """
+        priority = self.policy(job.category).priority
+        for lane in sorted(self._active.values(), key=lambda active: active.policy.priority):
+            if lane.policy.priority >= priority:
+                return None
+            index = next(
+                (i for i in range(len(lane.jobs) - 1, -1, -1) if keep is None or not keep(lane.jobs[i])), None
+            )
+            if index is None:
+                continue
+            evicted = lane.jobs[index]
+            del lane.jobs[index]
+            if not lane.jobs:
+                del self._active[lane.category]
+            self._size -= 1
+            forward_lane_depth.labels(priority=lane.policy.label).dec()
+            self.task_done()
+            return evicted
+        return None
+
+    def task_done(self) -> None:
+        if self._unfinished <= 0:
+            raise ValueError('task_done() called too many times')
+        self._unfinished -= 1
+        if not self._unfinished:
+            self._finished.set()
+
+    async def join(self) -> None:
+        if self._unfinished:
+            await self._finished.wait()
+
+    def _overdue(self, now: float) -> _Lane | None:
+        # Earliest deadline among lane heads that waited longer than max_lag
+        best, best_deadline = None, now
+        for lane in self._active.values():
+            if lane.policy.max_lag is None:
+                continue
+            deadline = lane.jobs[0].enqueued_at + lane.policy.max_lag
+            if deadline <= best_deadline:
+                best, best_deadline = lane, deadline
+        return best
+
+    def _wake_getter(self) -> None:
+        while self._getters:
+            getter = self._getters.popleft()
+            if not getter.done():
+                getter.set_result(None)
+                return
+
+    def _wake_putter(self) -> None:
+        while self._putters:
+            putter = heapq.heappop(self._putters)[2]
+            if not putter.done():
+                putter.set_result(None)
+                return
@@ -0,0 +1,163 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+LOG_FORMATS = ('text', 'json')
+
+# Standard LogRecord attributes; anything else on a record came from ``extra``
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class MessageSampler:
+    """Decides which per-message INFO records are emitted.
+
+    A record passes with probability ``sample_rate`` and then only while the
+    token bucket allows ``max_per_second`` records per second (0 disables
+    the limit). Records at WARNING and above always pass.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, max_per_second: float = 10.0):
+        self.sample_rate = sample_rate
+        self.max_per_second = max_per_second
+        self._tokens = max_per_second
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def allow(self, level: int) -> bool:
+        if level >= logging.WARNING:
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.suppressed += 1
+            return False
+        if not self.max_per_second:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.max_per_second, self._tokens + (now - self._updated) * self.max_per_second)
+            self._updated = now
+            if self._tokens < 1:
+                self.suppressed += 1
+                return False
+            self._tokens -= 1
+            return True
+
+
+_sampler = MessageSampler()
+_listener: logging.handlers.QueueListener | None = None
+
+
+def log_message(logger: logging.Logger, event: str, level: int = logging.INFO, **fields: Any) -> None:
+    """Per-message log record with structured ``fields`` (chat_id, message_id, category, target, stage, duration).
+
+    Sampled at INFO, so the hot path pays for a level check and the sampler
+    only; the record is formatted later, on the listener thread.
+    """
+    if not logger.isEnabledFor(level) or not _sampler.allow(level):
+        return
+    logger.log(level, event, extra={'fields': fields})
+
+
+def _extra_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    fields = dict(getattr(record, 'fields', None) or {})
+    for key, value in vars(record).items():
+        if key not in _RECORD_ATTRS and key != 'fields':
+            fields.setdefault(key, value)
+    return fields
+
+
+class TextFormatter(logging.Formatter):
+    """The classic text line, with structured fields appended as ``key=value``."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items() if value is not None)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and the structured fields."""
+
+    def __init__(self, static: Dict[str, Any] | None = None):
+        super().__init__()
+        self.static = static or {}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            **self.static,
+        }
+        for key, value in _extra_fields(record).items():
+            if value is not None:
+                entry[key] = value if isinstance(value, (int, float, str, bool)) else str(value)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    # The stock prepare() formats the record on the calling thread; the
+    # listener runs in this process, so it can format the record itself.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(settings: Dict | None = None, shard: int | None = None) -> logging.handlers.QueueListener:
+    """Route all logging through a queue to a writer thread; returns the started listener.
+
+    Callers on the event loop only enqueue records. The listener thread
+    formats them (``log_format``: text or json) and writes to stderr. It is
+    stopped, draining the queue, at interpreter exit.
+    """
+    global _sampler, _listener
+    settings = settings or {}
+    log_format = settings.get('log_format', 'text')
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"log_format must be one of {', '.join(LOG_FORMATS)}")
+    level = logging.getLevelName(str(settings.get('log_level', 'INFO')).upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log_level: {settings.get('log_level')}")
+    _sampler = MessageSampler(
+        sample_rate=float(settings.get('log_sample_rate', 1.0)),
+        max_per_second=float(settings.get('log_message_rate', 10)),
+    )
+
+    stream = logging.StreamHandler(sys.stderr)
+    if log_format == 'json':
+        stream.setFormatter(JsonFormatter({'shard': shard} if shard is not None else None))
+    else:
+        prefix = f'%(asctime)s - shard{shard} - ' if shard is not None else '%(asctime)s - '
+        stream.setFormatter(TextFormatter(prefix + '%(levelname)s - %(message)s'))
+
+    _stop_listener()
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_LazyQueueHandler(records))
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
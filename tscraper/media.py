@@ -0,0 +1,132 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Tuple
+
+from telethon.tl.types import (
+    Document,
+    MessageMediaDocument,
+    MessageMediaPhoto,
+    Photo,
+    PhotoCachedSize,
+    PhotoSize,
+    PhotoSizeProgressive,
+)
+
+from .metrics import media_cache_bytes, media_cache_entries, media_cache_evictions_total, media_cache_lookups_total
+
+REPEAT_MEDIA_ACTIONS = ('forward', 'skip', 'caption')
+# Estimated memory of one entry: the OrderedDict slot and node, the key and
+# value tuples and the fingerprint (measured with tracemalloc, CPython 3.11)
+ENTRY_BYTES = 400
+# An InputMedia reference adds its TL objects and the file_reference bytes
+REFERENCE_BYTES = 250
+
+Fingerprint = Tuple[str, int, int, int]
+
+
+def photo_size(photo: Photo) -> int:
+    """Byte size of the largest stored size of a photo."""
+    sizes = [0]
+    for size in photo.sizes:
+        if isinstance(size, PhotoSize):
+            sizes.append(size.size)
+        elif isinstance(size, PhotoSizeProgressive) and size.sizes:
+            sizes.append(max(size.sizes))
+        elif isinstance(size, PhotoCachedSize):
+            sizes.append(len(size.bytes))
+    return max(sizes)
+
+
+def media_fingerprint(message) -> Fingerprint | None:
+    """Identity of the photo or document of a message: kind, file id, access hash and size.
+
+    Reposts and forwards of one file share it, whatever the message around it.
+    """
+    media = getattr(message, 'media', None)
+    if isinstance(media, MessageMediaPhoto) and isinstance(media.photo, Photo):
+        photo = media.photo
+        return ('photo', photo.id, photo.access_hash, photo_size(photo))
+    if isinstance(media, MessageMediaDocument) and isinstance(media.document, Document):
+        document = media.document
+        return ('document', document.id, document.access_hash, document.size)
+    return None
+
+
+class MediaCache:
+    """Media already delivered per target, and reusable references to it, in one bounded LRU.
+
+    ``seen(target, fp)`` answers whether the file behind a fingerprint
+    reached ``target`` within ``ttl`` seconds. ``reference(fp)`` returns an
+    InputMedia taken from a message this account posted with the file, so
+    re-sending it needs neither the source's file reference nor an upload.
+    Entries expire ``ttl`` seconds after they were added, and the least
+    recently used are evicted while the estimated size exceeds ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 2**20, ttl: float = 86400):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, Tuple[float, Any, int]] = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def size(self) -> int:
+        """Estimated memory held by the entries, in bytes."""
+        return self._bytes
+
+    def seen(self, target: str, fp: Fingerprint) -> bool:
+        hit = self._get(('sent', target, fp)) is not None
+        media_cache_lookups_total.labels(kind='sent', result='hit' if hit else 'miss').inc()
+        return hit
+
+    def reference(self, fp: Fingerprint) -> Any | None:
+        item = self._get(('ref', fp))
+        media_cache_lookups_total.labels(kind='reference', result='miss' if item is None else 'hit').inc()
+        return None if item is None else item[1]
+
+    def add(self, target: str, fp: Fingerprint, reference: Any = None) -> None:
+        """Record that the file reached ``target``, with the InputMedia of the sent copy if known."""
+        self._set(('sent', target, fp), True, ENTRY_BYTES + len(target))
+        if reference is not None:
+            file_reference = getattr(getattr(reference, 'id', None), 'file_reference', None) or b''
+            self._set(('ref', fp), reference, ENTRY_BYTES + REFERENCE_BYTES + len(file_reference))
+
+    def forget(self, fp: Fingerprint) -> None:
+        """Drop the reference to a file, e.g. after Telegram rejected it as expired."""
+        item = self._data.pop(('ref', fp), None)
+        if item is not None:
+            self._bytes -= item[2]
+            self._update_gauges()
+
+    def _get(self, key: Hashable) -> Tuple[float, Any, int] | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[0] < time.monotonic():
+            del self._data[key]
+            self._bytes -= item[2]
+            media_cache_evictions_total.labels(reason='expired').inc()
+            self._update_gauges()
+            return None
+        self._data.move_to_end(key)
+        return item
+
+    def _set(self, key: Hashable, value: Any, size: int) -> None:
+        old = self._data.pop(key, None)
+        if old is not None:
+            self._bytes -= old[2]
+        self._data[key] = (time.monotonic() + self.ttl, value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._data:
+            _, (expires, _, evicted) = self._data.popitem(last=False)
+            self._bytes -= evicted
+            reason = 'expired' if expires < time.monotonic() else 'memory'
+            media_cache_evictions_total.labels(reason=reason).inc()
+        self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        media_cache_bytes.set(self._bytes)
+        media_cache_entries.set(len(self._data))
@@ -23,26 +23,255 @@ messages_received_total = Counter(
 messages_forwarded_total = Counter(
     'tscraper_messages_forwarded_total',
     'Total messages successfully forwarded',
-    ['category']
+    ['category', 'target']
 )
 messages_failed_total = Counter(
     'tscraper_messages_failed_total',
     'Total messages that failed to forward',
-    ['category']
+    ['category', 'target']
 )
 albums_forwarded_total = Counter(
     'tscraper_albums_forwarded_total',
     'Total albums successfully forwarded',
     ['category']
 )
+messages_filtered_total = Counter(
+    'tscraper_messages_filtered_total',
+    'Messages dropped by a content filter rule before forwarding',
+    ['category', 'rule']
+)
 
 # Forwarding latency
 forward_duration_seconds = Histogram(
     'tscraper_forward_duration_seconds',
     'Time spent forwarding a message',
+    ['category', 'target'],
     buckets=[0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
 )
 
+# Pipeline stages and end-to-end lag
+stage_duration_seconds = Histogram(
+    'tscraper_stage_duration_seconds',
+    'Time a message spends in one pipeline stage',
+    ['category', 'stage'],
+    buckets=[0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+)
+message_lag_seconds = Histogram(
+    'tscraper_message_lag_seconds',
+    'Time from posting in the source (message.date) to forward completion',
+    ['category'],
+    buckets=[1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0]
+)
+forward_fallbacks_total = Counter(
+    'tscraper_forward_fallbacks_total',
+    'Fallback sends after a failed forward_messages, by method and outcome',
+    ['category', 'method', 'result']
+)
+event_loop_lag_seconds = Gauge(
+    'tscraper_event_loop_lag_seconds',
+    'How late the last event loop lag probe woke up'
+)
+
+# Forwarding queue
+forward_queue_depth = Gauge(
+    'tscraper_forward_queue_depth',
+    'Jobs waiting in the forwarding queue'
+)
+forward_queue_dropped_total = Counter(
+    'tscraper_forward_queue_dropped_total',
+    'Messages dropped because the forwarding queue was full',
+    ['category']
+)
+forward_lane_depth = Gauge(
+    'tscraper_forward_lane_depth',
+    'Jobs waiting in the forwarding queue per priority lane',
+    ['priority']
+)
+forward_queue_wait_seconds = Histogram(
+    'tscraper_forward_queue_wait_seconds',
+    'Time from routing to a worker taking the job, per priority lane',
+    ['priority'],
+    buckets=[0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0]
+)
+forward_lane_overdue_total = Counter(
+    'tscraper_forward_lane_overdue_total',
+    'Jobs served ahead of their turn because they waited longer than their max_lag',
+    ['priority']
+)
+forward_workers_total = Gauge(
+    'tscraper_forward_workers',
+    'Number of forwarding workers running'
+)
+forward_workers_busy = Gauge(
+    'tscraper_forward_workers_busy',
+    'Number of forwarding workers currently processing a job'
+)
+
+# Rate limiting
+flood_waits_total = Counter(
+    'tscraper_flood_waits_total',
+    'FloodWait errors returned by Telegram',
+    ['target']
+)
+target_throttled_seconds_total = Counter(
+    'tscraper_target_throttled_seconds_total',
+    'Seconds a target lane spent paused because of FloodWait',
+    ['target']
+)
+messages_deferred = Gauge(
+    'tscraper_messages_deferred',
+    'Messages currently deferred by the rate scheduler',
+    ['target']
+)
+
+# Deduplication
+dedup_hits_total = Counter(
+    'tscraper_dedup_hits_total',
+    'Messages skipped because they were already forwarded',
+    ['tier']
+)
+dedup_misses_total = Counter(
+    'tscraper_dedup_misses_total',
+    'Dedup lookups for messages not forwarded before'
+)
+
+# Near-duplicate suppression
+near_duplicates_total = Counter(
+    'tscraper_near_duplicates_total',
+    'Messages skipped as near-duplicates of a recent post in the same category',
+    ['category']
+)
+near_dup_index_entries = Gauge(
+    'tscraper_near_dup_index_entries',
+    'Fingerprints held in the near-duplicate index'
+)
+
+# Gap recovery
+catchup_recovered_messages = Histogram(
+    'tscraper_catchup_recovered_messages',
+    'Messages recovered from history after a (re)connect',
+    buckets=[0, 1, 10, 50, 100, 500, 1000, 5000]
+)
+catchup_duration_seconds = Histogram(
+    'tscraper_catchup_duration_seconds',
+    'Time spent catching up on missed messages after a (re)connect',
+    buckets=[0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0]
+)
+
+# Config reloads
+config_reloads_total = Counter(
+    'tscraper_config_reloads_total',
+    'Config reload attempts',
+    ['result']
+)
+
+# Archive sink
+archive_records_written_total = Counter(
+    'tscraper_archive_records_written_total',
+    'Received messages written to the archive'
+)
+archive_records_dropped_total = Counter(
+    'tscraper_archive_records_dropped_total',
+    'Received messages not archived because the archive buffer was full'
+)
+archive_buffer_records = Gauge(
+    'tscraper_archive_buffer_records',
+    'Records waiting in the archive buffer'
+)
+archive_files_total = Counter(
+    'tscraper_archive_files_total',
+    'Archive files completed (rotated or closed)'
+)
+
+# Backfill
+backfill_messages_total = Counter(
+    'tscraper_backfill_messages_total',
+    'History messages read by backfill, by whether they were queued for forwarding',
+    ['result']
+)
+backfill_sources = Gauge(
+    'tscraper_backfill_sources',
+    'Backfill sources by state',
+    ['state']
+)
+backfill_remaining_messages = Gauge(
+    'tscraper_backfill_remaining_messages',
+    'Estimated history messages left to read, from message ids'
+)
+
+# Copy mode
+copy_media_total = Counter(
+    'tscraper_copy_media_total',
+    'Media files re-sent in copy mode, by how the file was obtained',
+    ['result']
+)
+copy_bytes_total = Counter(
+    'tscraper_copy_bytes_total',
+    'Bytes streamed from source to target in copy mode'
+)
+copy_transfers_active = Gauge(
+    'tscraper_copy_transfers_active',
+    'Copy-mode downloads/uploads currently in progress'
+)
+
+# Session storage
+session_flushes_total = Counter(
+    'tscraper_session_flushes_total',
+    'Write-behind session snapshots written to disk'
+)
+session_flush_duration_seconds = Histogram(
+    'tscraper_session_flush_duration_seconds',
+    'Time to write and fsync one session snapshot (off the event loop)',
+    buckets=[0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0]
+)
+
+# Digests
+digest_buffered_messages = Gauge(
+    'tscraper_digest_buffered_messages',
+    'Messages waiting in digest buffers',
+    ['category']
+)
+digest_flushes_total = Counter(
+    'tscraper_digest_flushes_total',
+    'Digests closed for sending, by reason (interval, size, memory, reload)',
+    ['category', 'reason']
+)
+digest_posts_total = Counter(
+    'tscraper_digest_posts_total',
+    'Digest posts sent',
+    ['category']
+)
+digest_messages_total = Counter(
+    'tscraper_digest_messages_total',
+    'Messages delivered as digest lines',
+    ['category']
+)
+
+# Media cache
+media_cache_lookups_total = Counter(
+    'tscraper_media_cache_lookups_total',
+    'Media cache lookups, by kind (sent, reference) and result (hit, miss)',
+    ['kind', 'result']
+)
+media_cache_evictions_total = Counter(
+    'tscraper_media_cache_evictions_total',
+    'Media cache entries dropped, by reason (expired, memory)',
+    ['reason']
+)
+media_cache_bytes = Gauge(
+    'tscraper_media_cache_bytes',
+    'Estimated memory held by the media cache'
+)
+media_cache_entries = Gauge(
+    'tscraper_media_cache_entries',
+    'Entries in the media cache (files sent per target and reusable references)'
+)
+media_repeats_total = Counter(
+    'tscraper_media_repeats_total',
+    'Messages whose media already reached the target, by action (skipped, caption)',
+    ['category', 'action']
+)
+
 # Info
 scraper_info = Info(
     'tscraper',
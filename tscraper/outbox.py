@@ -0,0 +1,162 @@
+import asyncio
+import json
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxEntry(NamedTuple):
+    id: int
+    target: str
+    chat_id: int
+    message_ids: List[int]
+    category: str
+    source: str
+    album: bool
+
+
+class Outbox:
+    """Durable journal of routed messages that are not forwarded yet.
+
+    ``append()`` returns once the entry is fsynced. Concurrent appends are
+    group-committed: entries arriving while a commit is running go into the
+    next transaction together, and a positive ``commit_interval`` makes the
+    committer wait that long to collect even larger groups. ``ack()`` marks
+    an entry done; acks ride along with the next commit. Entries that were
+    never acknowledged are returned by ``pending()`` for replay at startup.
+    Without a ``path`` the outbox is disabled and ``append()`` returns None.
+    """
+
+    def __init__(self, path: str | None = None, commit_interval: float = 0.0):
+        self.path = path
+        self.commit_interval = commit_interval
+        self._rows: List[Tuple[tuple, asyncio.Future]] = []
+        self._acks: List[int] = []
+        self._wakeup = asyncio.Event()
+        self._committer: asyncio.Task | None = None
+        self._db: sqlite3.Connection | None = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='outbox') if path else None
+
+    @property
+    def enabled(self) -> bool:
+        return self._executor is not None
+
+    async def append(self, target: str, chat_id: int, message_ids: List[int],
+                     category: str, source: str, album: bool = False) -> int | None:
+        """Durably record a routed message and return its entry id."""
+        if not self.enabled:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        row = (target, chat_id, json.dumps(message_ids), category, source, int(album))
+        self._rows.append((row, future))
+        self._wake()
+        return await future
+
+    def ack(self, entry_id: int | None) -> None:
+        if entry_id is None or not self.enabled:
+            return
+        self._acks.append(entry_id)
+        self._wake()
+
+    async def pending(self) -> List[OutboxEntry]:
+        if not self.enabled:
+            return []
+        rows = await asyncio.get_running_loop().run_in_executor(self._executor, self._db_pending)
+        return [
+            OutboxEntry(entry_id, target, chat_id, json.loads(ids), category, source, bool(album))
+            for entry_id, target, chat_id, ids, category, source, album in rows
+        ]
+
+    async def run(self) -> None:
+        """Keep the outbox open until cancelled, then commit the last acks and close it.
+
+        The committer itself starts on the first ``append()`` or ``ack()``.
+        """
+        try:
+            await asyncio.get_running_loop().create_future()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        if self._committer:
+            self._committer.cancel()
+            await asyncio.gather(self._committer, return_exceptions=True)
+            self._committer = None
+        if self.enabled:
+            await self._commit()
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._db_close)
+
+    def _wake(self) -> None:
+        self._wakeup.set()
+        if self._committer is None:
+            self._committer = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            if self.commit_interval:
+                await asyncio.sleep(self.commit_interval)
+            self._wakeup.clear()
+            await self._commit()
+
+    async def _commit(self) -> None:
+        rows, self._rows = self._rows, []
+        acks, self._acks = self._acks, []
+        if not rows and not acks:
+            return
+        try:
+            # Shielded: a cancelled committer must not drop a batch already taken
+            ids = await asyncio.shield(asyncio.get_running_loop().run_in_executor(
+                self._executor, self._db_commit, [row for row, _ in rows], acks
+            ))
+        except Exception as e:
+            for _, future in rows:
+                if not future.done():
+                    future.set_exception(e)
+            # Acknowledged entries stay done; the next commit deletes them
+            self._acks[:0] = acks
+            return
+        for (_, future), entry_id in zip(rows, ids):
+            if not future.done():
+                future.set_result(entry_id)
+
+    # The methods below run on the outbox executor thread only
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            # FULL makes every commit an fsync; group commit amortizes it
+            self._db.execute('PRAGMA synchronous=FULL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS outbox ('
+                'id INTEGER PRIMARY KEY, target TEXT NOT NULL, chat_id INTEGER NOT NULL, '
+                'message_ids TEXT NOT NULL, category TEXT NOT NULL, source TEXT NOT NULL, album INTEGER NOT NULL)'
+            )
+        return self._db
+
+    def _db_commit(self, rows: List[tuple], acks: List[int]) -> List[int]:
+        db = self._conn()
+        ids = []
+        with db:
+            for row in rows:
+                ids.append(db.execute(
+                    'INSERT INTO outbox (target, chat_id, message_ids, category, source, album) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', row
+                ).lastrowid)
+            if acks:
+                db.executemany('DELETE FROM outbox WHERE id = ?', [(entry_id,) for entry_id in acks])
+        return ids
+
+    def _db_pending(self) -> List[tuple]:
+        return self._conn().execute(
+            'SELECT id, target, chat_id, message_ids, category, source, album FROM outbox ORDER BY id'
+        ).fetchall()
+
+    def _db_close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,72 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+from .routing import canonical_source
+
+logger = logging.getLogger(__name__)
+
+
+class PeerMap:
+    """Persisted ``@username`` -> numeric channel id map.
+
+    Lets routing work on ``event.chat_id`` alone: configured usernames are
+    resolved once and remembered across restarts. Entries older than ``ttl``
+    are reported by ``stale()`` so they can be refreshed in the background.
+    """
+
+    def __init__(self, path: str | None = None, ttl: float = 7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self._entries: Dict[str, Dict] = {}
+        if path and Path(path).exists():
+            try:
+                self._entries = json.loads(Path(path).read_text())
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable peer map {path}: {e}")
+        self._usernames: Dict[int, str] = {entry['id']: name for name, entry in self._entries.items()}
+
+    def get(self, username: str) -> int | None:
+        entry = self._entries.get(canonical_source(username))
+        return entry['id'] if entry else None
+
+    def username(self, chat_id: int) -> str | None:
+        """The username (without ``@``) a chat id was resolved from, if any."""
+        name = self._usernames.get(chat_id)
+        return name.lstrip('@') if name else None
+
+    def set(self, username: str, chat_id: int) -> None:
+        key = canonical_source(username)
+        self._entries[key] = {'id': chat_id, 'resolved_at': time.time()}
+        self._usernames[chat_id] = key
+
+    def stale(self, usernames) -> list:
+        """Usernames that were never resolved or whose entry has expired."""
+        now = time.time()
+        result = []
+        for username in usernames:
+            entry = self._entries.get(canonical_source(username))
+            if entry is None or now - entry['resolved_at'] > self.ttl:
+                result.append(username)
+        return result
+
+    def items(self) -> Dict[str, int]:
+        return {username: entry['id'] for username, entry in self._entries.items()}
+
+    def save(self) -> None:
+        """Write the map atomically (temp file + rename)."""
+        if not self.path:
+            return
+        directory = Path(self.path).parent
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.peers-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.error(f"Could not save peer map {self.path}: {e}")
+            Path(tmp).unlink(missing_ok=True)
@@ -0,0 +1,86 @@
+import time
+from typing import Dict
+
+from .metrics import flood_waits_total, target_throttled_seconds_total
+
+DEFAULT_ACCOUNT = 'default'
+
+
+class TokenBucket:
+    """Classic token bucket; ``rate`` tokens per second up to ``burst``."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = max(self.updated, now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        if self.rate > 0:
+            self.tokens -= 1
+
+
+class RateScheduler:
+    """Per-target and per-account send pacing with FloodWait pauses.
+
+    ``reserve()`` never sleeps: it either takes a token from both the target's
+    and the account's bucket and returns 0, or returns how long the caller
+    should defer the send. A FloodWait on one target pauses only that lane.
+    """
+
+    def __init__(
+        self,
+        target_rate: float = 1.0,
+        target_burst: float = 10,
+        account_rate: float = 20.0,
+        account_burst: float = 30,
+    ):
+        self.target_rate = target_rate
+        self.target_burst = target_burst
+        self.account_rate = account_rate
+        self.account_burst = account_burst
+        self._targets: Dict[str, TokenBucket] = {}
+        self._accounts: Dict[str, TokenBucket] = {}
+        self._paused_until: Dict[str, float] = {}
+
+    def reserve(self, target: str, account: str = DEFAULT_ACCOUNT) -> float:
+        now = time.monotonic()
+        paused = self._paused_until.get(target, 0.0) - now
+        if paused > 0:
+            return paused
+
+        target_bucket = self._targets.get(target)
+        if target_bucket is None:
+            target_bucket = self._targets[target] = TokenBucket(self.target_rate, self.target_burst)
+        account_bucket = self._accounts.get(account)
+        if account_bucket is None:
+            account_bucket = self._accounts[account] = TokenBucket(self.account_rate, self.account_burst)
+
+        wait = max(target_bucket.delay(now), account_bucket.delay(now))
+        if wait > 0:
+            return wait
+        target_bucket.take()
+        account_bucket.take()
+        return 0.0
+
+    def pause(self, target: str, seconds: float) -> None:
+        """Stop sending to ``target`` for ``seconds`` (Telegram FloodWait)."""
+        now = time.monotonic()
+        current = max(self._paused_until.get(target, 0.0), now)
+        until = max(current, now + seconds)
+        self._paused_until[target] = until
+        flood_waits_total.labels(target=target).inc()
+        target_throttled_seconds_total.labels(target=target).inc(until - current)
+
+    def paused_for(self, target: str) -> float:
+        return max(0.0, self._paused_until.get(target, 0.0) - time.monotonic())
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import os
+import signal
+from typing import Awaitable, Callable, Dict, Tuple
+
+from .metrics import config_reloads_total
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigWatcher:
+    """Reloads the config file when it changes on disk or on SIGHUP.
+
+    The file is polled by (mtime, size, inode), which also catches editors
+    and config mounts that replace the file instead of writing it in place.
+    ``load`` validates and returns the new config, ``on_change`` applies it.
+    A config that fails to load is logged and the running one is kept.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        load: Callable[[str], Dict],
+        on_change: Callable[[Dict], Awaitable[None]],
+        interval: float = 2.0,
+    ):
+        self.path = path
+        self.load = load
+        self.on_change = on_change
+        self.interval = interval
+        self._stamp = self._stat()
+        self._wakeup = asyncio.Event()
+
+    def _stat(self) -> Tuple[int, int, int] | None:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def trigger(self) -> None:
+        """Reload on the next iteration regardless of the file stamp (SIGHUP)."""
+        self._stamp = None
+        self._wakeup.set()
+
+    async def check(self) -> bool:
+        """Reload if the file changed since the last check. Returns True if applied."""
+        stamp = self._stat()
+        if stamp is None or stamp == self._stamp:
+            return False
+        self._stamp = stamp
+        try:
+            config = await asyncio.to_thread(self.load, self.path)
+            await self.on_change(config)
+        except Exception as e:
+            config_reloads_total.labels(result="error").inc()
+            logger.error(f"Config reload failed, keeping the current config: {e}")
+            return False
+        config_reloads_total.labels(result="ok").inc()
+        logger.info(f"Reloaded config from {self.path}")
+        return True
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGHUP, self.trigger)
+        except (AttributeError, NotImplementedError, RuntimeError):
+            # No SIGHUP on Windows or outside the main thread; polling still works
+            pass
+        while True:
+            try:
+                # interval 0 disables polling, SIGHUP still reloads
+                await asyncio.wait_for(self._wakeup.wait(), self.interval or None)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.check()
@@ -0,0 +1,106 @@
+from typing import Dict, Iterable, List, NamedTuple, Tuple, Union
+
+
+class Route(NamedTuple):
+    category: str
+    target: str | None
+
+
+def canonical_source(source: Union[int, str]) -> str:
+    """Normalize a channel reference to the key used by the routing table.
+
+    Numeric ids are kept in the marked ``-100…`` form (bare digits get the
+    prefix added), usernames become a lowercase ``@username``.
+    """
+    value = str(source).strip()
+    if value.lstrip('-').isdigit():
+        return value if value.startswith('-') else f'-100{value}'
+    return '@' + value.lstrip('@').lower()
+
+
+def category_targets(value: Union[str, List[str], None]) -> List[str]:
+    """A ``target_channels`` entry as a list: one target or several for fan-out."""
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [target for target in value if target]
+    return [value]
+
+
+def marked_id(chat_id: Union[int, str]) -> int:
+    """Return the marked ``-100…`` id for a bare or already marked channel id."""
+    return int(canonical_source(chat_id))
+
+
+class RoutingTable:
+    """Source -> (category, target) routes index built once from the channels config.
+
+    A source fans out to every target of every category listing it. When two
+    categories send the same source to the same target, the first one wins.
+    """
+
+    def __init__(self, channels: Dict, aliases: Dict[str, int] | None = None):
+        targets = channels.get('target_channels') or {}
+        self._routes: Dict[str, Tuple[Route, ...]] = {}
+        self._configured: List[str] = []
+        for category, sources in channels.items():
+            if category == 'target_channels':
+                continue
+            routes = [Route(category, target) for target in category_targets(targets.get(category))]
+            routes = routes or [Route(category, None)]
+            for source in sources or []:
+                key = canonical_source(source)
+                existing = self._routes.get(key)
+                if existing is None:
+                    self._routes[key] = tuple(routes)
+                    self._configured.append(key)
+                    continue
+                seen = {route.target for route in existing}
+                self._routes[key] = existing + tuple(route for route in routes if route.target not in seen)
+        for username, chat_id in (aliases or {}).items():
+            self.add_alias(username, chat_id)
+
+    def add_alias(self, username: str, chat_id: int) -> bool:
+        """Make a configured ``@username`` routable by its numeric id as well."""
+        routes = self._routes.get(canonical_source(username))
+        if routes is None:
+            return False
+        self._routes.setdefault(canonical_source(chat_id), routes)
+        return True
+
+    def lookup_all(self, *sources: Union[int, str, None]) -> Tuple[Route, ...]:
+        """Return all routes for the first of ``sources`` present in the table."""
+        for source in sources:
+            if source is None:
+                continue
+            routes = self._routes.get(canonical_source(source))
+            if routes is not None:
+                return routes
+        return ()
+
+    def lookup(self, *sources: Union[int, str, None]) -> Route | None:
+        """Return the primary (first configured) route of a source."""
+        routes = self.lookup_all(*sources)
+        return routes[0] if routes else None
+
+    def targets(self) -> List[str]:
+        """Every distinct target in the table."""
+        targets = dict.fromkeys(route.target for routes in self._routes.values() for route in routes)
+        return [target for target in targets if target]
+
+    def configured_sources(self) -> List[str]:
+        """Canonical keys of the sources listed in the config (without id aliases)."""
+        return list(self._configured)
+
+    @property
+    def sources(self) -> List[str]:
+        return list(self._routes)
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def __contains__(self, source: Union[int, str]) -> bool:
+        return canonical_source(source) in self._routes
+
+    def __iter__(self) -> Iterable[str]:
+        return iter(self._routes)
@@ -0,0 +1,305 @@
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Mapping, Tuple
+
+from telethon import utils
+from telethon.crypto import AuthKey
+from telethon.sessions import MemorySession, SQLiteSession
+from telethon.sessions.memory import _SentFileType
+from telethon.tl import types
+
+from .metrics import session_flush_duration_seconds, session_flushes_total
+
+logger = logging.getLogger(__name__)
+
+SESSION_BACKENDS = ('sqlite', 'write_behind')
+SNAPSHOT_VERSION = 1
+
+# (marked id, access hash, username, phone, display name)
+EntityRow = Tuple[int, int, str | None, str | None, str | None]
+
+
+class WriteBehindSession(MemorySession):
+    """Telethon session kept in memory and written to one JSON file behind the client's back.
+
+    Telethon records entities and update state on every update batch; the
+    SQLite session executes those statements on the event loop and commits
+    them there. Here a change only updates dicts and marks the session
+    dirty. A daemon thread writes a snapshot every ``flush_interval``
+    seconds (Telethon's SQLite session commits once a minute too) when
+    something changed (entities seen again unchanged do not
+    count), and ``close()`` writes the last one synchronously. Snapshots go
+    to a temporary file that is fsynced and renamed over ``path``, so a
+    crash leaves either the old or the new session, never a torn one.
+
+    When ``path`` does not exist yet, ``legacy_path`` (a Telethon SQLite
+    session) is imported, so switching backends keeps the login.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 60.0, legacy_path: str | None = None):
+        super().__init__()
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self._rows: Dict[int, EntityRow] = {}
+        self._by_username: Dict[str, int] = {}
+        self._by_phone: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._version = 0  # bumped on every change
+        self._written = 0  # version of the last snapshot on disk
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+        if self.path.exists():
+            self._load(json.loads(self.path.read_text()))
+        elif legacy_path and os.path.exists(legacy_path):
+            self._import_sqlite(legacy_path)
+
+    # Connection state
+
+    def set_dc(self, dc_id, server_address, port):
+        with self._lock:
+            super().set_dc(dc_id, server_address, port)
+            self._changed()
+
+    @property
+    def auth_key(self):
+        return self._auth_key
+
+    @auth_key.setter
+    def auth_key(self, value):
+        with self._lock:
+            self._auth_key = value
+            self._changed()
+
+    @property
+    def takeout_id(self):
+        return self._takeout_id
+
+    @takeout_id.setter
+    def takeout_id(self, value):
+        with self._lock:
+            self._takeout_id = value
+            self._changed()
+
+    def set_update_state(self, entity_id, state):
+        with self._lock:
+            old = self._update_states.get(entity_id)
+            if old is None or (old.pts, old.qts, old.date, old.seq) != (state.pts, state.qts, state.date, state.seq):
+                self._update_states[entity_id] = state
+                self._changed()
+
+    # Entities, indexed instead of MemorySession's linear scans
+
+    def process_entities(self, tlo):
+        rows = self._entities_to_rows(tlo)
+        if not rows:
+            return
+        with self._lock:
+            for row in rows:
+                old = self._rows.get(row[0])
+                if old == row:
+                    continue
+                if old is not None:
+                    self._unindex(old)
+                self._rows[row[0]] = row
+                if row[2]:
+                    self._by_username[row[2]] = row[0]
+                if row[3]:
+                    self._by_phone[str(row[3])] = row[0]
+                self._changed()
+
+    def _unindex(self, row: EntityRow) -> None:
+        if row[2] and self._by_username.get(row[2]) == row[0]:
+            del self._by_username[row[2]]
+        if row[3] and self._by_phone.get(str(row[3])) == row[0]:
+            del self._by_phone[str(row[3])]
+
+    def get_entity_rows_by_phone(self, phone):
+        entity_id = self._by_phone.get(str(phone))
+        return (entity_id, self._rows[entity_id][1]) if entity_id is not None else None
+
+    def get_entity_rows_by_username(self, username):
+        entity_id = self._by_username.get(username.lower() if username else username)
+        return (entity_id, self._rows[entity_id][1]) if entity_id is not None else None
+
+    def get_entity_rows_by_name(self, name):
+        return next(((row[0], row[1]) for row in self._rows.values() if row[4] == name), None)
+
+    def get_entity_rows_by_id(self, id, exact=True):
+        if exact:
+            row = self._rows.get(id)
+            return (row[0], row[1]) if row else None
+        for peer in (types.PeerUser(id), types.PeerChat(id), types.PeerChannel(id)):
+            row = self._rows.get(utils.get_peer_id(peer))
+            if row:
+                return row[0], row[1]
+        return None
+
+    def cache_file(self, md5_digest, file_size, instance):
+        with self._lock:
+            super().cache_file(md5_digest, file_size, instance)
+            self._changed()
+
+    # Persistence
+
+    def save(self):
+        # Telethon calls this every minute and after logging in; flush soon, off the loop
+        if self._written != self._version:
+            self._wakeup.set()
+
+    def close(self):
+        """Stop the writer thread and write the final snapshot; the session stays usable."""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        self._closed = False
+
+    def delete(self):
+        self.close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def flush(self) -> bool:
+        """Write a snapshot if anything changed since the last one; returns whether it did."""
+        with self._write_lock:
+            return self._flush()
+
+    def _flush(self) -> bool:
+        with self._lock:
+            version = self._version
+            if version == self._written:
+                return False
+            snapshot = self._snapshot()
+        t0 = time.monotonic()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        session_flush_duration_seconds.observe(time.monotonic() - t0)
+        session_flushes_total.inc()
+        with self._lock:
+            self._written = max(self._written, version)
+        return True
+
+    def _changed(self) -> None:
+        # Called with the lock held
+        self._version += 1
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, name='session-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._closed:
+                return
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Session flush failed: {e}")
+
+    def _snapshot(self) -> Dict[str, Any]:
+        return {
+            'version': SNAPSHOT_VERSION,
+            'dc_id': self._dc_id,
+            'server_address': self._server_address,
+            'port': self._port,
+            'auth_key': base64.b64encode(self._auth_key.key).decode() if self._auth_key else None,
+            'takeout_id': self._takeout_id,
+            'entities': list(self._rows.values()),
+            'update_states': [
+                [entity_id, state.pts, state.qts, state.date.timestamp() if state.date else 0, state.seq]
+                for entity_id, state in self._update_states.items()
+            ],
+            'files': [
+                [base64.b64encode(md5).decode(), size, kind.value, file_id, access_hash]
+                for (md5, size, kind), (file_id, access_hash) in self._files.items()
+            ],
+        }
+
+    def _load(self, snapshot: Mapping[str, Any]) -> None:
+        if snapshot.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"{self.path}: unsupported session snapshot version {snapshot.get('version')!r}")
+        self._dc_id = snapshot['dc_id']
+        self._server_address = snapshot['server_address']
+        self._port = snapshot['port']
+        self._auth_key = AuthKey(base64.b64decode(snapshot['auth_key'])) if snapshot['auth_key'] else None
+        self._takeout_id = snapshot['takeout_id']
+        for row in snapshot['entities']:
+            self._add_row(tuple(row))
+        for entity_id, pts, qts, date, seq in snapshot['update_states']:
+            self._update_states[entity_id] = types.updates.State(
+                pts, qts, datetime.fromtimestamp(date, tz=timezone.utc), seq, unread_count=0
+            )
+        for md5, size, kind, file_id, access_hash in snapshot['files']:
+            self._files[(base64.b64decode(md5), size, _SentFileType(kind))] = (file_id, access_hash)
+
+    def _add_row(self, row: EntityRow) -> None:
+        self._rows[row[0]] = row
+        if row[2]:
+            self._by_username[row[2]] = row[0]
+        if row[3]:
+            self._by_phone[str(row[3])] = row[0]
+
+    def _import_sqlite(self, legacy_path: str) -> None:
+        legacy = SQLiteSession(legacy_path)
+        try:
+            self._dc_id = legacy.dc_id
+            self._server_address = legacy.server_address
+            self._port = legacy.port
+            self._auth_key = legacy.auth_key if legacy.auth_key and legacy.auth_key.key else None
+            self._takeout_id = legacy.takeout_id
+            cursor = legacy._cursor()
+            try:
+                for row in cursor.execute('select id, hash, username, phone, name from entities'):
+                    self._add_row(row)
+                for md5, size, kind, file_id, access_hash in cursor.execute(
+                    'select md5_digest, file_size, type, id, hash from sent_files'
+                ):
+                    self._files[(md5, size, _SentFileType(kind))] = (file_id, access_hash)
+            finally:
+                cursor.close()
+            self._update_states.update(legacy.get_update_states())
+        finally:
+            legacy.close()
+        logger.info(f"Imported session {legacy_path} into {self.path}")
+        with self._lock:
+            self._changed()
+
+
+def open_session(name: str, settings: Mapping[str, Any] | None = None) -> str | WriteBehindSession:
+    """The session to pass to TelegramClient for ``settings.session_backend``.
+
+    ``sqlite`` keeps Telethon's default (``<name>.session``); ``write_behind``
+    returns a WriteBehindSession stored as ``<session_dir>/<name>.session.json``
+    that imports ``<name>.session`` on first use.
+    """
+    settings = settings or {}
+    backend = settings.get('session_backend', 'sqlite')
+    if backend not in SESSION_BACKENDS:
+        raise ValueError(f"session_backend must be one of {', '.join(SESSION_BACKENDS)}")
+    if backend == 'sqlite':
+        return name
+    base = name[:-len('.session')] if name.endswith('.session') else name
+    directory = Path(settings.get('session_dir', 'data/sessions'))
+    return WriteBehindSession(
+        str(directory / f"{Path(base).name}.session.json"),
+        flush_interval=float(settings.get('session_flush_interval', 60)),
+        legacy_path=f"{base}.session",
+    )
@@ -0,0 +1,222 @@
+import asyncio
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Set, Union
+
+from prometheus_client import CollectorRegistry
+from prometheus_client.metrics_core import Metric
+from prometheus_client.parser import text_string_to_metric_families
+
+from .health import serve_health, set_metrics_registry, set_shard_status
+from .logs import setup_logging
+from .routing import canonical_source
+
+logger = logging.getLogger(__name__)
+
+
+def assign_shard(source: Union[int, str], shards: int) -> int:
+    """Stable shard index for a source (rendezvous hashing on the canonical key).
+
+    Adding or removing a shard only moves the sources owned by that shard.
+    """
+    key = canonical_source(source)
+    return max(
+        range(shards),
+        key=lambda index: hashlib.blake2b(f'{index}:{key}'.encode(), digest_size=8).digest(),
+    )
+
+
+def partition_channels(channels: Dict, shards: int) -> List[Dict]:
+    """Split the channels config into one config per shard; targets are shared."""
+    parts = [{} for _ in range(shards)]
+    for category, sources in channels.items():
+        if category == 'target_channels':
+            continue
+        for part in parts:
+            part[category] = []
+        for source in sources or []:
+            parts[assign_shard(source, shards)][category].append(source)
+    for part in parts:
+        part['target_channels'] = channels.get('target_channels', {})
+    return parts
+
+
+def shard_path(path: str | None, index: int) -> str | None:
+    """``data/dedup.sqlite3`` -> ``data/dedup.shard1.sqlite3``."""
+    if not path:
+        return path
+    p = Path(path)
+    return str(p.with_name(f'{p.stem}.shard{index}{p.suffix}'))
+
+
+def shard_config(config: Dict, index: int, channels: Dict) -> Dict:
+    settings = dict(config.get('settings') or {})
+    for key, value in settings.items():
+        if key.endswith('_path'):
+            settings[key] = shard_path(value, index)
+    return {
+        'channels': channels, 'settings': settings,
+        'filters': config.get('filters'), 'priorities': config.get('priorities'),
+        'digests': config.get('digests'),
+    }
+
+
+class ShardMetricsCollector:
+    """Re-exposes the metrics reported by every shard with a ``shard`` label."""
+
+    def __init__(self):
+        self.texts: Dict[str, str] = {}
+
+    def collect(self):
+        families: Dict[str, Metric] = {}
+        for shard, text in sorted(self.texts.items()):
+            for family in text_string_to_metric_families(text):
+                merged = families.get(family.name)
+                if merged is None:
+                    merged = families[family.name] = Metric(
+                        family.name, family.documentation, family.type, family.unit
+                    )
+                for sample in family.samples:
+                    merged.add_sample(
+                        sample.name, {**sample.labels, 'shard': shard}, sample.value, sample.timestamp
+                    )
+        return list(families.values())
+
+
+def run_shard(index: int, session: str, api_id: int, api_hash: str, config: Dict, reports, inbox):
+    """Entry point of a shard worker process."""
+    from .tscraper import TelegramScraper, run_shard_services
+
+    setup_logging(config.get('settings'), shard=index)
+    scraper = TelegramScraper(api_id, api_hash, config, session=session)
+    scraper.relay = lambda payload: reports.put(('relay', index, payload))
+    try:
+        asyncio.run(run_shard_services(scraper, index, reports, inbox))
+    except KeyboardInterrupt:
+        pass
+
+
+class Supervisor:
+    """Runs one scraper process per session and aggregates their state.
+
+    Shards report status, forwardable targets and a metrics snapshot over a
+    shared queue. Forwards a shard cannot post itself are relayed to a shard
+    whose account can post to the target. Dead shards are restarted.
+    """
+
+    def __init__(self, api_id: int, api_hash: str, config: Dict, sessions: List[str]):
+        self.api_id = api_id
+        self.api_hash = api_hash
+        self.sessions = sessions
+        self.config = config
+        self.configs = self._shard_configs(config)
+        self._ctx = multiprocessing.get_context('spawn')
+        self.reports = self._ctx.Queue()
+        self.inboxes = [self._ctx.Queue() for _ in sessions]
+        self.processes: List[multiprocessing.Process | None] = [None] * len(sessions)
+        self.postable: Dict[int, Set[str]] = {}
+        self.collector = ShardMetricsCollector()
+        self._round_robin = itertools.count()
+
+    def _shard_configs(self, config: Dict) -> List[Dict]:
+        channels = partition_channels(config['channels'], len(self.sessions))
+        return [shard_config(config, index, part) for index, part in enumerate(channels)]
+
+    async def reload(self, config: Dict) -> None:
+        """Re-partition the new channels and hand each shard its part.
+
+        The number of shards is fixed for the lifetime of the supervisor.
+        """
+        sessions = (config.get('settings') or {}).get('sessions') or []
+        if list(sessions) != list(self.sessions):
+            logger.warning("Changes to sessions are applied on restart only")
+        self.config = {**config, 'settings': self.config.get('settings')}
+        self.configs = self._shard_configs(self.config)
+        for index, inbox in enumerate(self.inboxes):
+            inbox.put({'reload': self.configs[index]})
+
+    def start_shard(self, index: int) -> None:
+        process = self._ctx.Process(
+            target=run_shard,
+            args=(index, self.sessions[index], self.api_id, self.api_hash,
+                  self.configs[index], self.reports, self.inboxes[index]),
+            name=f'tscraper-shard{index}',
+            daemon=True,
+        )
+        process.start()
+        self.processes[index] = process
+        set_shard_status(str(index), connected=False, last_error="Starting")
+        logger.info(f"Started shard {index} ({self.sessions[index]}) as pid {process.pid}")
+
+    def handle_report(self, item) -> None:
+        kind, index, payload = item
+        if kind == 'report':
+            set_shard_status(str(index), connected=payload['connected'], last_error=payload['last_error'])
+            self.collector.texts[str(index)] = payload['metrics']
+            if payload['postable'] is not None:
+                self.postable[index] = set(payload['postable'])
+        elif kind == 'relay':
+            self.relay(index, payload)
+
+    def relay(self, origin: int, payload: Dict) -> None:
+        candidates = [
+            index for index, targets in sorted(self.postable.items())
+            if index != origin and payload['target'] in targets
+        ]
+        if not candidates:
+            logger.error(f"No shard can post to {payload['target']}, dropping message from {payload['source']}")
+            return
+        index = candidates[next(self._round_robin) % len(candidates)]
+        self.inboxes[index].put(payload)
+
+    def _read_reports(self, loop: asyncio.AbstractEventLoop) -> None:
+        while True:
+            item = self.reports.get()
+            loop.call_soon_threadsafe(self.handle_report, item)
+
+    async def _watch(self, interval: float = 5.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            for index, process in enumerate(self.processes):
+                if process is not None and not process.is_alive():
+                    logger.error(f"Shard {index} exited with code {process.exitcode}, restarting")
+                    set_shard_status(str(index), connected=False, last_error=f"Exited with code {process.exitcode}")
+                    self.postable.pop(index, None)
+                    self.start_shard(index)
+
+    async def run(self, health_port: int, config_path: str | None = None) -> None:
+        registry = CollectorRegistry()
+        registry.register(self.collector)
+        set_metrics_registry(registry)
+
+        for index in range(len(self.sessions)):
+            self.start_shard(index)
+        threading.Thread(
+            target=self._read_reports, args=(asyncio.get_running_loop(),), name='shard-reports', daemon=True
+        ).start()
+
+        settings = self.config.get('settings') or {}
+        services = [self._watch(), serve_health(health_port, float(settings.get('metrics_cache_seconds', 1.0)))]
+        if config_path:
+            from .tscraper import config_watcher
+            services.append(config_watcher(config_path, self.reload, settings).run())
+        try:
+            await asyncio.gather(*services)
+        finally:
+            # SIGINT lets each shard cancel its tasks and flush its stores
+            for process in self.processes:
+                if process is not None and process.is_alive():
+                    os.kill(process.pid, signal.SIGINT)
+            deadline = time.monotonic() + 10
+            for process in self.processes:
+                if process is not None:
+                    process.join(max(0.0, deadline - time.monotonic()))
+                    if process.is_alive():
+                        process.terminate()
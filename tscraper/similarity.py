@@ -0,0 +1,145 @@
+import re
+import struct
+import time
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from hashlib import blake2b
+from typing import Dict, Iterable, List
+
+from .metrics import near_dup_index_entries
+
+BITS = 64
+_MASK = (1 << BITS) - 1
+_WORD = re.compile(r'\w+')
+
+
+@lru_cache(maxsize=65536)
+def _feature_hash(feature: str) -> int:
+    # Stable across processes, unlike hash(); words repeat, so most calls hit the cache
+    return int.from_bytes(blake2b(feature.encode(), digest_size=8).digest(), 'little')
+
+
+def simhash(features: Counter) -> int:
+    """64-bit SimHash of weighted features.
+
+    The feature hashes are packed into one buffer and each of the 8 byte
+    columns becomes an int, so a bit position is counted across all features
+    with a single shift/and/``bit_count()`` instead of a Python loop per
+    feature.
+    """
+    hashes = [_feature_hash(feature) for feature in features.elements()]
+    n = len(hashes)
+    if not n:
+        return 0
+    packed = struct.pack(f'<{n}Q', *hashes)
+    ones = int.from_bytes(b'\x01' * n, 'little')
+    half = n / 2
+    result = 0
+    for byte in range(8):
+        column = int.from_bytes(packed[byte::8], 'little')
+        for bit in range(8):
+            if ((column >> bit) & ones).bit_count() > half:
+                result |= 1 << (8 * byte + bit)
+    return result
+
+
+def fingerprint(text: str, media_ids: Iterable[int] = (), min_words: int = 5) -> int | None:
+    """SimHash of a post: the words of its text plus its media file ids.
+
+    Media ids weigh as much as the whole text, so the same text with other
+    media (or the same media with another text) is not a near-duplicate.
+    Returns None for posts too short to compare reliably.
+    """
+    words = _WORD.findall(text.casefold()) if text else []
+    media = [f'media:{media_id}' for media_id in media_ids]
+    if len(words) < min_words and not media:
+        return None
+    features = Counter(words)
+    media_weight = max(1, len(words))
+    for key in media:
+        features[key] += media_weight
+    return simhash(features)
+
+
+def media_ids(message) -> List[int]:
+    """Telegram file ids of the photo or document of a message, if any."""
+    media = getattr(message, 'photo', None) or getattr(message, 'document', None)
+    media_id = getattr(media, 'id', None)
+    return [media_id] if isinstance(media_id, int) else []
+
+
+class NearDuplicateIndex:
+    """Time-windowed SimHash index with LSH buckets, one namespace per category.
+
+    A fingerprint is split into ``bands`` chunks and stored in one bucket per
+    chunk. A lookup probes each chunk's bucket and the buckets one bit flip
+    away from it (multi-probe), and a candidate is a near-duplicate if its
+    Hamming distance is at most ``max_distance``. Differences of up to
+    ``2 * bands - 1`` bits are always found; larger ones with decreasing
+    probability. Entries expire after ``window`` seconds and the oldest are
+    evicted beyond ``maxsize``, so memory is bounded by the entry count.
+    """
+
+    def __init__(self, threshold: float = 0.9, bands: int = 4, window: float = 3600.0, maxsize: int = 100_000):
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        if not 1 <= bands <= BITS:
+            raise ValueError(f"bands must be between 1 and {BITS}")
+        self.max_distance = int((1 - threshold) * BITS + 1e-9)
+        self.bands = bands
+        self.window = window
+        self.maxsize = maxsize
+        width = BITS // bands
+        # (shift, mask, probe flips) per band; the last band takes the remainder
+        self._bands = []
+        for band in range(bands):
+            bits = width if band < bands - 1 else BITS - band * width
+            self._bands.append((band * width, (1 << bits) - 1, (0,) + tuple(1 << i for i in range(bits))))
+        self._namespaces: Dict[str, int] = {}
+        # entry key (namespace << 64 | fingerprint) -> expiry, oldest first
+        self._entries: OrderedDict[int, float] = OrderedDict()
+        self._buckets: Dict[int, List[int]] = {}
+
+    def _bucket_keys(self, key: int) -> List[int]:
+        namespace = key >> BITS
+        return [
+            (((namespace * self.bands + band) << BITS) | ((key >> shift) & mask))
+            for band, (shift, mask, _) in enumerate(self._bands)
+        ]
+
+    def _evict(self, now: float) -> None:
+        entries = self._entries
+        while entries:
+            key, expires = next(iter(entries.items()))
+            if expires > now and len(entries) <= self.maxsize:
+                break
+            entries.popitem(last=False)
+            for bucket_key in self._bucket_keys(key):
+                bucket = self._buckets[bucket_key]
+                bucket.remove(key)
+                if not bucket:
+                    del self._buckets[bucket_key]
+
+    def check(self, namespace: str, fingerprint: int, now: float | None = None) -> bool:
+        """True if a near-duplicate was seen within the window; otherwise remember it."""
+        now = time.monotonic() if now is None else now
+        self._evict(now)
+        ns = self._namespaces.setdefault(namespace, len(self._namespaces))
+        key = (ns << BITS) | fingerprint
+        buckets = self._buckets
+        for band, (shift, mask, flips) in enumerate(self._bands):
+            base = (ns * self.bands + band) << BITS
+            value = (fingerprint >> shift) & mask
+            for flip in flips:
+                for candidate in buckets.get(base | (value ^ flip), ()):
+                    if ((candidate ^ key) & _MASK).bit_count() <= self.max_distance:
+                        return True
+        self._entries[key] = now + self.window
+        for bucket_key in self._bucket_keys(key):
+            self._buckets.setdefault(bucket_key, []).append(key)
+        self._evict(now)
+        near_dup_index_entries.set(len(self._entries))
+        return False
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,18 +1,40 @@
 import os
 import sys
 import asyncio
+import threading
 import time
-import uvicorn
 import yaml
 import logging
-from typing import Dict, List, Union
+from typing import Callable, Dict, List, Sequence, Set, Tuple, Union
 from pathlib import Path
-from telethon import TelegramClient, events
-from telethon.errors import TypeNotFoundError
-from telethon.tl.types import PeerChannel
+from telethon import TelegramClient, events, utils
+from telethon.errors import FloodWaitError, TypeNotFoundError
+from telethon.tl.types import Message
 from datetime import datetime
 from dotenv import load_dotenv
-from .health import app, set_scraper_status
+from prometheus_client import generate_latest
+from .albums import AlbumAssembler
+from .archive import ARCHIVE_FORMATS, ArchiveSink
+from .batching import MAX_FORWARD_IDS, MessageBatcher
+from .cache import TTLCache
+from .checkpoints import CheckpointStore
+from .copier import COPY_MODES, MediaCopier
+from .dedup import DedupStore
+from .digest import Digest, DigestBuffer, DigestError, DigestPolicy, parse_digests
+from .filters import ContentFilter, FilterError, media_types
+from .lanes import LanePolicy, PriorityError, parse_priorities
+from .media import REPEAT_MEDIA_ACTIONS, MediaCache, media_fingerprint
+from .outbox import Outbox, OutboxEntry
+from .peers import PeerMap
+from .reload import ConfigWatcher
+from .health import scraper_status, serve_health, set_scraper_status
+from .logs import log_message, setup_logging
+from .ratelimit import RateScheduler
+from .similarity import NearDuplicateIndex, fingerprint, media_ids
+from .routing import Route, RoutingTable, canonical_source
+from .session import SESSION_BACKENDS, open_session
+from .shards import Supervisor
+from .workers import QUEUE_POLICIES, ForwardJob, ForwardQueue
 from .metrics import (
     scraper_connected,
     scraper_uptime_seconds,
@@ -21,21 +43,39 @@ from .metrics import (
     messages_forwarded_total,
     messages_failed_total,
     albums_forwarded_total,
+    catchup_duration_seconds,
+    catchup_recovered_messages,
+    digest_messages_total,
+    digest_posts_total,
+    event_loop_lag_seconds,
     forward_duration_seconds,
+    forward_fallbacks_total,
+    media_repeats_total,
+    message_lag_seconds,
+    near_duplicates_total,
     scraper_info,
+    stage_duration_seconds,
 )
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 class ConfigError(Exception):
     pass
 
-def load_yaml_config() -> Dict:
-    config_path = os.getenv("CONFIG_PATH", "config.yaml")
+def observe_stage(category: str, stage: str, started: float) -> None:
+    """Record the time since ``started`` (time.monotonic()) for a pipeline stage."""
+    stage_duration_seconds.labels(category=category, stage=stage).observe(time.monotonic() - started)
+
+def observe_lag(category: str, messages: Union[Message, List[Message]]) -> None:
+    """Record the end-to-end lag from posting to forwarding for each message."""
+    now = time.time()
+    for message in messages if isinstance(messages, list) else [messages]:
+        date = getattr(message, 'date', None)
+        if isinstance(date, datetime):
+            message_lag_seconds.labels(category=category).observe(max(now - date.timestamp(), 0.0))
+
+def load_yaml_config(config_path: str | None = None) -> Dict:
+    config_path = config_path or os.getenv("CONFIG_PATH", "config.yaml")
     if not Path(config_path).exists():
         raise ConfigError(f"Config file not found: {config_path}")
 
@@ -50,18 +90,60 @@ def load_yaml_config() -> Dict:
                     raise ConfigError("Invalid config structure")
                 if not config['channels'].get('target_channels'):
                     raise ConfigError("Missing target_channels in config")
+                if not isinstance(config.get('settings') or {}, dict):
+                    raise ConfigError("Invalid settings section")
+                compile_filters(config)
+                compile_priorities(config)
+                compile_digests(config)
                 return config
             # If config starts with categories directly, wrap it in channels
             if not config.get('target_channels'):
                 raise ConfigError("Missing target_channels in config")
-            return {'channels': config}
+            settings = config.pop('settings', None)
+            if not isinstance(settings or {}, dict):
+                raise ConfigError("Invalid settings section")
+            filters = config.pop('filters', None)
+            priorities = config.pop('priorities', None)
+            digests = config.pop('digests', None)
+            wrapped = {'channels': config}
+            if settings is not None:
+                wrapped['settings'] = settings
+            if filters is not None:
+                wrapped['filters'] = filters
+            if priorities is not None:
+                wrapped['priorities'] = priorities
+            if digests is not None:
+                wrapped['digests'] = digests
+            compile_filters(wrapped)
+            compile_priorities(wrapped)
+            compile_digests(wrapped)
+            return wrapped
         except yaml.YAMLError as e:
             raise ConfigError(f"Invalid YAML configuration: {e}")
 
+def compile_filters(config: Dict) -> ContentFilter:
+    try:
+        return ContentFilter(config.get('filters'))
+    except FilterError as e:
+        raise ConfigError(str(e))
+
+def compile_priorities(config: Dict) -> Dict[str, LanePolicy]:
+    try:
+        return parse_priorities(config.get('priorities'))
+    except PriorityError as e:
+        raise ConfigError(str(e))
+
+def compile_digests(config: Dict) -> Dict[str, DigestPolicy]:
+    try:
+        return parse_digests(config.get('digests'))
+    except DigestError as e:
+        raise ConfigError(str(e))
+
 class TelegramScraper:
-    def __init__(self, api_id: int, api_hash: str, config: Dict):
+    def __init__(self, api_id: int, api_hash: str, config: Dict, session: str = 'my_user_session'):
         self.api_id = api_id
         self.api_hash = api_hash
+        self.session_name = session
 
         if 'channels' not in config:
             raise ConfigError("Invalid config structure: missing 'channels' key")
@@ -71,8 +153,119 @@ class TelegramScraper:
             raise ConfigError("Invalid config structure: missing 'target_channels' in channels")
 
         self.target_channels = self.config['target_channels']
+        self.settings = config.get('settings') or {}
+        self.peer_map = PeerMap(self.settings.get('peer_map_path'))
+        self.routes = RoutingTable(self.config, aliases=self.peer_map.items())
+        self.filters = compile_filters(config)
+        self.albums = AlbumAssembler(
+            self._forward_album,
+            quiet_window=float(self.settings.get('album_quiet_window', 0.5)),
+            max_size=int(self.settings.get('album_max_size', 10)),
+            max_groups=int(self.settings.get('album_max_groups', 1000)),
+        )
+        queue_policy = self.settings.get('queue_full_policy', 'block')
+        if queue_policy not in QUEUE_POLICIES:
+            raise ConfigError(f"Invalid queue_full_policy: {queue_policy}")
+        self.queue = ForwardQueue(
+            self._process_job,
+            maxsize=int(self.settings.get('forward_queue_size', 1000)),
+            workers=int(self.settings.get('forward_workers', 4)),
+            per_target=int(self.settings.get('per_target_concurrency', 2)),
+            policy=queue_policy,
+            scheduler=RateScheduler(
+                target_rate=float(self.settings.get('target_rate', 1.0)),
+                target_burst=float(self.settings.get('target_burst', 10)),
+                account_rate=float(self.settings.get('account_rate', 20.0)),
+                account_burst=float(self.settings.get('account_burst', 30)),
+            ),
+            max_flood_retries=int(self.settings.get('max_flood_retries', 5)),
+            priorities=compile_priorities(config),
+            on_evict=self._evicted,
+            on_failed=self._given_up,
+        )
+        batch_window_ms = float(self.settings.get('batch_window_ms', 0))
+        self.batcher = MessageBatcher(
+            self._forward_batch,
+            window=batch_window_ms / 1000,
+            max_size=int(self.settings.get('batch_max_size', MAX_FORWARD_IDS)),
+        ) if batch_window_ms > 0 else None
+        self.outbox = Outbox(
+            self.settings.get('outbox_path'),
+            commit_interval=float(self.settings.get('outbox_commit_interval_ms', 0)) / 1000,
+        )
+        self.outbox_replayed = False
+        # Unfinished entries of the previous run, read before connecting
+        self.outbox_backlog: List[OutboxEntry] | None = None
+        self.checkpoints = CheckpointStore(self.settings.get('checkpoint_path'))
+        snippet_chars = int(self.settings.get('digest_snippet_chars', 200))
+        if not 0 < snippet_chars <= 1000:
+            raise ConfigError("digest_snippet_chars must be between 1 and 1000")
+        self.digests = DigestBuffer(
+            self._enqueue_digest,
+            compile_digests(config),
+            path=self.settings.get('digest_path'),
+            max_entries=int(self.settings.get('digest_max_entries', 10_000)),
+            snippet_chars=snippet_chars,
+        )
+        self.dedup = DedupStore(
+            path=self.settings.get('dedup_path'),
+            capacity=int(self.settings.get('dedup_cache_size', 100_000)),
+            ttl=float(self.settings.get('dedup_ttl_hours', 168)) * 3600,
+        )
+        near_dup_threshold = float(self.settings.get('near_dup_threshold', 0))
+        self.near_dups = NearDuplicateIndex(
+            threshold=near_dup_threshold,
+            bands=int(self.settings.get('near_dup_bands', 4)),
+            window=float(self.settings.get('near_dup_window_minutes', 60)) * 60,
+            maxsize=int(self.settings.get('near_dup_max_entries', 100_000)),
+        ) if near_dup_threshold > 0 else None
+        self.near_dup_min_words = int(self.settings.get('near_dup_min_words', 5))
+        archive_format = self.settings.get('archive_format', 'parquet')
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ConfigError(f"Invalid archive_format: {archive_format}")
+        self.archive = ArchiveSink(
+            self.settings['archive_path'],
+            format=archive_format,
+            buffer_size=int(self.settings.get('archive_buffer_size', 100_000)),
+            batch_size=int(self.settings.get('archive_batch_size', 10_000)),
+            flush_interval=float(self.settings.get('archive_flush_interval', 5.0)),
+            rotate_bytes=int(float(self.settings.get('archive_rotate_mb', 64)) * 2**20),
+            rotate_seconds=float(self.settings.get('archive_rotate_minutes', 60)) * 60,
+        ) if self.settings.get('archive_path') else None
+        self.repeat_media = self.settings.get('repeat_media', 'forward')
+        if self.repeat_media not in REPEAT_MEDIA_ACTIONS:
+            raise ConfigError(f"Invalid repeat_media: {self.repeat_media}")
+        media_cache_bytes = int(float(self.settings.get('media_cache_mb', 16)) * 2**20)
+        self.media_cache = MediaCache(
+            max_bytes=media_cache_bytes,
+            ttl=float(self.settings.get('media_cache_ttl_hours', 24)) * 3600,
+        ) if media_cache_bytes > 0 else None
+        if self.media_cache is None and self.repeat_media != 'forward':
+            raise ConfigError("repeat_media needs the media cache (media_cache_mb > 0)")
+        self.copy_mode = self.settings.get('copy_mode', 'fallback')
+        if self.copy_mode not in COPY_MODES:
+            raise ConfigError(f"Invalid copy_mode: {self.copy_mode}")
+        self.copier = MediaCopier(
+            concurrency=int(self.settings.get('copy_concurrency', 2)),
+            buffer_parts=int(self.settings.get('copy_buffer_parts', 4)),
+            cache_size=int(self.settings.get('copy_cache_size', 10_000)),
+            cache_ttl=float(self.settings.get('copy_cache_ttl_hours', 24)) * 3600,
+            references=self.media_cache,
+        ) if self.copy_mode != 'off' else None
+        if self.settings.get('session_backend', 'sqlite') not in SESSION_BACKENDS:
+            raise ConfigError(f"Invalid session_backend: {self.settings.get('session_backend')}")
         self.client = None
-        self.channel_cache = {}
+        # NewMessage builder whose chat filter is swapped on config reload
+        self.new_message: events.NewMessage | None = None
+        # Sharded mode: targets this account may post to, and how to hand off the rest
+        self.postable: set | None = None
+        self.relay: Callable[[Dict], None] | None = None
+        self.channel_cache = TTLCache(
+            maxsize=int(self.settings.get('channel_cache_size', 10_000)),
+            ttl=float(self.settings.get('channel_cache_ttl', 3600)),
+        )
+        # Background resolution of configured usernames, started on connect
+        self.resolver: asyncio.Task | None = None
         self.connection_start_time = None
         self.reconnect_delay = 1
         self.max_reconnect_delay = 30
@@ -85,176 +278,812 @@ class TelegramScraper:
             return int(f'-100{channel_str}')
         return channel_str
 
-    async def _resolve_channels(self) -> List[str]:
-        """Get list of all source channels."""
+    async def _resolve_channels(self) -> List[Union[int, str]]:
+        """Get list of all source channels, as numeric ids where already known."""
         sources = []
         for category in self.config:
             if category != 'target_channels':
                 sources.extend(self.config[category])
         logger.info(f"Monitoring channels: {sources}")
-        return sources
+        return [self.peer_map.get(source) or source for source in sources]
 
     def _get_category_for_source(self, source: str) -> str | None:
         """Get category name for a source channel."""
-        if isinstance(source, int):
-            source = str(source)
-        if not source.startswith('@'):
-            source = f"@{source}"
+        route = self.routes.lookup(source)
+        return route.category if route else None
 
-        for category, channels in self.config.items():
-            if category != 'target_channels':
-                if source in channels:
-                    return category
-        return None
+    def _remember_chat(self, chat_id: int, entity) -> Dict:
+        info = {
+            'id': chat_id,
+            'title': getattr(entity, 'title', None),
+            'username': getattr(entity, 'username', None),
+        }
+        self.channel_cache[chat_id] = info
+        return info
 
-    async def _get_channel_info(self, channel_id: Union[int, str]) -> Dict:
-        """Get channel title and username if available."""
-        if channel_id in self.channel_cache:
-            return self.channel_cache[channel_id]
+    def _source_name(self, chat_id: int) -> str:
+        """Human readable source for logs and relays, without any I/O."""
+        info = self.channel_cache.get(chat_id)
+        if info and info['username']:
+            return info['username']
+        # Cache entries expire, but a username resolved once stays in the peer map
+        return self.peer_map.username(chat_id) or str(chat_id)
 
-        try:
-            if isinstance(channel_id, int):
-                entity = await self.client.get_entity(PeerChannel(channel_id))
-            else:
-                entity = await self.client.get_entity(channel_id)
-
-            info = {
-                'id': entity.id,
-                'title': entity.title,
-                'username': entity.username if hasattr(entity, 'username') else None
-            }
-            self.channel_cache[channel_id] = info
-            return info
-        except Exception as e:
-            logger.error(f"Error getting channel info for {channel_id}: {e}")
-            return None
+    async def _resolve_usernames(self, routes: RoutingTable | None = None):
+        """Resolve configured @usernames to ids so routing never needs get_chat()."""
+        if routes is None:
+            routes = self.routes
+        usernames = [
+            source for source in routes.configured_sources()
+            if canonical_source(source).startswith('@')
+        ]
+        pending = self.peer_map.stale(usernames)
+        if not pending:
+            return
+        semaphore = asyncio.Semaphore(int(self.settings.get('resolve_concurrency', 8)))
 
-    def _get_target_for_source(self, source: str) -> str:
-        """Get target channel for source."""
-        logger.info(f"Finding target for source: {source}")
+        async def resolve(username: str):
+            async with semaphore:
+                try:
+                    entity = await self.client.get_entity(username)
+                except Exception as e:
+                    logger.warning(f"Could not resolve {username}: {e}")
+                    return
+                chat_id = utils.get_peer_id(entity)
+                self._remember_chat(chat_id, entity)
+                self.peer_map.set(username, chat_id)
+                routes.add_alias(username, chat_id)
 
-        # Нормализуем source
-        if isinstance(source, int):
-            source = str(source)
-        if not source.startswith('@'):
-            source = f"@{source}"
+        await asyncio.gather(*(resolve(username) for username in pending))
+        await asyncio.to_thread(self.peer_map.save)
+        logger.info(f"Resolved {len(pending)} channel usernames to ids")
 
-        # Ищем в каждой категории
-        for category, channels in self.config.items():
-            if category != 'target_channels':
-                if source in channels:
-                    target = self.target_channels.get(category)
-                    logger.info(f"Found target {target} in category {category}")
-                    return target
+    def _resolver_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Resolving channel usernames failed: {task.exception()}")
 
-        logger.warning(f"No target found for {source}")
-        return None
+    async def _route_unknown_chat(self, event):
+        """Slow path for a chat id that is not routable yet: learn its username once."""
+        chat_id = event.chat_id
+        if chat_id in self.channel_cache:
+            # Seen before and not a configured source
+            return ()
+        chat = await event.get_chat()
+        if not chat:
+            return ()
+        info = self._remember_chat(chat_id, chat)
+        if info['username'] and self.routes.add_alias(info['username'], chat_id):
+            self.peer_map.set(info['username'], chat_id)
+            await asyncio.to_thread(self.peer_map.save)
+        return self.routes.lookup_all(chat_id)
+
+    def _get_target_for_source(self, source: str) -> str:
+        """Get target channel for source."""
+        route = self.routes.lookup(source)
+        if not route or not route.target:
+            logger.warning(f"No target found for {source}")
+            return None
+        return route.target
 
     async def _handle_message(self, event):
-        source = "<unknown>"
-        category = "unknown"
         try:
-            logger.info(f"Received message event")
             if not event.message:
                 logger.warning("Event without message, skipping")
                 return
 
-            # Получаем информацию о канале
-            chat = await event.get_chat()
-            if not chat:
-                logger.warning("Could not get chat info")
-                return
+            # Маршрутизация по event.chat_id — без сетевых запросов
+            chat_id = event.chat_id
+            t0 = time.monotonic()
+            routes = self.routes.lookup_all(chat_id)
+            stage = 'route'
+            if not routes:
+                routes = await self._route_unknown_chat(event)
+                stage = 'resolve'
+            observe_stage(routes[0].category if routes else 'unknown', stage, t0)
+
+        except TypeNotFoundError:
+            messages_failed_total.labels(category="unknown", target="unknown").inc()
+            logger.warning("TypeNotFoundError when handling message")
+            return
+        except Exception as e:
+            messages_failed_total.labels(category="unknown", target="unknown").inc()
+            logger.error(f"Error processing message: {e}", exc_info=True)
+            return
+
+        await self._process_message(event.message, chat_id, routes)
+
+    async def _process_message(self, message: Message, chat_id: int, routes: Sequence[Route]) -> bool:
+        """Hand one routed message to the forwarding pipeline, once per target.
+
+        Shared by live events and catch-up. Returns True if the message was
+        accepted for forwarding to at least one target.
+        """
+        source = "<unknown>"
+        category = "unknown"
+        try:
+            source = self._source_name(chat_id)
+            categories = list(dict.fromkeys(route.category for route in routes)) or ["unknown"]
+            category = categories[0]
+            for name in categories:
+                messages_received_total.labels(category=name).inc()
+
+            t0 = time.monotonic()
+            seen = await self.dedup.seen(chat_id, message.id, message.grouped_id)
+            observe_stage(category, 'dedup', t0)
+            if seen:
+                log_message(logger, 'already forwarded, skipping', chat_id=chat_id, message_id=message.id,
+                            category=category, stage='dedup')
+                return False
 
-            source = chat.username if chat.username else str(chat.id)
-            category = self._get_category_for_source(source) or "unknown"
-            messages_received_total.labels(category=category).inc()
+            # After dedup, so a redelivered or caught-up message is archived once
+            if self.archive is not None:
+                self.archive.add(chat_id, message, ','.join(categories), media_types(message)[0])
 
-            target = self._get_target_for_source(source)
+            targets = [route for route in routes if route.target]
 
-            if not target:
+            if not targets:
                 logger.warning(f"No target found for {source}")
+                return False
+
+            if not message.grouped_id and self.filters:
+                # Фильтры до любых сетевых вызовов; альбомы проверяются целиком при сборке
+                t0 = time.monotonic()
+                targets = self._filter_routes(targets, [message])
+                observe_stage(category, 'filter', t0)
+                if not targets:
+                    log_message(logger, 'dropped by filters', chat_id=chat_id, message_id=message.id,
+                                category=category, stage='filter')
+                    # Dropped on purpose: catch-up does not need to read it again
+                    self.checkpoints.update(chat_id, message.id)
+                    return False
+
+            # Held until the jobs, the album or the batches take over: a redelivery meanwhile is a dup
+            self._hold(chat_id, message.id)
+            handed_off = failed = False
+            try:
+                if not message.grouped_id and self.near_dups is not None:
+                    t0 = time.monotonic()
+                    targets = self._drop_near_duplicates(targets, [message])
+                    observe_stage(category, 'near_dup', t0)
+                    if not targets:
+                        log_message(logger, 'near-duplicate, skipping', chat_id=chat_id, message_id=message.id,
+                                    category=category, stage='near_dup')
+                        self.checkpoints.update(chat_id, message.id)
+                        return False
+
+                if not message.grouped_id and self.digests.policies:
+                    targets = await self._add_to_digests(targets, [message], chat_id, source)
+                    if not targets:
+                        return True
+
+                if message.grouped_id:
+                    # Части альбома собираются из самих событий и пересылаются одним вызовом
+                    self.albums.add(chat_id, message, (targets, source, chat_id, time.monotonic()))
+                    handed_off = True
+                    return True
+
+                if self.batcher is not None:
+                    for route in targets:
+                        # One hold per batch the message joins, released by its flush
+                        self._hold(chat_id, message.id)
+                        self.batcher.add(
+                            (chat_id, route.target), message,
+                            (route.target, route.category, source, chat_id, time.monotonic()),
+                        )
+                    return True
+
+                # Каждая цель — отдельная задача: сбой одной не мешает остальным
+                accepted = await asyncio.gather(*(
+                    self._enqueue(ForwardJob(route.target, message, route.category, source, chat_id=chat_id))
+                    for route in targets
+                ))
+                return any(accepted)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                if not handed_off:
+                    self._unhold(chat_id, message.id, failed)
+
+        except TypeNotFoundError:
+            messages_failed_total.labels(category=category, target="unknown").inc()
+            logger.warning(f"TypeNotFoundError when handling message from {source}")
+        except Exception as e:
+            messages_failed_total.labels(category=category, target="unknown").inc()
+            logger.error(f"Error processing message: {e}", exc_info=True)
+        return False
+
+    def _filter_routes(self, routes: Sequence[Route], messages: List[Message]) -> List[Route]:
+        """Routes whose category filter lets the message (or album) through."""
+        filters = self.filters
+        if not filters:
+            return list(routes)
+        text = next((m.message for m in messages if m.message), '')
+        media = tuple(dict.fromkeys(kind for m in messages for kind in media_types(m)))
+        verdicts: Dict[str, str | None] = {}
+        allowed = []
+        for route in routes:
+            if route.category not in verdicts:
+                verdicts[route.category] = filters.check(route.category, text, media)
+            if verdicts[route.category] is None:
+                allowed.append(route)
+        return allowed
+
+    def _drop_near_duplicates(self, routes: Sequence[Route], messages: List[Message]) -> List[Route]:
+        """Routes whose category has not seen a near-identical post within the window."""
+        index = self.near_dups
+        if index is None:
+            return list(routes)
+        text = next((m.message for m in messages if m.message), '')
+        fp = fingerprint(text, [media_id for m in messages for media_id in media_ids(m)], self.near_dup_min_words)
+        if fp is None:
+            return list(routes)
+        duplicate: Dict[str, bool] = {}
+        allowed = []
+        for route in routes:
+            if route.category not in duplicate:
+                duplicate[route.category] = index.check(route.category, fp)
+                if duplicate[route.category]:
+                    near_duplicates_total.labels(category=route.category).inc()
+            if not duplicate[route.category]:
+                allowed.append(route)
+        return allowed
+
+    async def _add_to_digests(self, routes: Sequence[Route], messages: List[Message], chat_id: int,
+                              source: str) -> List[Route]:
+        """Buffer the message (or album) for routes of digest categories; returns the other routes."""
+        remaining = []
+        first = messages[0]
+        text = next((m.message for m in messages if m.message), '')
+        kind = 'album' if len(messages) > 1 else media_types(first)[0]
+        for route in routes:
+            if self.digests.policy(route.category) is None:
+                remaining.append(route)
+                continue
+            if await self.digests.add(route.target, route.category, chat_id, first.id, source, text, kind,
+                                      grouped_id=first.grouped_id):
+                log_message(logger, 'added to digest', chat_id=chat_id, message_id=first.id,
+                            category=route.category, target=route.target, stage='digest')
+        return remaining
+
+    async def _forward_album(self, messages: List[Message], context: Tuple[List[Route], str, int, float]):
+        """Flush callback of the album assembler: one job per target."""
+        routes, source, chat_id, first_part_at = context
+        failed = False
+        try:
+            await self._route_album(messages, routes, source, chat_id, first_part_at)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            for message in messages:
+                self._unhold(chat_id, message.id, failed)
+
+    async def _route_album(self, messages: List[Message], routes: List[Route], source: str, chat_id: int,
+                           first_part_at: float):
+        for category in dict.fromkeys(route.category for route in routes):
+            observe_stage(category, 'album', first_part_at)
+        routes = self._filter_routes(routes, messages)
+        if not routes:
+            log_message(logger, 'album dropped by filters', chat_id=chat_id, message_id=messages[0].id,
+                        stage='filter')
+            self.checkpoints.update(chat_id, messages[-1].id)
+            return
+        routes = self._drop_near_duplicates(routes, messages)
+        if not routes:
+            log_message(logger, 'album is a near-duplicate, skipping', chat_id=chat_id, message_id=messages[0].id,
+                        stage='near_dup')
+            self.checkpoints.update(chat_id, messages[-1].id)
+            return
+        if self.digests.policies:
+            routes = await self._add_to_digests(routes, messages, chat_id, source)
+            if not routes:
                 return
+        await asyncio.gather(*(
+            self._enqueue(ForwardJob(route.target, messages, route.category, source, album=True, chat_id=chat_id))
+            for route in routes
+        ))
 
-            t0 = time.monotonic()
+    async def _forward_batch(self, messages: List[Message], context: Tuple[str, str, str, int, float]):
+        """Flush callback of the micro-batcher."""
+        target, category, source, chat_id, opened_at = context
+        observe_stage(category, 'batch', opened_at)
+        job_messages = messages if len(messages) > 1 else messages[0]
+        failed = False
+        try:
+            await self._enqueue(ForwardJob(target, job_messages, category, source, chat_id=chat_id))
+        except Exception:
+            failed = True
+            raise
+        finally:
+            for message in messages:
+                self._unhold(chat_id, message.id, failed)
+
+    async def _enqueue(self, job: ForwardJob) -> bool:
+        """Journal a routed job in the outbox, then hand it to the workers.
+
+        The job holds its messages in the dedup and checkpoint stores until it is done.
+        """
+        messages = job.messages if isinstance(job.messages, list) else [job.messages]
+        if self.relay is not None and self.postable is not None and job.target not in self.postable:
+            # Sharded mode: another account posts to this target
+            self.relay({
+                'target': job.target,
+                'chat_id': job.chat_id,
+                'message_ids': [message.id for message in messages],
+                'category': job.category,
+                'source': job.source,
+                'album': job.album,
+            })
+            # Handed over for good: the receiving shard does not read this chat, so its
+            # progress is recorded here
+            for message in messages:
+                self.dedup.add(job.chat_id, message.id, message.grouped_id)
+            self.checkpoints.update(job.chat_id, max(message.id for message in messages))
+            return True
+        self._reserve(job)
+        try:
+            job.outbox_id = await self.outbox.append(
+                job.target, job.chat_id, [message.id for message in messages], job.category, job.source, job.album
+            )
+            accepted = await self.queue.put(job)
+        except BaseException:
+            self._release(job, failed=True)
+            raise
+        if not accepted:
+            self.outbox.ack(job.outbox_id)
+            self._release(job, failed=True)
+            return False
+        return True
+
+    def _hold(self, chat_id: int, message_id: int):
+        """Mark a message in flight: a redelivery is a duplicate and the checkpoint stays below it."""
+        self.dedup.reserve(chat_id, message_id)
+        self.checkpoints.hold(chat_id, message_id)
+
+    def _unhold(self, chat_id: int, message_id: int, failed: bool = False):
+        """Drop a hold of ``_hold()``; a failed message keeps the checkpoint below it."""
+        self.dedup.release(chat_id, message_id)
+        self.checkpoints.release(chat_id, message_id, failed)
+
+    def _reserve(self, job: ForwardJob):
+        if job.chat_id is not None and not isinstance(job.messages, Digest):
+            for message in job.messages if isinstance(job.messages, list) else [job.messages]:
+                self._hold(job.chat_id, message.id)
+
+    def _release(self, job: ForwardJob, failed: bool = False):
+        """Drop a job's holds."""
+        if job.chat_id is not None and not isinstance(job.messages, Digest):
+            for message in job.messages if isinstance(job.messages, list) else [job.messages]:
+                self._unhold(job.chat_id, message.id, failed)
+
+    def _evicted(self, job: ForwardJob):
+        """A queued job was dropped for a higher-priority one; it is not replayed."""
+        self.outbox.ack(job.outbox_id)
+        self._release(job, failed=True)
+        if isinstance(job.messages, Digest):
+            self.digests.ack(job.messages)
+
+    def _given_up(self, job: ForwardJob):
+        """The queue gave up on a job (FloodWait retries exhausted, or the handler raised).
+
+        Its outbox entry stays journaled for the next start; an abandoned
+        digest is acked, as when sending it fails, so its entries are not
+        restored into a later digest.
+        """
+        self._release(job, failed=True)
+        if isinstance(job.messages, Digest):
+            self.digests.ack(job.messages)
+
+    async def _enqueue_digest(self, digest: Digest):
+        """Send callback of the digest buffer; digests are journaled by the buffer, not the outbox."""
+        if not await self.queue.put(ForwardJob(digest.target, digest, digest.category, 'digest')):
+            self.digests.ack(digest)
+
+    async def _send_digest(self, digest: Digest):
+        """Send the posts of a digest in order; after a FloodWait the retry resumes at the unsent post."""
+        t0 = time.monotonic()
+        try:
+            while digest.sent < len(digest.posts):
+                await self.client.send_message(
+                    digest.target, digest.posts[digest.sent], parse_mode='html', link_preview=False
+                )
+                digest.sent += 1
+                digest_posts_total.labels(category=digest.category).inc()
+        except FloodWaitError:
+            raise
+        except Exception as e:
+            messages_failed_total.labels(category=digest.category, target=digest.target).inc(len(digest.entries))
+            log_message(logger, f"Sending digest failed: {e}", logging.ERROR, count=len(digest.entries),
+                        category=digest.category, target=digest.target, stage='digest')
+            self.digests.ack(digest)
+            return
+        observe_stage(digest.category, 'digest', t0)
+        self.digests.ack(digest)
+        digest_messages_total.labels(category=digest.category).inc(len(digest.entries))
+        newest: Dict[int, int] = {}
+        for entry in digest.entries:
+            self.dedup.add(entry.chat_id, entry.message_id, entry.grouped_id)
+            newest[entry.chat_id] = max(newest.get(entry.chat_id, 0), entry.message_id)
+        for chat_id, message_id in newest.items():
+            self.checkpoints.update(chat_id, message_id)
+        log_message(logger, 'digest sent', count=len(digest.entries), category=digest.category,
+                    target=digest.target, stage='digest', duration=round(time.monotonic() - t0, 4))
+
+    async def _process_job(self, job: ForwardJob):
+        """Forwarding worker entry point."""
+        observe_stage(job.category, 'queue', job.enqueued_at)
+        if isinstance(job.messages, Digest):
+            await self._send_digest(job.messages)
+            return
+        pending = job.messages
+        if self.repeat_media != 'forward':
+            pending = await self._drop_repeated_media(job)
+        forwarded = pending is None or await self._forward(
+            job.target, pending, job.category, job.source, album=job.album, chat_id=job.chat_id
+        )
+        # FloodWait propagates above and keeps the entry journaled until the retry
+        self.outbox.ack(job.outbox_id)
+        if forwarded:
+            messages = job.messages if isinstance(job.messages, list) else [job.messages]
+            for message in messages:
+                self.dedup.add(job.chat_id, message.id, message.grouped_id)
+            # Relayed jobs come from chats another shard reads and checkpoints
+            if job.chat_id in self.routes:
+                self.checkpoints.update(job.chat_id, max(message.id for message in messages))
+        self._release(job, failed=not forwarded)
+
+    async def _drop_repeated_media(self, job: ForwardJob) -> Union[Message, List[Message], None]:
+        """Skip, or send as caption only, the messages of a job whose media already reached the target.
+
+        An album counts as repeated only if all of its files do. Returns what
+        is left to forward, or None if nothing is.
+        """
+        cache = self.media_cache
+        if job.album:
+            units = [job.messages]
+        else:
+            units = [[m] for m in (job.messages if isinstance(job.messages, list) else [job.messages])]
+        remaining = []
+        for unit in units:
+            fps = [fp for fp in map(media_fingerprint, unit) if fp is not None]
+            if not fps or not all(cache.seen(job.target, fp) for fp in fps):
+                remaining.extend(unit)
+                continue
+            first = unit[0]
+            caption = next((m for m in unit if m.message), None)
+            if self.repeat_media == 'caption' and caption is not None:
+                try:
+                    await self.client.send_message(
+                        job.target, caption.message, formatting_entities=caption.entities, link_preview=False
+                    )
+                except FloodWaitError:
+                    raise
+                except Exception as e:
+                    log_message(logger, f"Sending caption of repeated media failed, forwarding it: {e}",
+                                logging.WARNING, chat_id=job.chat_id, message_id=first.id,
+                                category=job.category, target=job.target, stage='repeat')
+                    remaining.extend(unit)
+                    continue
+                messages_forwarded_total.labels(category=job.category, target=job.target).inc()
+                action = 'caption'
+            else:
+                action = 'skipped'
+            media_repeats_total.labels(category=job.category, action=action).inc(len(unit))
+            log_message(logger, f'repeated media {action}', chat_id=job.chat_id, message_id=first.id,
+                        category=job.category, target=job.target, stage='repeat')
+        if not remaining:
+            return None
+        if job.album or isinstance(job.messages, list):
+            return remaining
+        return remaining[0]
+
+    def _remember_media(self, target: str, messages: Union[Message, List[Message]], sent=None) -> None:
+        """Record the files that reached the target, with references taken from ``sent`` where it lines up."""
+        if self.media_cache is None:
+            return
+        sources = messages if isinstance(messages, list) else [messages]
+        results = sent if isinstance(sent, list) else [sent]
+        if len(results) != len(sources):
+            results = [None] * len(sources)
+        for message, result in zip(sources, results):
+            fp = media_fingerprint(message)
+            if fp is None:
+                continue
+            reference = None
+            if media_fingerprint(result) is not None:
+                reference = utils.get_input_media(result.media)
+            self.media_cache.add(target, fp, reference)
+
+    def _media_file(self, message: Message):
+        """The file to re-send a message with: a reference to a copy already sent, or its own media."""
+        fp = media_fingerprint(message) if self.media_cache is not None else None
+        reference = self.media_cache.reference(fp) if fp is not None else None
+        return reference if reference is not None else message.media
+
+    async def _requeue_by_ids(self, target: str, chat_id: int, peer, message_ids: List[int],
+                              category: str, source: str, album: bool, outbox_id: int | None = None):
+        """Fetch messages by id and queue them for forwarding unless already forwarded."""
+        messages = [m for m in await self.client.get_messages(peer, ids=message_ids) if m]
+        fresh = [m for m in messages if not await self.dedup.seen(chat_id, m.id)]
+        if not fresh:
+            self.outbox.ack(outbox_id)
+            return
+        job_messages = fresh if album or len(fresh) > 1 else fresh[0]
+        job = ForwardJob(target, job_messages, category, source, album=album, chat_id=chat_id, outbox_id=outbox_id)
+        if outbox_id is None:
+            await self._enqueue(job)
+        else:
+            self._reserve(job)
+            if not await self.queue.put(job):
+                self._release(job, failed=True)
+
+    async def _replay_outbox(self):
+        """Re-queue forwards journaled by a previous run that never completed.
+
+        Uses the snapshot ``start()`` takes before connecting, so jobs of
+        this run that are still in flight are not replayed a second time.
+        """
+        entries = self.outbox_backlog if self.outbox_backlog is not None else await self.outbox.pending()
+        self.outbox_backlog = None
+        if not entries:
+            return
+        logger.info(f"Replaying {len(entries)} unfinished forwards from the outbox")
+        for entry in entries:
+            # Relayed by another shard when the source is not one of ours
+            peer = entry.chat_id if entry.chat_id in self.routes else self._relay_peer(entry.source)
             try:
-                # Пробуем использовать send_message с file parameter для пересылки всего контента
-                logger.info(f"Sending message from {source} to {target}")
-
-                # Получаем все медиа из сообщения
-                media = event.message.media
-                grouped_media = event.message.grouped_id
-
-                if grouped_media:
-                    # Получаем сообщения из альбома, начиная с текущего ID
-                    messages = []
-                    current_msg_id = event.message.id
-
-                    # Проверяем сообщения до и после текущего, чтобы собрать весь альбом
-                    async for msg in self.client.iter_messages(
-                        chat.id,
-                        min_id=current_msg_id - 10,  # Проверяем 10 сообщений до
-                        max_id=current_msg_id + 10,  # и 10 сообщений после
-                        reverse=True
-                    ):
-                        if msg.grouped_id == grouped_media and msg.id not in [m.id for m in messages]:
-                            messages.append(msg)
-
-                    # Сортируем сообщения по ID чтобы сохранить порядок
-                    messages.sort(key=lambda x: x.id)
-
-                    # Проверяем что мы не обрабатывали это сообщение ранее
-                    if event.message.id == messages[0].id:
-                        # Пересылаем весь альбом только один раз
-                        await self.client.forward_messages(target, messages)
-                        albums_forwarded_total.labels(category=category).inc()
-                        logger.info(f"Forwarded album with {len(messages)} messages")
-                else:
-                    # Если это одиночное сообщение, пересылаем как есть
-                    await self.client.forward_messages(target, event.message)
+                await self._requeue_by_ids(
+                    entry.target, entry.chat_id, peer, entry.message_ids,
+                    entry.category, entry.source, entry.album, outbox_id=entry.id,
+                )
+            except Exception as e:
+                logger.error(f"Could not replay outbox entry {entry.id}: {e}")
 
-                elapsed = time.monotonic() - t0
-                forward_duration_seconds.observe(elapsed)
-                messages_forwarded_total.labels(category=category).inc()
-                logger.info(f"Successfully sent message from {source} to {target}")
+    @staticmethod
+    def _relay_peer(source: str) -> int | str:
+        # Resolve the source by username where possible; access hashes are per account.
+        # A marked id must stay an int: Telethon reads numeric strings as phone numbers
+        return int(source) if source.lstrip('-').isdigit() else f"@{source}"
+
+    async def _forward_relayed(self, payload: Dict):
+        """Forward a message another shard received but cannot post to the target.
 
+        The job is journaled in this shard's outbox before the messages are
+        fetched, so a failed fetch or a restart replays it.
+        """
+        source = payload['source']
+        try:
+            outbox_id = await self.outbox.append(
+                payload['target'], payload['chat_id'], payload['message_ids'],
+                payload['category'], source, payload['album'],
+            )
+            await self._requeue_by_ids(
+                payload['target'], payload['chat_id'], self._relay_peer(source), payload['message_ids'],
+                payload['category'], source, payload['album'], outbox_id=outbox_id,
+            )
+        except Exception as e:
+            messages_failed_total.labels(category=payload['category'], target=payload['target']).inc(
+                len(payload['message_ids'])
+            )
+            logger.error(f"Could not forward relayed message from {source} to {payload['target']}: {e}")
+
+    async def _probe_targets(self):
+        """Find the targets this account is allowed to post to."""
+        postable = set()
+        targets = self.routes.targets()
+        for target in targets:
+            try:
+                entity = await self.client.get_entity(target)
+                permissions = await self.client.get_permissions(entity, 'me')
+                if getattr(entity, 'broadcast', False):
+                    allowed = permissions.is_creator or permissions.post_messages
+                else:
+                    allowed = not permissions.is_banned
+                if allowed:
+                    postable.add(target)
             except Exception as e:
-                logger.error(f"Error in message forwarding, trying alternative method: {e}")
+                logger.warning(f"Cannot post to {target} from this account: {e}")
+        self.postable = postable
+        logger.info(f"Account can post to {len(postable)} of {len(targets)} targets")
+
+    def _chat_filter(self, routes: RoutingTable) -> Set[int]:
+        """Marked ids of all configured sources that are known without a request."""
+        chats = set()
+        for source in routes.configured_sources():
+            key = canonical_source(source)
+            chat_id = self.peer_map.get(source) if key.startswith('@') else int(key)
+            if chat_id is None:
+                logger.warning(f"Could not resolve {source}, it is not monitored until the next reload")
+                continue
+            chats.add(chat_id)
+        return chats
+
+    async def apply_config(self, config: Dict):
+        """Swap in new channels without reconnecting.
+
+        The new routing table is built and its usernames resolved before the
+        swap; the swap itself has no await, so every event sees either the
+        old or the new table. Messages already routed keep their route.
+        `channels`, `filters`, `priorities` and `digests` are reloaded;
+        `settings` changes need a restart.
+        """
+        channels = config.get('channels')
+        if not isinstance(channels, dict) or not channels.get('target_channels'):
+            raise ConfigError("Invalid config structure: missing 'target_channels' in channels")
+        if (config.get('settings') or {}) != self.settings:
+            logger.warning("Changes to settings are applied on restart only")
+
+        filters = await asyncio.to_thread(compile_filters, config)
+        priorities = compile_priorities(config)
+        digests = compile_digests(config)
+        routes = await asyncio.to_thread(RoutingTable, channels, self.peer_map.items())
+        if self.client is not None:
+            await self._resolve_usernames(routes)
+        chats = self._chat_filter(routes)
+
+        targets_changed = set(routes.targets()) != set(self.routes.targets())
+        self.config = channels
+        self.target_channels = channels['target_channels']
+        self.routes = routes
+        self.filters = filters
+        self.queue.set_priorities(priorities)
+        self.digests.configure(digests)
+        if self.new_message is not None:
+            # Telethon checks event.chat_id against this set for every update
+            self.new_message.chats = chats
+        logger.info(f"Config applied: {len(routes.configured_sources())} sources, monitoring {len(chats)} chats")
+
+        if targets_changed and self.relay is not None and self.client is not None:
+            await self._probe_targets()
+
+    async def _catch_up(self):
+        """Forward messages posted while disconnected, starting from the checkpoints."""
+        # Only sources of this process; relayed jobs never advance other chats' checkpoints
+        positions = {
+            chat_id: last_id for chat_id, last_id in (await self.checkpoints.load()).items() if chat_id in self.routes
+        }
+        if not positions:
+            return
+
+        t0 = time.monotonic()
+        limit = int(self.settings.get('catchup_max_messages', 1000))
+        semaphore = asyncio.Semaphore(int(self.settings.get('catchup_concurrency', 4)))
+
+        async def recover(chat_id: int, last_id: int) -> int:
+            recovered = 0
+            async with semaphore:
                 try:
-                    # Fallback: отправляем текст + медиа отдельно
+                    routes = self.routes.lookup_all(chat_id)
+                    # Oldest first, so messages enter the pipeline in posting order. Pages on up
+                    # to the newest message: dropped ones do not count towards the limit
+                    async for message in self.client.iter_messages(
+                        chat_id, min_id=last_id, limit=None, reverse=True, wait_time=1
+                    ):
+                        if await self._process_message(message, chat_id, routes):
+                            recovered += 1
+                            if recovered >= limit:
+                                break
+                except Exception as e:
+                    logger.error(f"Catch-up failed for {chat_id}: {e}")
+            return recovered
+
+        results = await asyncio.gather(*(recover(chat_id, last_id) for chat_id, last_id in positions.items()))
+        recovered = sum(results)
+        elapsed = time.monotonic() - t0
+        catchup_recovered_messages.observe(recovered)
+        catchup_duration_seconds.observe(elapsed)
+        logger.info(f"Catch-up recovered {recovered} messages from {len(positions)} sources in {elapsed:.1f}s")
+
+    async def _forward(
+        self,
+        target: str,
+        messages: Union[Message, List[Message]],
+        category: str,
+        source: str,
+        album: bool = False,
+        chat_id: int | None = None,
+    ) -> bool:
+        """Forward a message, an album or a batch of messages, falling back to a copy.
+
+        With ``copy_mode: always`` the messages are copied without trying to
+        forward. Returns True if the messages reached the target by either method.
+        """
+        is_album = album
+        is_batch = isinstance(messages, list) and not album
+        count = len(messages) if is_batch else 1
+        first = messages[0] if isinstance(messages, list) else messages
+        primary = 'copy' if self.copy_mode == 'always' else 'forward'
+        t0 = time.monotonic()
+        try:
+            if self.copy_mode == 'always':
+                sent = await self._copy(target, messages, is_album)
+            else:
+                sent = await self.client.forward_messages(target, messages)
+            self._remember_media(target, messages, sent)
+
+            elapsed = time.monotonic() - t0
+            observe_stage(category, primary, t0)
+            forward_duration_seconds.labels(category=category, target=target).observe(elapsed)
+            messages_forwarded_total.labels(category=category, target=target).inc(count)
+            observe_lag(category, messages)
+            if is_album:
+                albums_forwarded_total.labels(category=category).inc()
+            log_message(logger, 'forwarded', chat_id=chat_id, message_id=first.id, count=count if is_batch else None,
+                        album=len(messages) if is_album else None, category=category, target=target,
+                        stage=primary, duration=round(elapsed, 4))
+            return True
+
+        except FloodWaitError:
+            # The fallback would only deepen the flood; the queue retries after the wait
+            raise
+        except Exception as e:
+            observe_stage(category, primary, t0)
+            if self.copy_mode == 'always':
+                messages_failed_total.labels(category=category, target=target).inc(count)
+                log_message(logger, f"Copying failed: {e}", logging.ERROR, chat_id=chat_id, message_id=first.id,
+                            category=category, target=target, stage=primary)
+                return False
+            log_message(logger, f"Error in message forwarding, trying alternative method: {e}", logging.ERROR,
+                        chat_id=chat_id, message_id=first.id, category=category, target=target, stage=primary)
+            method = 'copy' if self.copier is not None else 'send_message'
+            t1 = time.monotonic()
+            try:
+                # Fallback: отправляем текст + медиа отдельно
+                sent = None
+                if self.copier is not None:
+                    sent = await self._copy(target, messages, is_album)
+                elif is_album:
+                    caption = next((m.message for m in messages if m.message), "")
                     await self.client.send_message(
                         target,
-                        event.message.message,
-                        file=event.message.media,
+                        caption,
+                        file=[self._media_file(m) for m in messages if m.media],
                     )
-                    elapsed = time.monotonic() - t0
-                    forward_duration_seconds.observe(elapsed)
-                    messages_forwarded_total.labels(category=category).inc()
-                    logger.info(f"Fallback forwarding succeeded for {source} to {target}")
-                except Exception as fallback_err:
-                    messages_failed_total.labels(category=category).inc()
-                    logger.error(f"Fallback forwarding also failed: {fallback_err}")
-
-        except TypeNotFoundError:
-            messages_failed_total.labels(category=category).inc()
-            logger.warning(f"TypeNotFoundError when handling message from {source}")
-        except Exception as e:
-            messages_failed_total.labels(category=category).inc()
-            logger.error(f"Error processing message: {e}", exc_info=True)
+                elif is_batch:
+                    sent = [
+                        await self.client.send_message(target, message.message, file=self._media_file(message))
+                        for message in messages
+                    ]
+                else:
+                    sent = await self.client.send_message(
+                        target,
+                        messages.message,
+                        file=self._media_file(messages),
+                    )
+                self._remember_media(target, messages, sent)
+                elapsed = time.monotonic() - t0
+                observe_stage(category, 'fallback', t1)
+                forward_fallbacks_total.labels(category=category, method=method, result='ok').inc()
+                forward_duration_seconds.labels(category=category, target=target).observe(elapsed)
+                messages_forwarded_total.labels(category=category, target=target).inc(count)
+                observe_lag(category, messages)
+                log_message(logger, 'forwarded by fallback', chat_id=chat_id, message_id=first.id, category=category,
+                            target=target, stage='fallback', duration=round(elapsed, 4))
+                return True
+            except FloodWaitError:
+                raise
+            except Exception as fallback_err:
+                observe_stage(category, 'fallback', t1)
+                forward_fallbacks_total.labels(category=category, method=method, result='failed').inc()
+                messages_failed_total.labels(category=category, target=target).inc(count)
+                log_message(logger, f"Fallback forwarding also failed: {fallback_err}", logging.ERROR,
+                            chat_id=chat_id, message_id=first.id, category=category, target=target, stage='fallback')
+                return False
 
+    async def _copy(self, target: str, messages: Union[Message, List[Message]], album: bool) -> List[Message]:
+        """Re-send messages through the copier: an album in one call, others one by one."""
+        if album:
+            return await self.copier.send(self.client, target, messages, album=True)
+        sent = []
+        for message in messages if isinstance(messages, list) else [messages]:
+            sent.extend(await self.copier.send(self.client, target, [message]))
+        return sent
 
     async def _connect(self) -> bool:
         try:
             if not self.client:
-                self.client = TelegramClient('my_user_session', self.api_id, self.api_hash)
-                sources = await self._resolve_channels()
-                logger.info(f"Resolved source channels: {sources}")
-
-                @self.client.on(events.NewMessage(chats=sources))
-                async def message_handler(event):
-                    logger.info("Received new message event")
-                    await self._handle_message(event)
-
-                logger.info("Message handler registered")
+                self.client = TelegramClient(open_session(self.session_name, self.settings), self.api_id, self.api_hash)
 
             await self.client.connect()
 
@@ -278,9 +1107,27 @@ class TelegramScraper:
                 await self.client.disconnect()
             return False
 
+    async def _register_handler(self):
+        """Subscribe to NewMessage from the sources; once per client, after the outbox replay."""
+        if self.new_message is not None:
+            return
+        if self.resolver is not None:
+            # Usernames resolved on this connect join the filter
+            await asyncio.wait([self.resolver])
+        # Marked int ids, as on reload: Telethon would read numeric strings as phone numbers
+        chats = self._chat_filter(self.routes)
+        logger.info(f"Monitoring {len(chats)} chats")
+        self.new_message = events.NewMessage(chats=chats)
+
+        @self.client.on(self.new_message)
+        async def message_handler(event):
+            await self._handle_message(event)
+
+        logger.info("Message handler registered")
+
     async def _setup_client(self):
         if not self.client:
-            self.client = TelegramClient('my_user_session', self.api_id, self.api_hash)
+            self.client = TelegramClient(open_session(self.session_name, self.settings), self.api_id, self.api_hash)
         return self.client
 
     async def start(self):
@@ -289,6 +1136,9 @@ class TelegramScraper:
                 if not self.client or not self.client.is_connected():
                     logger.info(f"Attempting to connect...")
                     reconnect_total.inc()
+                    if not self.outbox_replayed and self.outbox_backlog is None:
+                        # Before the update loop starts, so it holds the previous run's entries only
+                        self.outbox_backlog = await self.outbox.pending()
                     connected = await self._connect()
 
                     if not connected:
@@ -301,6 +1151,18 @@ class TelegramScraper:
                     self.reconnect_delay = 1
                     sources = await self._resolve_channels()
                     logger.info(f"Started monitoring {len(sources)} channels")
+                    if self.relay is not None:
+                        await self._probe_targets()
+                    # Unresolved usernames still route via the lazy path meanwhile
+                    if self.resolver is None or self.resolver.done():
+                        self.resolver = asyncio.create_task(self._resolve_usernames())
+                        self.resolver.add_done_callback(self._resolver_done)
+                    if not self.outbox_replayed:
+                        await self._replay_outbox()
+                        self.outbox_replayed = True
+                    # Live events only after the replay; catch-up covers what arrived meanwhile
+                    await self._register_handler()
+                    await self._catch_up()
 
                 if self.client:
                     await self.client.run_until_disconnected()
@@ -332,45 +1194,122 @@ class TelegramScraper:
                 scraper_uptime_seconds.set(elapsed)
             await asyncio.sleep(15)
 
-async def run_services(scraper: TelegramScraper, health_port: int):
-    health_server = uvicorn.Server(
-        config=uvicorn.Config(
-            app=app,
-            host="0.0.0.0",
-            port=health_port,
-            loop="asyncio"
-        )
+    async def _monitor_loop_lag(self, interval: float = 1.0):
+        """Background task sampling how late the event loop wakes up a sleeping task."""
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(interval)
+            event_loop_lag_seconds.set(max(loop.time() - t0 - interval, 0.0))
+
+def config_watcher(config_path: str, on_change, settings: Dict) -> ConfigWatcher:
+    return ConfigWatcher(
+        config_path,
+        load_yaml_config,
+        on_change,
+        interval=float(settings.get('config_reload_interval', 2.0)),
     )
 
-    await asyncio.gather(
+async def run_services(scraper: TelegramScraper, health_port: int, config_path: str | None = None):
+    services = [
         scraper.start(),
         scraper._update_uptime(),
-        health_server.serve()
-    )
+        scraper._monitor_loop_lag(),
+        scraper.dedup.run(),
+        scraper.checkpoints.run(),
+        scraper.outbox.run(),
+        scraper.digests.run(),
+        serve_health(health_port, float(scraper.settings.get('metrics_cache_seconds', 1.0))),
+    ]
+    if scraper.archive is not None:
+        services.append(scraper.archive.run())
+    if config_path:
+        services.append(config_watcher(config_path, scraper.apply_config, scraper.settings).run())
+    await asyncio.gather(*services)
+
+async def run_shard_services(scraper: TelegramScraper, index: int, reports, inbox, report_interval: float = 5.0):
+    """Services of one shard process; the supervisor serves /health and /metrics."""
+    loop = asyncio.get_running_loop()
+
+    def read_inbox():
+        while True:
+            payload = inbox.get()
+            if 'reload' in payload:
+                asyncio.run_coroutine_threadsafe(scraper.apply_config(payload['reload']), loop)
+            else:
+                asyncio.run_coroutine_threadsafe(scraper._forward_relayed(payload), loop)
+
+    threading.Thread(target=read_inbox, name='shard-inbox', daemon=True).start()
+
+    async def report():
+        while True:
+            status = scraper_status()
+            # Rendering every metric family takes milliseconds; keep it off the event loop
+            metrics = await loop.run_in_executor(None, generate_latest)
+            reports.put(('report', index, {
+                'connected': status['connected'],
+                'last_error': status['last_error'],
+                'postable': sorted(scraper.postable) if scraper.postable is not None else None,
+                'metrics': metrics.decode(),
+            }))
+            await asyncio.sleep(report_interval)
+
+    services = [
+        scraper.start(),
+        scraper._update_uptime(),
+        scraper._monitor_loop_lag(),
+        scraper.dedup.run(),
+        scraper.checkpoints.run(),
+        scraper.outbox.run(),
+        scraper.digests.run(),
+        report(),
+    ]
+    if scraper.archive is not None:
+        services.append(scraper.archive.run())
+    await asyncio.gather(*services)
+
+def load_credentials() -> Tuple[int, str]:
+    """API_ID and API_HASH from the environment (or .env)."""
+    load_dotenv()
+    api_id = os.getenv("API_ID")
+    api_hash = os.getenv("API_HASH")
+
+    if not api_id or not api_id.isdigit():
+        raise ConfigError("API_ID must be a valid integer")
+
+    if not api_hash:
+        raise ConfigError("API_HASH is required")
+    return int(api_id), api_hash
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'backfill':
+        from .backfill import main as backfill_main
+        backfill_main(sys.argv[2:])
+        return
     try:
-        load_dotenv()
-        api_id = os.getenv("API_ID")
-        api_hash = os.getenv("API_HASH")
+        api_id, api_hash = load_credentials()
         health_port = int(os.getenv("HEALTH_PORT", "8000"))
 
-        if not api_id or not api_id.isdigit():
-            raise ConfigError("API_ID must be a valid integer")
-
-        if not api_hash:
-            raise ConfigError("API_HASH is required")
-
-        config = load_yaml_config()
+        config_path = os.getenv("CONFIG_PATH", "config.yaml")
+        config = load_yaml_config(config_path)
+        setup_logging(config.get('settings'))
 
         scraper_info.info({
             'version': '0.2.0',
             'health_port': str(health_port),
         })
 
-        scraper = TelegramScraper(int(api_id), api_hash, config)
+        sessions = (config.get('settings') or {}).get('sessions') or []
+        if len(sessions) > 1:
+            logger.info(f"Starting sharded mode with {len(sessions)} sessions")
+            supervisor = Supervisor(api_id, api_hash, config, sessions)
+            asyncio.run(supervisor.run(health_port, config_path))
+            return
+
+        session = sessions[0] if sessions else 'my_user_session'
+        scraper = TelegramScraper(api_id, api_hash, config, session=session)
 
-        asyncio.run(run_services(scraper, health_port))
+        asyncio.run(run_services(scraper, health_port, config_path))
     except KeyboardInterrupt:
         logger.info("\nScraper stopped by user")
     except Exception as e:
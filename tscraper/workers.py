@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Mapping
+
+from telethon.errors import FloodWaitError
+
+from .lanes import LanePolicy, LaneQueue
+from .metrics import (
+    forward_queue_depth,
+    forward_queue_dropped_total,
+    forward_workers_busy,
+    forward_workers_total,
+    messages_deferred,
+    messages_failed_total,
+)
+from .ratelimit import RateScheduler
+
+logger = logging.getLogger(__name__)
+
+QUEUE_POLICIES = ('block', 'drop')
+
+
+@dataclass(slots=True)
+class ForwardJob:
+    """A routed message (or album) waiting to be forwarded to one target."""
+    target: str
+    messages: Any
+    category: str
+    source: str
+    album: bool = False
+    chat_id: int | None = None
+    outbox_id: int | None = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+class ForwardQueue:
+    """Bounded queue with a pool of forwarding workers.
+
+    Decouples the Telethon update dispatch from slow forwards. When the queue
+    is full, ``policy='block'`` makes ``put`` wait (backpressure on the event
+    handler) and ``policy='drop'`` rejects the job, unless a job of a
+    lower-priority category can be evicted for it (``on_evict`` is called
+    with the evicted job). At most ``per_target`` jobs are forwarded to the
+    same target concurrently. ``on_failed`` is called with a job that is
+    given up: FloodWait retries exhausted, or the handler raised.
+
+    Jobs wait in a LaneQueue: one lane per category, served in proportion
+    to the ``priorities`` of the categories, with ``max_lag`` bounds.
+
+    With a ``scheduler``, jobs whose target is rate limited or paused by a
+    FloodWait are parked off the queue, so workers keep serving other
+    targets meanwhile. Parked jobs wait in one FIFO per target with a single
+    timer: when it fires, the oldest job is re-queued, and the next one only
+    once that job got a token. Jobs for a target with parked jobs join the
+    back of its FIFO, so a target's messages keep their order.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[ForwardJob], Awaitable[None]],
+        maxsize: int = 1000,
+        workers: int = 4,
+        per_target: int = 2,
+        policy: str = 'block',
+        scheduler: RateScheduler | None = None,
+        max_flood_retries: int = 5,
+        priorities: Mapping[str, LanePolicy] | None = None,
+        on_evict: Callable[[ForwardJob], None] | None = None,
+        on_failed: Callable[[ForwardJob], None] | None = None,
+    ):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self._handler = handler
+        self._queue = LaneQueue(maxsize=maxsize, priorities=priorities)
+        self.workers = workers
+        self.per_target = per_target
+        self.policy = policy
+        self.scheduler = scheduler
+        self.max_flood_retries = max_flood_retries
+        self.on_evict = on_evict
+        self.on_failed = on_failed
+        self._target_slots: Dict[str, asyncio.Semaphore] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._parked: Dict[str, Deque[ForwardJob]] = {}
+        # The parked job of a target on its way back through the queue
+        self._released: Dict[str, ForwardJob] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._deferred = 0
+        self._no_deferred = asyncio.Event()
+        self._no_deferred.set()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def set_priorities(self, priorities: Mapping[str, LanePolicy]) -> None:
+        self._queue.configure(priorities)
+
+    async def put(self, job: ForwardJob) -> bool:
+        """Enqueue a job; returns False if it was dropped because the queue is full."""
+        self._ensure_workers()
+        if self.policy == 'drop':
+            try:
+                self._queue.put_nowait(job)
+            except asyncio.QueueFull:
+                # A parked job on its way back was already accepted; it is not evicted
+                evicted = self._queue.shed(job, keep=lambda queued: self._released.get(queued.target) is queued)
+                if evicted is None:
+                    forward_queue_dropped_total.labels(category=job.category).inc()
+                    logger.warning(f"Forward queue full, dropping message from {job.source} to {job.target}")
+                    return False
+                forward_queue_dropped_total.labels(category=evicted.category).inc()
+                logger.warning(
+                    f"Forward queue full, dropping queued message from {evicted.source} to {evicted.target} "
+                    f"for a higher-priority one"
+                )
+                if self.on_evict is not None:
+                    self.on_evict(evicted)
+                self._queue.put_nowait(job)
+        else:
+            await self._queue.put(job)
+        forward_queue_depth.set(self._queue.qsize())
+        return True
+
+    async def join(self) -> None:
+        """Wait until every queued or deferred job has been processed."""
+        while True:
+            await self._queue.join()
+            if not self._deferred:
+                return
+            await self._no_deferred.wait()
+
+    async def stop(self) -> None:
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        forward_workers_total.set(0)
+
+    def _ensure_workers(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        forward_workers_total.set(self.workers)
+
+    def _slot(self, target: str) -> asyncio.Semaphore:
+        slot = self._target_slots.get(target)
+        if slot is None:
+            slot = self._target_slots[target] = asyncio.Semaphore(self.per_target)
+        return slot
+
+    def _hold(self, job: ForwardJob) -> bool:
+        """Take a send token for the job, or park it; True if it was parked."""
+        if self.scheduler is None:
+            return False
+        target = job.target
+        released = self._released.get(target) is job
+        if target in self._parked and not released:
+            # Behind the jobs already waiting for this target
+            self._park(job)
+            return True
+        delay = self.scheduler.reserve(target)
+        if delay > 0:
+            if released:
+                del self._released[target]
+            self._park(job, delay, first=released)
+            return True
+        if released:
+            del self._released[target]
+            self._release(target)
+        return False
+
+    def _park(self, job: ForwardJob, delay: float | None = None, first: bool = False) -> None:
+        """Park a job for its target; ``delay`` (re)arms the target's timer."""
+        parked = self._parked.setdefault(job.target, deque())
+        if first:
+            parked.appendleft(job)
+        else:
+            parked.append(job)
+        self._deferred += 1
+        self._no_deferred.clear()
+        messages_deferred.labels(target=job.target).inc()
+        if delay is not None:
+            timer = self._timers.pop(job.target, None)
+            if timer is not None:
+                timer.cancel()
+            self._timers[job.target] = asyncio.get_running_loop().call_later(delay, self._wake, job.target)
+
+    def _wake(self, target: str) -> None:
+        del self._timers[target]
+        self._release(target)
+
+    def _release(self, target: str) -> None:
+        """Re-queue the oldest parked job of a target, if any."""
+        parked = self._parked.get(target)
+        if not parked:
+            self._parked.pop(target, None)
+            return
+        job = self._released[target] = parked.popleft()
+        asyncio.ensure_future(self._requeue(job))
+
+    async def _requeue(self, job: ForwardJob) -> None:
+        # Deferred jobs were already accepted, so they bypass the drop policy
+        await self._queue.put(job)
+        forward_queue_depth.set(self._queue.qsize())
+        messages_deferred.labels(target=job.target).dec()
+        self._deferred -= 1
+        if not self._deferred:
+            self._no_deferred.set()
+
+    def _failed(self, job: ForwardJob) -> None:
+        if self.on_failed is not None:
+            self.on_failed(job)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            forward_queue_depth.set(self._queue.qsize())
+            forward_workers_busy.inc()
+            try:
+                if self._hold(job):
+                    continue
+                async with self._slot(job.target):
+                    await self._handler(job)
+            except FloodWaitError as e:
+                job.attempts += 1
+                if not self.scheduler or job.attempts > self.max_flood_retries:
+                    messages_failed_total.labels(category=job.category, target=job.target).inc()
+                    logger.error(f"Giving up on message from {job.source} to {job.target} after FloodWait: {e}")
+                    self._failed(job)
+                    continue
+                self.scheduler.pause(job.target, e.seconds)
+                logger.warning(f"FloodWait of {e.seconds}s for {job.target}, deferring message from {job.source}")
+                # Retried before the jobs that were parked behind it
+                self._park(job, self.scheduler.paused_for(job.target), first=True)
+            except Exception as e:
+                logger.error(f"Forward worker failed on message from {job.source}: {e}", exc_info=True)
+                self._failed(job)
+            finally:
+                forward_workers_busy.dec()
+                self._queue.task_done()